@@ -20,8 +20,8 @@ __copyright__ = "Copyright 2014, Philippe Guglielmetti"
 __credits__ = ['http://effbot.org/imagingbook/imagedraw.htm', 'http://images.autodesk.com/adsk/files/acad_dxf0.pdf']
 __license__ = "LGPL"
 
-from math import  radians, degrees, tan, atan
-import logging, base64
+from math import  radians, degrees, tan, atan, acos, ceil
+import logging, base64, six
 
 from .itertools2 import split, filter2, subdict
 from .geom import *
@@ -32,6 +32,14 @@ from .math2 import rint, isclose
 from . import plot #set matplotlib backend
 import matplotlib.pyplot as plt # after import .plot
 
+_trans={} #cache of matrices built by Trans
+
+def _key(x):
+    try:
+        return tuple(x)
+    except TypeError:
+        return x
+
 def Trans(scale=1, offset=None, rotation=None):
     """
     :param scale: float or (scalex,scaley) tuple of scale factor
@@ -39,6 +47,18 @@ def Trans(scale=1, offset=None, rotation=None):
     :param rotation: float angle in degrees
     :return: :class:`~geom.Matrix3` of generalized scale+offset+rotation
     """
+    key=(_key(scale),_key(offset),rotation)
+    try:
+        return copy(_trans[key])
+    except KeyError:
+        if len(_trans)>=1024:
+            _trans.clear()
+        res=_trans[key]=_trans_matrix(scale, offset, rotation)
+        return copy(res)
+    except TypeError: #unhashable
+        return _trans_matrix(scale, offset, rotation)
+
+def _trans_matrix(scale, offset, rotation):
     res = Matrix3()
     if rotation:
         res = res.rotate(radians(rotation))
@@ -518,6 +538,32 @@ class Spline(Entity, Geometry):
     def _apply_transform(self, t):
         self.p=[t*p for p in self.p]
 
+def _circle_fix(e,orientation):
+    e.r=abs(e.p-e.c)
+
+def _arc_fix(e,orientation):
+    e.r=abs(e.p-e.c)
+    e.dir=e.dir*orientation
+    e._apply_transform(None) #updates start and end angles
+
+def _ellipse_fix(e,orientation):
+    e.r,e.r2=(e.p-e.c).xy
+
+# entities that groups transform in a single array operation.
+# _apply_transform method : (points of entity, vectors of entity, function updating other attributes)
+_BATCH=dict((six.get_unbound_function(cls._apply_transform),spec) for cls,spec in (
+    (Point2,(lambda e:[e], None, None)),
+    (Line2,(lambda e:[e.p], lambda e:[e.v], None)),
+    (Circle,(lambda e:[e.c,e.p], None, _circle_fix)),
+    (Arc2,(lambda e:[e.c,e.p,e.p2], None, _arc_fix)),
+    (Ellipse,(lambda e:[e.c,e.p], None, _ellipse_fix)),
+    (Spline,(lambda e:e.p, None, None)),
+))
+
+def _set_coords(vectors,xy):
+    for v,(x,y) in zip(vectors,xy.tolist()):
+        v.x,v.y=x,y
+
 '''
 def Spline(pts):
     # uses http://www.charlespetzold.com/blog/2012/12/Bezier-Circles-and-Bezier-Ellipses.html
@@ -528,6 +574,17 @@ def Spline(pts):
     return Arc2(c,p0,p3)
 '''
         
+def _atoms(entities):
+    """generates (Entity, top) tuples of all non group Entities in entities,
+    where top is the group of entities containing them, or None if they are in entities
+    """
+    for e in entities:
+        if isinstance(e,_Group):
+            for a,_ in _atoms(e):
+                yield a,e
+        else:
+            yield e,None
+
 class _Group(Entity, Geometry):
     """ abstract class for iterable Entities"""
     def bbox(self, filter=None):
@@ -548,35 +605,28 @@ class _Group(Entity, Geometry):
     def intersect(self, other):
         """
         :param other: `geom.Entity`
-        :result: generate tuples (Point2,Entity_self) of intersections between other and each Entity
+        :result: generate tuples (Point2,Entity_self) of intersections between other and each Entity.
+          Entities of nested groups get a .group attribute set to the Entity of self containing them.
+          If other is iterable, tuples (Point2,Entity_other) are generated instead,
+          with a .group attribute set to the Entity of self they intersect.
         """
-        # recurse in structures by swapping Entities to intersect
-        # in order to ensure we call geom intersect methods only with
-        # "atomic" Entities
-        try:
-            iter(other)
-        except:
-            recurse=False
-        else:
-            recurse=True
-            
-        for e in self:
-            inter=other.intersect(e) if recurse else e.intersect(other)
-                
-            if inter is None: 
-                continue
-            if isinstance(inter,Point2) :
-                yield (inter,e)
-            elif isinstance(inter,Segment2) :
-                yield (inter.p,e)
-                yield (inter.p2,e)
-            elif isinstance(inter,list) : # list of multiple points
-                for i in inter:
-                    yield (i,e)
-            else: #recursive call
-                for i,e2 in inter:
-                    e2.group=e
-                    yield (i,e2)
+        # all intersections between "atomic" Entities are computed at once by geom.intersections
+        atoms=list(_atoms(self))
+        others=None
+        if isinstance(other,_Group) or not isinstance(other,Geometry): # Point2 is iterable too
+            try:
+                others=[a for a,_ in _atoms(other)]
+            except TypeError: #not iterable
+                pass
+        for p,i,j in intersections([a for a,_ in atoms],[other] if others is None else others):
+            e,top=atoms[i]
+            if others is not None:
+                others[j].group=e if top is None else top
+                yield (p,others[j])
+            else:
+                if top is not None:
+                    e.group=top
+                yield (p,e)
 
     def connect(self, other):
         for (inter, _) in self.intersect(other):
@@ -658,8 +708,38 @@ class Group(list, _Group):
         return res
 
     def _apply_transform(self,trans):
-        for entity in self:
-            entity._apply_transform(trans)
+        """transforms the points of all (nested) entities in a single array operation"""
+        points,vectors,fixes=[],[],[]
+        self._collect(trans,points,vectors,fixes)
+        if points:
+            _set_coords(points,trans.apply([(p.x,p.y) for p in points]))
+        if vectors:
+            _set_coords(vectors,trans.apply([(v.x,v.y) for v in vectors],vectors=True))
+        if fixes:
+            orientation=trans.orientation()
+            for fix,e in fixes:
+                fix(e,orientation)
+
+    def _collect(self,trans,points,vectors,fixes):
+        """gathers the points and vectors of entities to transform,
+        and transforms the other entities
+        """
+        group=six.get_unbound_function(Group._apply_transform)
+        for e in self:
+            f=six.get_unbound_function(type(e)._apply_transform)
+            if f is group:
+                e._collect(trans,points,vectors,fixes)
+                continue
+            spec=_BATCH.get(f)
+            if spec is None:
+                e._apply_transform(trans)
+                continue
+            getpoints,getvectors,fix=spec
+            points.extend(getpoints(e))
+            if getvectors:
+                vectors.extend(getvectors(e))
+            if fix:
+                fixes.append((fix,e))
 
     def swap(self):
         """ swap start and end"""
@@ -820,6 +900,34 @@ class Chain(Group):
         
         return None
 
+    def to_polyline(self, tol=1E-3):
+        """
+        :param tol: float max distance between arcs and the segments approximating them
+        :return: :class:`~geom.Polygon` if chain is closed, :class:`~geom.Polyline` otherwise
+        """
+        pts=[self.start]
+        for e in self:
+            if isinstance(e,Arc2):
+                step=2*acos(max(1-tol/e.r,-1)) if e.r>tol else pi # max angle of segments
+                n=max(1,int(ceil(abs(e.angle())/step)))
+                pts.extend(e.point(u/n) for u in range(1,n+1))
+            else:
+                pts.append(e.end)
+        if len(self)>1 and pts[-1].distance(pts[0])<=tol:
+            return Polygon(pts[:-1])
+        return Polyline(pts)
+
+    @staticmethod
+    def from_polyline(poly):
+        """
+        :param poly: :class:`~geom.Polyline` or :class:`~geom.Polygon`
+        :return: Chain of Segment2 through the points of poly, closed if poly is a Polygon
+        """
+        pts=list(poly)
+        if isinstance(poly,Polygon):
+            pts.append(pts[0])
+        return Chain(Segment2(p,q) for p,q in zip(pts[:-1],pts[1:]))
+
     @staticmethod
     def from_pdf(path,trans,color):
         """
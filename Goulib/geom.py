@@ -16,11 +16,16 @@ __docformat__ = 'restructuredtext'
 __version__ = '$Id$'
 __revision__ = '$Revision$'
 
-import operator, six, abc
+import operator, six, abc, heapq
 
 from math import pi,sin,cos,atan2,sqrt,hypot,copysign
 from .math2 import angle, sat, sign, isclose
 
+try: # needed only by arrays of vectors and points
+    import numpy
+except ImportError:
+    numpy=None
+
 _reltol=1e-6 #relative tolerance used for isclose comparisons
 
 def _hash(v):
@@ -123,6 +128,8 @@ class Geometry(object):
 def argPair(x,y=None):
     """Process a pair of values passed in various ways."""
     if y is None:
+        if isinstance(x,Vector2): #quick
+            return (x.x, x.y)
         try:
             return (x[0], x[1])
         except:
@@ -294,6 +301,8 @@ class Vector2(object):
 
     """
 
+    __slots__ = ('x', 'y') #no instance dict. Point2 gets one from Geometry
+
     def __init__ ( self, *args ):
         """Constructor.
         :param *args: x,y values
@@ -348,6 +357,8 @@ class Vector2(object):
         return iter(self.xy)
 
     def __add__(self, other):
+        if isinstance(other,Vector2Array):
+            return NotImplemented
         x,y=argPair(other)
         # Vector - Vector -> Vector
         # Vector - Point -> Point
@@ -368,6 +379,8 @@ class Vector2(object):
         return self
 
     def __sub__(self, other):
+        if isinstance(other,Vector2Array):
+            return NotImplemented
         x,y=argPair(other)
         # Vector - Vector -> Vector
         # Vector - Point -> Point
@@ -711,6 +724,220 @@ def Polar(mag,angle):
     return Vector2(mag*cos(angle),mag*sin(angle))
 
 
+def _coords(other):
+    """:return: coordinates of other as a numpy array broadcastable to N×2"""
+    if isinstance(other,Vector2Array):
+        return other.xy
+    if isinstance(other,Vector2):
+        return numpy.array((other.x,other.y))
+    return numpy.asarray(other,dtype=float)
+
+def _scalars(k):
+    """:return: scalar, or column of N scalars broadcastable to N×2"""
+    k=numpy.asarray(k,dtype=float)
+    return k[:,numpy.newaxis] if k.ndim==1 else k
+
+class Vector2Array(object):
+    """
+    Array of 2D vectors stored in a N×2 numpy array of floats.
+
+    Supports the operators and the main methods of **Vector2**, vectorized::
+
+        >>> a = Vector2Array([(1., 0.), (3., 4.)])
+        >>> abs(a)
+        array([1., 5.])
+        >>> a + Point2(1, 1)
+        Point2Array([(2.0, 1.0), (4.0, 5.0)])
+
+    Slices share the array. Vector2 objects are built only
+    when items are accessed by an int or iterated::
+
+        >>> a[1:].normalize()
+        Vector2Array([(0.6, 0.8)])
+        >>> a[1]
+        Vector2(0.6, 0.8)
+    """
+    _item=Vector2 #class of items
+
+    def __init__(self, data=(), y=None):
+        """
+        :param data: Vector2Array, N×2 array-like, iterable of Vector2 or (x,y) pairs,
+          or sequence of x coordinates if y is given. Coordinates are copied
+        :param y: optional sequence of y coordinates
+        """
+        if y is not None:
+            data=numpy.column_stack((data,y))
+        elif isinstance(data,Vector2Array):
+            data=data.xy
+        elif not isinstance(data,numpy.ndarray):
+            data=[argPair(p) for p in data]
+        self.xy=numpy.array(data,dtype=float).reshape(-1,2)
+
+    @classmethod
+    def _wrap(cls, xy):
+        """:return: array of class cls sharing the N×2 array xy"""
+        res=cls.__new__(cls)
+        res.xy=xy
+        return res
+
+    x = property(lambda self: self.xy[:,0], doc="view on x coordinates")
+    y = property(lambda self: self.xy[:,1], doc="view on y coordinates")
+
+    def __repr__(self):
+        res=', '.join(str(tuple(xy)) for xy in self.xy[:5].tolist())
+        if len(self)>5:
+            res+=', ...'
+        return '%s([%s])' % (self.__class__.__name__,res)
+
+    def __len__(self):
+        return len(self.xy)
+
+    def __iter__(self):
+        item=self._item
+        for x,y in self.xy.tolist():
+            yield item(x,y)
+
+    def __getitem__(self, key):
+        if isinstance(key,six.integer_types+(numpy.integer,)):
+            return self._item(*self.xy[key].tolist())
+        return self._wrap(self.xy[key])
+
+    def __setitem__(self, key, value):
+        self.xy[key]=_coords(value)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.xy if dtype is None else self.xy.astype(dtype)
+
+    def __eq__(self, other):
+        """:return: bool True if all vectors are equal"""
+        try:
+            return numpy.array_equal(self.xy,_coords(other))
+        except (TypeError,ValueError):
+            return False
+
+    def __ne__(self, other):
+        return not self==other
+
+    __hash__ = None #mutable
+
+    def copy(self):
+        return self._wrap(self.xy.copy())
+
+    def _result(self, other):
+        """:return: class of self+other or self-other, following Vector2 rules"""
+        if not isinstance(other,(Vector2,Vector2Array)):
+            return self.__class__
+        ispoint=lambda v:isinstance(v,(Point2,Point2Array))
+        return Vector2Array if ispoint(self)==ispoint(other) else Point2Array
+
+    def __add__(self, other):
+        return self._result(other)._wrap(self.xy+_coords(other))
+
+    __radd__ = __add__
+
+    def __iadd__(self, other):
+        self.xy+=_coords(other)
+        return self
+
+    def __sub__(self, other):
+        return self._result(other)._wrap(self.xy-_coords(other))
+
+    def __rsub__(self, other):
+        return self._result(other)._wrap(_coords(other)-self.xy)
+
+    def __isub__(self, other):
+        self.xy-=_coords(other)
+        return self
+
+    def __mul__(self, k):
+        """:param k: scalar, or sequence of one scalar per vector"""
+        return Vector2Array._wrap(self.xy*_scalars(k))
+
+    __rmul__ = __mul__
+
+    def __imul__(self, k):
+        self.xy*=_scalars(k)
+        return self
+
+    def __truediv__(self, k):
+        return Vector2Array._wrap(self.xy/_scalars(k))
+
+    __div__ = __truediv__
+
+    def __itruediv__(self, k):
+        self.xy/=_scalars(k)
+        return self
+
+    __idiv__ = __itruediv__
+
+    def __neg__(self):
+        return Vector2Array._wrap(-self.xy)
+
+    def __abs__(self):
+        """:return: array of magnitudes"""
+        return numpy.hypot(self.xy[:,0],self.xy[:,1])
+
+    mag = __abs__
+
+    def mag2(self):
+        return numpy.einsum('ij,ij->i',self.xy,self.xy)
+
+    def normalize(self):
+        """normalizes non null vectors in place
+        :return: self
+        """
+        d=self.mag()
+        nz=d!=0
+        self.xy[nz]/=d[nz,numpy.newaxis]
+        return self
+
+    def normalized(self):
+        return self.copy().normalize()
+
+    def dot(self, other):
+        """:return: array of dot products with other vector(s)"""
+        return (self.xy*_coords(other)).sum(axis=-1)
+
+    def cross(self):
+        return Vector2Array._wrap(numpy.column_stack((self.xy[:,1],-self.xy[:,0])))
+
+    def angle(self, other=None, unit=False):
+        """angles between vectors.
+        :param other: optional Vector2 or array of vectors
+        :param unit: bool unused, for compatibility with Vector2.angle
+        :return: array of angles in radians to other, or of self directions if other=None
+        """
+        if other is None:
+            return numpy.arctan2(self.xy[:,1],self.xy[:,0])
+        o=_coords(other)
+        cross=self.xy[:,0]*o[...,1]-self.xy[:,1]*o[...,0]
+        return numpy.arctan2(numpy.abs(cross),self.dot(o))
+
+    def project(self, other):
+        """:return: Vector2Array of projections (components) of the vectors on other vector(s)"""
+        n=_coords(other)
+        n=n/numpy.hypot(n[...,0],n[...,1])[...,numpy.newaxis]
+        return Vector2Array._wrap(self.dot(n)[:,numpy.newaxis]*n)
+
+    def _apply_transform(self, mat3):
+        self.xy[:]=mat3.apply(self.xy,vectors=True)
+        return self
+
+class Point2Array(Vector2Array):
+    """
+    Array of 2D points stored in a N×2 numpy array of floats. See **Vector2Array**
+    """
+    _item=Point2
+
+    def distance(self, other):
+        """:return: array of distances to a point, or to each point of an array of same length"""
+        d=self.xy-_coords(other)
+        return numpy.hypot(d[:,0],d[:,1])
+
+    def _apply_transform(self, mat3):
+        self.xy[:]=mat3.apply(self.xy)
+        return self
+
 class Line2(Geometry):
     """
     A **Line2** is a line on a 2D plane extending to infinity in both directions;
@@ -1129,11 +1356,10 @@ class Arc2(Circle):
 
     def intersect(self, other):
         inters= other._intersect_circle(self)
-        if not inters: return None
-        try:
-            inters[1]
-        except:
-            inters=tuple(inters)
+        if isinstance(inters,Point2):
+            inters=[inters]
+        elif not isinstance(inters,list): #no or infinite number of intersections
+            return None
         res=[]
         for pt in inters:
             if pt in self:
@@ -1178,7 +1404,901 @@ class Ellipse(Circle):
         self.p = t * self.p
         self.r,self.r2=(self.p-self.c).xy
 
+# bulk intersections
+# --------------------------------------------------------------------------
+
+class _Shapes(object):
+    """coordinates of lines, circles and arcs gathered in numpy arrays for vectorized intersections"""
+
+    OTHER, LINE, CIRCLE = 0, 1, 2
+
+    def __init__(self, entities):
+        """
+        :param entities: list of Geometry. Ellipses and other Geometries are marked as OTHER
+        """
+        n=len(entities)
+        self.kind=numpy.zeros(n,dtype=int)
+        data=numpy.zeros((n,6)) # px,py,vx,vy,umin,umax for lines, cx,cy,r for circles
+        arcs=numpy.zeros((n,3)) # start angle, sweep angle, dir
+        self.isarc=numpy.zeros(n,dtype=bool)
+        points=[] # indexes of Point2 and Polylines, bounded by their min and max stored in p and v
+        self.others=[] # (index, entity) of other Geometries
+        for i,e in enumerate(entities):
+            if isinstance(e,Line2):
+                self.kind[i]=self.LINE
+                umin=0 if isinstance(e,(Ray2,Segment2)) else -numpy.inf
+                umax=1 if isinstance(e,Segment2) else numpy.inf
+                data[i]=(e.p.x,e.p.y,e.v.x,e.v.y,umin,umax)
+            elif isinstance(e,Circle) and not isinstance(e,Ellipse):
+                self.kind[i]=self.CIRCLE
+                data[i,:3]=(e.c.x,e.c.y,e.r)
+                if isinstance(e,Arc2):
+                    self.isarc[i]=True
+                    arcs[i]=(e.a,abs(e.angle()),e.dir)
+            elif isinstance(e,Point2):
+                points.append(i)
+                data[i,:4]=e.xy*2
+            elif isinstance(e,Polyline):
+                points.append(i)
+                data[i,:2]=e.xy.min(axis=0)
+                data[i,2:4]=e.xy.max(axis=0)
+            else:
+                self.others.append((i,e))
+        self.p,self.v,self.u=data[:,:2],data[:,2:4],data[:,4:6]
+        self.c,self.r=data[:,:2],data[:,2]
+        self.a,self.sweep,self.dir=arcs.T
+        self.points=numpy.array(points,dtype=int)
+
+    def boxes(self, full=False):
+        """
+        :param full: bool True to bound arcs by their full circle, which their **distance** method measures
+        :return: N×4 array of (xmin,ymin,xmax,ymax) bounding boxes, infinite for unbounded entities
+        """
+        inf=numpy.inf
+        res=numpy.empty((len(self.kind),4))
+        res[:,:2]=-inf
+        res[:,2:]=inf
+        lines=self.kind==self.LINE
+        p,v,u=self.p[lines],self.v[lines],self.u[lines]
+        with numpy.errstate(invalid='ignore'): # 0*inf
+            ends=(p+v*u[:,:1],p+v*u[:,1:])
+        ends=[numpy.where(numpy.isnan(e),p,e) for e in ends] # vertical or horizontal lines
+        res[lines,:2]=numpy.minimum(*ends)
+        res[lines,2:]=numpy.maximum(*ends)
+        circles=self.kind==self.CIRCLE
+        c,r=self.c[circles],self.r[circles,numpy.newaxis]
+        res[circles,:2]=c-r
+        res[circles,2:]=c+r
+        arcs=numpy.flatnonzero(self.isarc)
+        if len(arcs) and not full: # bound arcs by their ends and the quadrant points they contain
+            c,r=self.c[arcs],self.r[arcs,numpy.newaxis]
+            a=self.a[arcs]
+            b=a+self.dir[arcs]*self.sweep[arcs]
+            pts=[c+r*numpy.column_stack((numpy.cos(t),numpy.sin(t))) for t in (a,b)]
+            lo,hi=numpy.minimum(*pts),numpy.maximum(*pts)
+            for k,axis,sign in ((0,0,1),(pi/2,1,1),(pi,0,-1),(-pi/2,1,-1)):
+                on=_on_arcs(numpy.full(len(arcs),k),a,self.sweep[arcs],self.dir[arcs])
+                q=c[:,axis]+sign*r[:,0]
+                if sign>0:
+                    hi[on,axis]=q[on]
+                else:
+                    lo[on,axis]=q[on]
+            res[arcs,:2]=lo
+            res[arcs,2:]=hi
+        res[self.points,:2]=self.p[self.points]
+        res[self.points,2:]=self.v[self.points]
+        for i,e in self.others: # drawing Entities have a bbox
+            try:
+                res[i]=e.bbox()()
+            except Exception: # no or empty bbox : keep infinite box
+                pass
+        return res
+
+    def take(self, i):
+        """:return: dict of coordinates arrays of entities i"""
+        return dict(p=self.p[i],v=self.v[i],u=self.u[i],c=self.c[i],r=self.r[i],
+            arc=self.isarc[i],a=self.a[i],sweep=self.sweep[i],dir=self.dir[i])
+
+def _on_arcs(t, a, sweep, dir):
+    """:return: bool array True where angles t are within arcs starting at a, of sweep angle in dir"""
+    d=numpy.mod((t-a)*dir,2*pi)
+    tol=2*pi*_reltol
+    return (d<=sweep+tol) | (d>=2*pi-tol)
+
+def _on_shapes(xy, s):
+    """:return: bool array True where points xy are on the circles or arcs s"""
+    res=numpy.ones(len(xy),dtype=bool)
+    arc=s['arc']
+    if arc.any():
+        d=xy[arc]-s['c'][arc]
+        t=numpy.arctan2(d[:,1],d[:,0])
+        res[arc]=_on_arcs(t,s['a'][arc],s['sweep'][arc],s['dir'][arc])
+    return res
+
+def _ranges(start, stop):
+    """:return: index, value int arrays : for each i, all values in range(start[i],stop[i])"""
+    n=numpy.maximum(stop-start,0)
+    index=numpy.repeat(numpy.arange(len(n)),n)
+    offsets=numpy.arange(n.sum())-numpy.repeat(numpy.cumsum(n)-n,n)
+    return index,numpy.repeat(start,n)+offsets
+
+def _padded(boxes):
+    """:return: boxes enlarged by the relative tolerance, so that touching boxes overlap despite rounding"""
+    with numpy.errstate(invalid='ignore'): # inf*0
+        eps=_reltol*numpy.maximum(1,numpy.abs(boxes).max(axis=1,initial=0,where=numpy.isfinite(boxes)))
+    return boxes+numpy.outer(eps,(-1,-1,1,1))
+
+def _sweep(a, b=None):
+    """broad phase : sort and sweep of bounding boxes along x
+    :param a: N×4 array of (xmin,ymin,xmax,ymax) boxes
+    :param b: optional M×4 array of boxes. If None, pairs are searched within a
+    :return: i,j int arrays of indexes of pairs of overlapping boxes, with i<j if b is None
+    """
+    oa=numpy.argsort(a[:,0],kind='mergesort')
+    xa=a[oa,0]
+    if b is None: # each box with the next ones starting before its end
+        k,l=_ranges(numpy.arange(1,len(a)+1),numpy.searchsorted(xa,a[oa,2],'right'))
+        i,j=oa[k],oa[l]
+        other=a
+    else: # boxes of b starting within boxes of a, then boxes of a starting within boxes of b
+        ob=numpy.argsort(b[:,0],kind='mergesort')
+        xb=b[ob,0]
+        k,l=_ranges(numpy.searchsorted(xb,xa,'left'),numpy.searchsorted(xb,a[oa,2],'right'))
+        i1,j1=oa[k],ob[l]
+        l,k=_ranges(numpy.searchsorted(xa,xb,'right'),numpy.searchsorted(xa,b[ob,2],'right'))
+        i=numpy.concatenate((i1,oa[k]))
+        j=numpy.concatenate((j1,ob[l]))
+        other=b
+    keep=(a[i,1]<=other[j,3]) & (other[j,1]<=a[i,3])
+    i,j=i[keep],j[keep]
+    if b is None:
+        i,j=numpy.minimum(i,j),numpy.maximum(i,j)
+    return i,j
+
+def _intersect_lines_lines(A, B):
+    """vectorized Line2/Line2 intersections of non parallel lines
+    :return: pairs index, N×2 coordinates array
+    """
+    pa,va,pb,vb=A['p'],A['v'],B['p'],B['v']
+    d=vb[:,1]*va[:,0]-vb[:,0]*va[:,1]
+    d=numpy.where(d==0,numpy.nan,d) # parallel lines are handled elsewhere
+    dp=pa-pb
+    ua=(vb[:,0]*dp[:,1]-vb[:,1]*dp[:,0])/d
+    ub=(va[:,0]*dp[:,1]-va[:,1]*dp[:,0])/d
+    ok=(A['u'][:,0]<=ua) & (ua<=A['u'][:,1]) & (B['u'][:,0]<=ub) & (ub<=B['u'][:,1])
+    index=numpy.flatnonzero(ok)
+    return index,pa[index]+ua[index,numpy.newaxis]*va[index]
+
+def _intersect_lines_circles(L, C):
+    """vectorized Line2/Circle intersections
+    :return: pairs index, N×2 coordinates array
+    """
+    p,v,c,r=L['p'],L['v'],C['c'],C['r']
+    a=numpy.einsum('ij,ij->i',v,v)
+    dp=p-c
+    b=2*numpy.einsum('ij,ij->i',v,dp)
+    cc=numpy.einsum('ij,ij->i',dp,dp)-r*r
+    det=b*b-4*a*cc
+    valid=(det>=0) & (a>0)
+    sq=numpy.sqrt(numpy.where(valid,det,0))
+    a=numpy.where(valid,a,1)
+    index,xy=[],[]
+    for s,u in ((1,(-b+sq)/(2*a)),(-1,(-b-sq)/(2*a))):
+        ok=valid & (L['u'][:,0]<=u) & (u<=L['u'][:,1])
+        if s<0:
+            ok&=det>0 # tangent lines have a single intersection
+        i=numpy.flatnonzero(ok)
+        pts=p[i]+u[i,numpy.newaxis]*v[i]
+        on=_on_shapes(pts,dict((k,x[i]) for k,x in C.items()))
+        index.append(i[on])
+        xy.append(pts[on])
+    return _pairs_order(index,xy)
+
+def _intersect_circles_circles(A, B):
+    """vectorized Circle/Circle intersections. Nested and concentric circles do not intersect
+    :return: pairs index, N×2 coordinates array
+    """
+    ca,ra,cb,rb=A['c'],A['r'],B['c'],B['r']
+    v=cb-ca
+    d=numpy.hypot(v[:,0],v[:,1])
+    valid=(d<=ra+rb) & (d>=abs(ra-rb)) & (d>0)
+    d=numpy.where(valid,d,1)
+    x=(d*d+ra*ra-rb*rb)/(2*d)
+    y=numpy.sqrt(numpy.maximum(ra*ra-x*x,0))
+    n=v/d[:,numpy.newaxis]
+    p=ca+x[:,numpy.newaxis]*n
+    m=numpy.column_stack((-n[:,1],n[:,0])) # n.cross()
+    single=numpy.isclose(y,0)
+    index,xy=[],[]
+    for s in (1,-1):
+        ok=valid & ~single if s<0 else valid
+        i=numpy.flatnonzero(ok)
+        pts=p[i]+s*y[i,numpy.newaxis]*m[i]
+        on=_on_shapes(pts,dict((k,a[i]) for k,a in A.items()))
+        on&=_on_shapes(pts,dict((k,b[i]) for k,b in B.items()))
+        index.append(i[on])
+        xy.append(pts[on])
+    return _pairs_order(index,xy)
+
+def _pairs_order(index, xy):
+    """:return: concatenated index and coordinates, stable sorted by index"""
+    index=numpy.concatenate(index)
+    order=numpy.argsort(index,kind='mergesort')
+    return index[order],numpy.concatenate(xy)[order]
+
+def _points(inter):
+    """:return: list of Point2 from the result of a scalar intersect"""
+    if inter is None:
+        return []
+    if isinstance(inter,Point2):
+        return [inter]
+    if isinstance(inter,Segment2): # overlapping segments
+        return [inter.p,inter.p2]
+    if isinstance(inter,list):
+        return inter
+    return [] # infinite number of intersections
+
+def intersections(entities, others=None):
+    """all intersections between entities, or between entities and others, in a single vectorized pass
+
+    candidate pairs are found by a sort and sweep of the bounding boxes,
+    then intersections of lines, rays, segments, circles and arcs are computed with numpy.
+    Other Geometries, as well as parallel lines, use their **intersect** method.
+
+    :param entities: list of Geometry
+    :param others: optional list of Geometry. If None, entities are intersected with each other
+    :return: list of (Point2, i, j) tuples of intersection points between entities[i] and others[j]
+      (or entities[j] with i<j), sorted by i and j
+    """
+    a=_Shapes(entities)
+    if others is None:
+        b,others=a,entities
+        i,j=_sweep(_padded(a.boxes()))
+    else:
+        b=_Shapes(others)
+        i,j=_sweep(_padded(a.boxes()),_padded(b.boxes()))
+    ka,kb=a.kind[i],b.kind[j]
+    index,xy=[],[]
+    def add(pairs, compute, swap=False):
+        pairs=numpy.flatnonzero(pairs)
+        A,B=a.take(i[pairs]),b.take(j[pairs])
+        k,pts=compute(*((B,A) if swap else (A,B)))
+        index.append(pairs[k])
+        xy.append(pts)
+    LINE,CIRCLE=_Shapes.LINE,_Shapes.CIRCLE
+    add((ka==LINE) & (kb==LINE),_intersect_lines_lines)
+    add((ka==LINE) & (kb==CIRCLE),_intersect_lines_circles)
+    add((ka==CIRCLE) & (kb==LINE),_intersect_lines_circles,swap=True)
+    add((ka==CIRCLE) & (kb==CIRCLE),_intersect_circles_circles)
+    index,xy=_pairs_order(index,xy)
+    res=[(Point2(x,y),k) for k,(x,y) in zip(index.tolist(),xy.tolist())]
+    # scalar intersections
+    vb=b.v[j]
+    parallel=(ka==LINE) & (kb==LINE) & (vb[:,1]*a.v[i,0]==vb[:,0]*a.v[i,1])
+    for k in numpy.flatnonzero(parallel | (ka==_Shapes.OTHER) | (kb==_Shapes.OTHER)).tolist():
+        e1,e2=entities[i[k]],others[j[k]]
+        inter=e2.intersect(e1) if isinstance(e2,Point2) else e1.intersect(e2)
+        res.extend((p,k) for p in _points(inter))
+    res.sort(key=lambda r:(i[r[1]],j[r[1]]))
+    return [(p,int(i[k]),int(j[k])) for p,k in res]
+
+# spatial index
+# --------------------------------------------------------------------------
+
+def _box_distance(boxes, q):
+    """:return: array of lower bounds of distances between N×4 boxes and box q"""
+    dx=numpy.fmax(numpy.fmax(boxes[:,0]-q[2],q[0]-boxes[:,2]),0) # fmax ignores NaN of infinite boxes
+    dy=numpy.fmax(numpy.fmax(boxes[:,1]-q[3],q[1]-boxes[:,3]),0)
+    return numpy.hypot(dx,dy)
+
+def _morton(xy):
+    """:return: int array of positions of N×2 coordinates along a Z-order curve"""
+    if len(xy)==0:
+        return numpy.zeros(0,dtype=numpy.int64)
+    lo=xy.min(axis=0)
+    size=(xy.max(axis=0)-lo).max() or 1
+    res=0
+    for k in range(2): # interleave bits of 16 bits ints
+        v=((xy[:,k]-lo[k])/size*0xffff).astype(numpy.int64)
+        v=(v|(v<<8))&0x00FF00FF
+        v=(v|(v<<4))&0x0F0F0F0F
+        v=(v|(v<<2))&0x33333333
+        v=(v|(v<<1))&0x55555555
+        res=res|(v<<k)
+    return res
+
+def _overlap(boxes, q):
+    """:return: bool array True where N×4 boxes overlap box q"""
+    return (boxes[:,0]<=q[2]) & (q[0]<=boxes[:,2]) & (boxes[:,1]<=q[3]) & (q[1]<=boxes[:,3])
+
+class SpatialIndex(object):
+    """
+    Bounding volume hierarchy of Geometries for fast nearest, distance and box queries::
+
+        >>> index = SpatialIndex([Point2(0,0), Segment2((1,1),(2,1)), Circle((5,5),1)])
+        >>> index.nearest(Point2(1.5,1.5))
+        [(0.5, Segment2(Point2(1, 1),Point2(2, 1)))]
+
+    Points, lines, circles and arcs are bounded by numpy, other Geometries
+    such as drawing Entities by their **bbox** method. Candidates found
+    by their bounding boxes are refined with their **distance** method.
+    As **Arc2.distance** is the distance to the full circle, arcs are bounded by their circle.
+
+    The tree is built at once with numpy. Inserted entities are kept in a
+    pending list, and removed ones are just forgotten, until the tree is rebuilt
+    automatically when these changes become significant.
+    """
+
+    def __init__(self, entities=[], leafsize=16):
+        """
+        :param entities: iterable of Geometry
+        :param leafsize: int max number of children of each node
+        """
+        self.leafsize=leafsize
+        self._entities=[] # by slot, None when removed
+        self._slots={} # id(entity):slot
+        self._boxes=numpy.zeros((0,4))
+        self._order=numpy.zeros(0,dtype=int) # slots of entities in tree, in leaves order
+        self._nodes=[] # N×4 arrays of boxes of nodes from bottom to top of tree
+        self._pending=[] # slots of entities inserted since the tree was built
+        self._unbounded=[] # slots of entities with infinite bounding box
+        self._removed=0
+        self.extend(entities)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __iter__(self):
+        return (e for e in self._entities if e is not None)
+
+    def __contains__(self, entity):
+        return id(entity) in self._slots
+
+    def __repr__(self):
+        return '%s(%d entities)' % (self.__class__.__name__,len(self))
+
+    def extend(self, entities):
+        """adds entities to index
+        :param entities: iterable of Geometry
+        """
+        entities=[e for e in entities if id(e) not in self._slots]
+        if not entities:
+            return
+        n=len(self._entities)
+        for i,e in enumerate(entities,n):
+            self._slots[id(e)]=i
+        self._entities.extend(entities)
+        self._boxes=numpy.concatenate((self._boxes,_Shapes(entities).boxes(full=True)))
+        self._pending.extend(range(n,n+len(entities)))
+        if len(self._pending)>max(4*self.leafsize,len(self._order)//4):
+            self.rebuild()
+
+    def insert(self, entity):
+        """adds entity to index. Use extend to add many entities"""
+        self.extend([entity])
+
+    def remove(self, entity):
+        """removes entity from index
+        :raise KeyError: if entity is not in index
+        """
+        slot=self._slots.pop(id(entity))
+        self._entities[slot]=None
+        self._removed+=1
+        if self._removed>len(self._slots):
+            self.rebuild()
+
+    def update(self, entity):
+        """updates index after entity was modified (moved, resized ...)"""
+        self.remove(entity)
+        self.insert(entity)
+
+    def rebuild(self):
+        """builds the tree of all entities, packed along a Z-order curve"""
+        keep=[e for e in self._entities if e is not None]
+        boxes=self._boxes[[self._slots[id(e)] for e in keep]] if keep else numpy.zeros((0,4))
+        self._entities=keep
+        self._slots=dict((id(e),i) for i,e in enumerate(keep))
+        self._boxes=boxes
+        self._removed=0
+        self._pending=[]
+        bounded=numpy.isfinite(boxes).all(axis=1)
+        self._unbounded=numpy.flatnonzero(~bounded).tolist() # always checked
+        slots=numpy.flatnonzero(bounded)
+        self._order=slots[numpy.argsort(_morton((boxes[slots,:2]+boxes[slots,2:])/2),kind='mergesort')]
+        self._nodes=[]
+        boxes=boxes[self._order]
+        while len(boxes)>self.leafsize: # consecutive boxes are packed in nodes of the upper level
+            start=numpy.arange(0,len(boxes),self.leafsize)
+            boxes=numpy.column_stack((
+                numpy.minimum.reduceat(boxes[:,0],start),numpy.minimum.reduceat(boxes[:,1],start),
+                numpy.maximum.reduceat(boxes[:,2],start),numpy.maximum.reduceat(boxes[:,3],start)))
+            self._nodes.append(boxes)
+
+    def _children(self, level, nodes):
+        """:return: indexes of children of nodes of level in level-1"""
+        below=self._nodes[level-2] if level>1 else self._order
+        return _ranges(nodes*self.leafsize,numpy.minimum((nodes+1)*self.leafsize,len(below)))[1]
+
+    def _leaves(self, level):
+        """:return: boxes of nodes of level, where level 0 are entities in leaves order"""
+        return self._nodes[level-1] if level else self._boxes[self._order]
+
+    def _search(self, q):
+        """:return: list of slots of entities whose bounding box overlaps box q"""
+        level=len(self._nodes)
+        nodes=numpy.arange(len(self._leaves(level)))
+        while True:
+            nodes=nodes[_overlap(self._leaves(level)[nodes],q)]
+            if level==0:
+                break
+            nodes=self._children(level,nodes)
+            level-=1
+        slots=self._order[nodes].tolist()
+        pending=numpy.array(self._pending+self._unbounded,dtype=int)
+        slots.extend(pending[_overlap(self._boxes[pending],q)].tolist())
+        return [s for s in slots if self._entities[s] is not None]
+
+    def box(self, xmin, ymin, xmax, ymax):
+        """:return: list of entities whose bounding box overlaps the (xmin,ymin,xmax,ymax) box"""
+        return [self._entities[s] for s in self._search((xmin,ymin,xmax,ymax))]
+
+    def within(self, query, radius):
+        """
+        :param query: Geometry
+        :param radius: float max distance
+        :return: list of (distance, entity) of entities at most at radius from query, sorted by distance
+        """
+        q=_Shapes([query]).boxes(full=True)[0]+(-radius,-radius,radius,radius)
+        res=[]
+        for s in self._search(q):
+            e=self._entities[s]
+            d=e.distance(query)
+            if d is not None and d<=radius:
+                res.append((d,s,e))
+        res.sort(key=lambda r:r[:2])
+        return [(d,e) for d,_,e in res]
+
+    def nearest(self, query, k=1):
+        """best first search of the k nearest entities
+        :param query: Geometry
+        :param k: int number of entities
+        :return: list of (distance, entity) of the k entities nearest to query, sorted by distance
+        """
+        q=_Shapes([query]).boxes(full=True)[0]
+        # heap of (distance, exact, level, index). Nodes have a lower bound of distance, entities at level 0
+        # are pushed with the bound of their box, then with their exact distance
+        heap=[]
+        def push(level, indexes):
+            slots=indexes if level else self._order[indexes]
+            bounds=_box_distance(self._leaves(level)[indexes] if level else self._boxes[slots],q)
+            for d,i in zip(bounds.tolist(),(indexes if level else slots).tolist()):
+                heapq.heappush(heap,(d,False,level,i))
+        level=len(self._nodes)
+        push(level,numpy.arange(len(self._leaves(level))))
+        slots=self._pending+self._unbounded
+        for d,s in zip(_box_distance(self._boxes[slots],q).tolist(),slots):
+            heapq.heappush(heap,(d,False,0,s))
+        res=[]
+        while heap and len(res)<k:
+            d,exact,level,i=heapq.heappop(heap)
+            if exact:
+                res.append((d,self._entities[i]))
+            elif level:
+                push(level-1,self._children(level,numpy.array([i])))
+            else:
+                e=self._entities[i]
+                if e is not None:
+                    d=e.distance(query)
+                    if d is not None:
+                        heapq.heappush(heap,(d,True,0,i))
+        return res
+
+# polylines and polygons
+# --------------------------------------------------------------------------
+
+def _cross(a, b):
+    """:return: array of z components of cross products of N×2 arrays of vectors"""
+    return a[:,0]*b[:,1]-a[:,1]*b[:,0]
+
+def _douglas_peucker(xy, tol):
+    """:return: bool array of points of polyline xy kept by Douglas-Peucker simplification"""
+    keep=numpy.zeros(len(xy),dtype=bool)
+    keep[[0,-1]]=True
+    stack=[(0,len(xy)-1)]
+    while stack:
+        i,j=stack.pop()
+        if j<=i+1:
+            continue
+        a,v=xy[i],xy[j]-xy[i]
+        w=xy[i+1:j]-a
+        n=hypot(*v)
+        if n==0: # closed chord : distance to point
+            d=numpy.hypot(w[:,0],w[:,1])
+        else:
+            d=abs(v[0]*w[:,1]-v[1]*w[:,0])/n
+        k=int(numpy.argmax(d))
+        if d[k]>tol:
+            k+=i+1
+            keep[k]=True
+            stack.extend(((i,k),(k,j)))
+    return keep
+
+def _winding(xy, a, b):
+    """winding numbers of points, by crossings of a ray towards +x (Dan Sunday's algorithm)
+    :param xy: N×2 array of points
+    :param a,b: E×2 arrays of start and end points of edges of closed rings
+    :return: int array of winding numbers of xy
+    """
+    order=numpy.argsort(xy[:,1],kind='mergesort')
+    y=xy[order,1]
+    lo,hi=numpy.minimum(a[:,1],b[:,1]),numpy.maximum(a[:,1],b[:,1])
+    e,k=_ranges(numpy.searchsorted(y,lo,'left'),numpy.searchsorted(y,hi,'left')) # points with lo<=y<hi
+    k=order[k]
+    side=_cross(b[e]-a[e],xy[k]-a[e]) # >0 if point is left of edge
+    up=a[e,1]<b[e,1]
+    res=numpy.bincount(k[up & (side>0)],minlength=len(xy))
+    return res-numpy.bincount(k[~up & (side<0)],minlength=len(xy))
+
+def _distances(xy, a, b):
+    """
+    :param xy: N×2 array of points
+    :param a,b: E×2 arrays of start and end points of segments
+    :return: array of distances of points to nearest segment
+    """
+    v=b-a
+    n2=numpy.einsum('ij,ij->i',v,v)
+    n2[n2==0]=1 # degenerate segments : u=0
+    res=numpy.empty(len(xy))
+    step=max(1,2**20//max(len(a),1)) # limit memory of N×E arrays
+    for k in range(0,len(xy),step):
+        w=xy[k:k+step,numpy.newaxis,:]-a
+        u=numpy.clip(numpy.einsum('ijk,jk->ij',w,v)/n2,0,1)
+        d=w-u[:,:,numpy.newaxis]*v
+        res[k:k+step]=numpy.hypot(d[:,:,0],d[:,:,1]).min(axis=1)
+    return res
+
+def _edges(polylines):
+    """:return: start and end points arrays of all edges of polylines"""
+    edges=[p._edges() for p in polylines]
+    if not edges:
+        return numpy.zeros((0,2)),numpy.zeros((0,2))
+    return numpy.concatenate([a for a,_ in edges]),numpy.concatenate([b for _,b in edges])
+
+def _split(a, b, eps):
+    """splits edges where they cross, or where a vertex of another edge lies on them
+    :param a,b: E×2 arrays of start and end points of edges
+    :param eps: float distance under which points are merged
+    :return: start and end points arrays of sub edges
+    """
+    i,j=_sweep(numpy.column_stack((numpy.minimum(a,b)-eps,numpy.maximum(a,b)+eps)))
+    v=b-a
+    n2=numpy.einsum('ij,ij->i',v,v)
+    e,t,xy=[],[],[]
+    # crossing edges
+    d=_cross(v[i],v[j])
+    w=a[j]-a[i]
+    with numpy.errstate(divide='ignore',invalid='ignore'):
+        ti=_cross(w,v[j])/d
+        tj=_cross(w,v[i])/d
+    ei,ej=eps/numpy.sqrt(n2[i]),eps/numpy.sqrt(n2[j])
+    ok=(d!=0) & (ti>ei) & (ti<1-ei) & (tj>ej) & (tj<1-ej)
+    p=a[i[ok]]+ti[ok,numpy.newaxis]*v[i[ok]]
+    e.extend((i[ok],j[ok]))
+    t.extend((ti[ok],tj[ok]))
+    xy.extend((p,p))
+    # vertices on edges
+    for k,l in ((i,j),(j,i)):
+        for q in (a[l],b[l]):
+            w=q-a[k]
+            s=numpy.einsum('ij,ij->i',w,v[k])/n2[k]
+            dist=abs(_cross(v[k],w))/numpy.sqrt(n2[k])
+            ok=(dist<=eps) & (s>0) & (s<1) & (numpy.hypot(*(w-s[:,numpy.newaxis]*v[k]).T)<=eps)
+            ok&=(numpy.hypot(*w.T)>eps) & (numpy.hypot(*(q-b[k]).T)>eps)
+            e.append(k[ok])
+            t.append(s[ok])
+            xy.append(q[ok])
+    n=numpy.arange(len(a))
+    e=numpy.concatenate([n,n]+e)
+    t=numpy.concatenate([numpy.zeros(len(a)),numpy.ones(len(a))]+t)
+    xy=numpy.concatenate([a,b]+xy)
+    order=numpy.lexsort((t,e))
+    e,xy=e[order],xy[order]
+    same=e[1:]==e[:-1]
+    a,b=xy[:-1][same],xy[1:][same]
+    keep=numpy.hypot(*(b-a).T)>eps
+    return a[keep],b[keep]
+
+def _rings(a, b):
+    """chains edges into closed rings
+    :return: list of N×2 arrays of vertices
+    """
+    out={}
+    for k,p in enumerate(map(tuple,a.tolist())):
+        out.setdefault(p,[]).append(k)
+    ends=list(map(tuple,b.tolist()))
+    used=numpy.zeros(len(a),dtype=bool)
+    res=[]
+    for k in range(len(a)):
+        if used[k]:
+            continue
+        ring=[]
+        while not used[k]:
+            used[k]=True
+            ring.append(k)
+            nexts=[l for l in out.get(ends[k],[]) if not used[l]]
+            if not nexts:
+                break
+            k=nexts[0]
+        if len(ring)>2:
+            res.append(a[ring])
+    return res
+
+def _overlay(a, b, f):
+    """boolean operation on regions delimited by closed polygons, with positive winding rule
+    :param a,b: lists of Polygon
+    :param f: function(ina,inb) of bool arrays returning bool array of points in result
+    :return: list of Polygon : counterclockwise outer rings and clockwise holes
+    """
+    (aa,ab),(ba,bb)=_edges(a),_edges(b)
+    xy=numpy.concatenate((aa,ba))
+    if len(xy)==0:
+        return []
+    scale=numpy.abs(xy).max() or 1
+    eps=2.0**(numpy.frexp(scale)[1]-40) # power of 2 to snap vertices exactly on a grid
+    snap=lambda x:numpy.round(x/eps)*eps
+    aa,ab,ba,bb=map(snap,(aa,ab,ba,bb))
+    s,e=_split(numpy.concatenate((aa,ba)),numpy.concatenate((ab,bb)),eps)
+    # classify each sub edge by the regions on its left and right
+    v=e-s
+    n=numpy.column_stack((-v[:,1],v[:,0]))/numpy.hypot(v[:,0],v[:,1])[:,numpy.newaxis]
+    m=(s+e)/2
+    h=scale*1E-9
+    pts=numpy.concatenate((m+h*n,m-h*n))
+    res=f(_winding(pts,aa,ab)>0,_winding(pts,ba,bb)>0)
+    left,right=res[:len(s)],res[len(s):]
+    keep=left!=right
+    s,e,left=s[keep],e[keep],left[keep]
+    s,e=numpy.where(left[:,numpy.newaxis],s,e),numpy.where(left[:,numpy.newaxis],e,s) # result on left
+    _,unique=numpy.unique(numpy.column_stack((s,e)),axis=0,return_index=True) # shared edges
+    unique.sort()
+    s,e=s[unique],e[unique]
+    return [Polygon(r).simplify(eps*10) for r in _rings(s,e)]
+
+class Polyline(Geometry):
+    """
+    Open chain of segments through points stored in a N×2 numpy array of floats::
+
+        >>> p = Polyline([(0,0), (1,0), (1,1)])
+        >>> p.length
+        2.0
+        >>> p.distance(Point2(2,0))
+        1.0
+
+    Most computations are vectorized on all segments at once.
+    """
+    def __init__(self, points=()):
+        """
+        :param points: Polyline, Vector2Array, N×2 array-like or iterable of Point2 or (x,y) pairs
+        """
+        super(Polyline,self).__init__()
+        if isinstance(points,Polyline):
+            points=points.xy
+        self.xy=Point2Array(points).xy
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__,Point2Array._wrap(self.xy))
+
+    def __len__(self):
+        return len(self.xy)
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def __getitem__(self, i):
+        return self.points[i]
+
+    def __eq__(self, other):
+        return type(self) is type(other) and numpy.array_equal(self.xy,other.xy)
+
+    def __ne__(self, other):
+        return not self==other
+
+    __hash__=None
+
+    points = property(lambda self: Point2Array._wrap(self.xy), doc="Point2Array view of vertices")
+
+    def _edges(self):
+        """:return: start and end points arrays of segments"""
+        return self.xy[:-1],self.xy[1:]
+
+    def segments(self):
+        """:return: list of Segment2"""
+        return [Segment2(p,q) for p,q in zip(*[Point2Array._wrap(x) for x in self._edges()])]
+
+    def __abs__(self):
+        """:return: float length"""
+        a,b=self._edges()
+        return numpy.hypot(*(b-a).T).sum().item()
+
+    length = property(lambda self: abs(self))
+
+    def _apply_transform(self, mat3):
+        self.xy=mat3.apply(self.xy)
+
+    def reverse(self):
+        """reverses the order of points in place"""
+        self.xy=self.xy[::-1].copy()
+        return self
+
+    swap=reverse # for coherency
+
+    def distance(self, other):
+        """:return: float minimum distance to a Point2 (vectorized) or to another Geometry"""
+        if isinstance(other,Point2):
+            if len(self)<2:
+                return other.distance(self[0])
+            return _distances(numpy.array([other.xy]),*self._edges())[0].item()
+        return min(s.distance(other) for s in self.segments())
+
+    def connect(self, other):
+        return min((s.connect(other) for s in self.segments()), key=lambda c:c.length)
+
+    def intersect(self, other):
+        """:return: list of Point2 intersections with other Geometry, or None"""
+        res=[p for p,_,_ in intersections(self.segments(),[other])]
+        return res or None
+
+    def _intersect_line2(self, other):
+        return self.intersect(other)
+
+    def _intersect_circle(self, other):
+        return self.intersect(other)
+
+    def simplify(self, tol):
+        """Douglas-Peucker simplification
+        :param tol: float max distance between original and simplified polylines
+        :return: simplified copy
+        """
+        if len(self)<3:
+            return self.__class__(self)
+        return self.__class__(self.xy[_douglas_peucker(self.xy,tol)])
+
+    def offset(self, d):
+        """parallel polyline, with miter joins
+        :param d: float distance, positive on the left side
+        :return: Polyline
+        """
+        a,b=self._edges()
+        v=b-a
+        n=numpy.column_stack((-v[:,1],v[:,0]))/numpy.hypot(v[:,0],v[:,1])[:,numpy.newaxis]
+        n=numpy.concatenate((n[:1],n,n[-1:])) # normals before and after each point
+        return Polyline(self.xy+d*_miter(n[:-1],n[1:]))
+
+def _miter(n1, n2):
+    """:return: offset vectors of vertices between edges with unit normals n1 and n2"""
+    k=1+numpy.einsum('ij,ij->i',n1,n2)
+    return (n1+n2)/numpy.maximum(k,1E-6)[:,numpy.newaxis]
+
+class Polygon(Polyline):
+    """
+    Closed Polyline. The last point is implicitly connected to the first one::
+
+        >>> p = Polygon([(0,0), (2,0), (2,2), (0,2)])
+        >>> p.area, p.centroid
+        (4.0, Point2(1.0, 1.0))
+        >>> p.contains([(1,1), (3,1)])
+        array([ True, False])
+
+    Boolean operations return lists of Polygons where counterclockwise rings
+    are outer boundaries and clockwise rings are holes, which is the convention
+    used for operands given as lists of Polygons.
+    """
+    def _edges(self):
+        return self.xy,numpy.roll(self.xy,-1,axis=0)
+
+    @property
+    def signed_area(self):
+        """:return: float area, positive if polygon is counterclockwise"""
+        a,b=self._edges()
+        return _cross(a,b).sum().item()/2
+
+    @property
+    def area(self):
+        return abs(self.signed_area)
+
+    def orientation(self):
+        """:return: +1 if polygon is counterclockwise, -1 if clockwise"""
+        return 1 if self.signed_area>=0 else -1
+
+    @property
+    def centroid(self):
+        """:return: Point2 center of mass of polygon"""
+        a,b=self._edges()
+        c=_cross(a,b)
+        s=c.sum()
+        if s==0: # degenerate polygon
+            return Point2(*self.xy.mean(axis=0).tolist())
+        return Point2(*(((a+b)*c[:,numpy.newaxis]).sum(axis=0)/(3*s)).tolist())
+
+    def winding(self, points):
+        """
+        :param points: Point2, Point2Array or N×2 array-like
+        :return: int or array of winding numbers of points around polygon
+        """
+        if isinstance(points,Point2):
+            return self.winding([points.xy])[0].item()
+        return _winding(numpy.asarray(_coords(points),dtype=float).reshape(-1,2),*self._edges())
+
+    def contains(self, points):
+        """:return: bool array True for points inside polygon, vectorized"""
+        return self.winding(points)!=0
+
+    def __contains__(self, pt):
+        """:return: True if pt is ON or IN the polygon"""
+        return self.winding(pt)!=0 or isclose(self.distance(pt),0,_reltol)
+
+    def simplify(self, tol):
+        xy=numpy.concatenate((self.xy,self.xy[:1])) # simplify closed ring
+        keep=_douglas_peucker(xy,tol)[:-1]
+        if keep.sum()<3: # keep a triangle
+            return Polygon(self)
+        return Polygon(self.xy[keep])
+
+    def offset(self, d):
+        """grown (d>0) or shrunk (d<0) polygon, with miter joins
+        :param d: float distance
+        :return: list of Polygons, since shrinking may split polygon, or make it disappear
+        """
+        a,b=self._edges()
+        v=self.orientation()*(b-a)
+        n=numpy.column_stack((v[:,1],-v[:,0]))/numpy.hypot(v[:,0],v[:,1])[:,numpy.newaxis] # outwards
+        res=Polygon(self.xy+d*_miter(numpy.roll(n,1,axis=0),n))
+        if self.orientation()<0:
+            res.reverse()
+        res=_overlay([res],[],lambda a,b:a) # removes loops
+        # remove inverted parts, closer than d to polygon
+        return [p for p in res if _distances(p.xy,a,b).min()>=abs(d)*(1-_reltol)]
+
+    def _operands(self, other):
+        """:return: lists of Polygons of self and other, counterclockwise if single"""
+        a=[self if self.orientation()>0 else Polygon(self).reverse()]
+        if isinstance(other,Polygon):
+            other=[other if other.orientation()>0 else Polygon(other).reverse()]
+        return a,list(other)
+
+    def union(self, other):
+        """
+        :param other: Polygon, or list of Polygons, possibly thousands, united at once
+        :return: list of Polygons of union
+        """
+        return _overlay(*self._operands(other),f=operator.or_)
+
+    def intersection(self, other):
+        """
+        :param other: Polygon or list of Polygons
+        :return: list of Polygons of intersection
+        """
+        return _overlay(*self._operands(other),f=operator.and_)
 
+    def difference(self, other):
+        """
+        :param other: Polygon or list of Polygons
+        :return: list of Polygons of self minus other
+        """
+        return _overlay(*self._operands(other),f=lambda a,b:a&~b)
+
+def _coefficients(m, names, n):
+    """
+    :param m: Matrix3 or Matrix4
+    :param names: string of coefficients attributes names in rows order
+    :param n: int matrix size
+    :return: n×n numpy array of coefficients, cached in m until they change
+    """
+    key=tuple(getattr(m,k) for k in names)
+    cache=m.__dict__.get('_cache')
+    if cache is None or cache[0]!=key:
+        cache=m._cache=(key,numpy.array(key,dtype=float).reshape(n,n))
+    return cache[1]
 
 class Matrix3(object):
     """
@@ -1514,6 +2634,28 @@ class Matrix3(object):
             res._apply_transform(self)
         return res
 
+    def __deepcopy__(self, memo):
+        """quick copy : coefficients are numbers"""
+        res=self.__class__.__new__(self.__class__)
+        res.__dict__.update(self.__dict__)
+        return res
+
+    def array(self):
+        """:return: 3x3 numpy array of coefficients, cached until the matrix changes. Do not modify"""
+        return _coefficients(self,'abcefgijk',3)
+
+    def apply(self, xy, vectors=False):
+        """transforms many points or vectors in a single operation
+        :param xy: N×2 array-like of coordinates
+        :param vectors: bool True if xy are vectors, which are not translated
+        :return: N×2 numpy array of transformed coordinates
+        """
+        m=self.array()
+        res=numpy.dot(numpy.asarray(xy,dtype=float).reshape(-1,2),m[:2,:2].T)
+        if not vectors:
+            res+=m[:2,2]
+        return res
+
     def __call__(self,other):
         return self*other
     
@@ -19,7 +19,12 @@ __revision__ = '$Revision$'
 import operator, six, abc
 
 from math import pi,sin,cos,tan,acos,asin,atan2,sqrt,hypot,copysign
-from .geom import Geometry,copy
+from .geom import Geometry,copy,_coefficients
+
+try: # needed only by batch transforms
+    import numpy
+except ImportError:
+    numpy=None
 
 # 3D Geometry
 # -------------------------------------------------------------------------
@@ -1057,6 +1062,34 @@ class Matrix4(object):
         self.p = Am * Bd + An * Bh + Ao * Bl + Ap * Bp
         return self
 
+    def __deepcopy__(self, memo):
+        """quick copy : coefficients are numbers"""
+        res=self.__class__.__new__(self.__class__)
+        res.__dict__.update(self.__dict__)
+        return res
+
+    def array(self):
+        """:return: 4x4 numpy array of coefficients, cached until the matrix changes. Do not modify"""
+        return _coefficients(self,'abcdefghijklmnop',4)
+
+    def apply(self, xyz, vectors=False, project=False):
+        """transforms many points or vectors in a single operation
+        :param xyz: N×3 array-like of coordinates
+        :param vectors: bool True if xyz are vectors, which are not translated
+        :param project: bool True to divide points coordinates by w, as :meth:`transform`
+        :return: N×3 numpy array of transformed coordinates
+        """
+        m=self.array()
+        xyz=numpy.asarray(xyz,dtype=float).reshape(-1,3)
+        res=numpy.dot(xyz,m[:3,:3].T)
+        if not vectors:
+            res+=m[:3,3]
+            if project:
+                w=numpy.dot(xyz,m[3,:3])+m[3,3]
+                w[w==0]=1
+                res/=w[:,numpy.newaxis]
+        return res
+
     def transform(self, other):
         A = self
         B = other
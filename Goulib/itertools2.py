@@ -12,7 +12,9 @@ __credits__ = ["functional toolset from http://pyeuler.wikidot.com/toolset",
 __license__ = "LGPL"
 
 import six #Python2+3 compatibility utilities
-import random, operator, collections, heapq, itertools
+import random, operator, collections, heapq, itertools, bisect
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 
 #reciepes from Python manual
 
@@ -125,6 +127,34 @@ def linspace(start,end,n=100):
         step=float(end-start)/(n-1)
         return arange(start,end+step/2,step)
 
+def arange_array(start,stop=None,step=1,dtype=None):
+    """ like :func:`arange` but returns a `numpy.ndarray`
+
+    :param dtype: optional numpy dtype of the result
+    :result: numpy.ndarray
+    """
+    import numpy
+    if stop is None:
+        stop=start
+        start=0
+    step=abs(step)
+    return numpy.arange(start,stop,-step if stop<start else step,dtype=dtype)
+
+def linspace_array(start,end,n=100):
+    """ like :func:`linspace` but returns a `numpy.ndarray`
+
+    :param start: number, or iterable vector
+    :param end: number, or iterable vector
+    :param n: int number of interpolated values
+    :result: numpy.ndarray of shape (n,) or (n,len(start)) for vectors
+    """
+    import numpy
+    start,end=numpy.asarray(start,dtype=float),numpy.asarray(end,dtype=float)
+    t=numpy.linspace(0.,1.,n)
+    if start.ndim:
+        t=t[:,numpy.newaxis]
+    return start+(end-start)*t
+
 def flatten(l, donotrecursein=six.string_types):
     """iterator to flatten (depth-first) structure
     
@@ -211,6 +241,59 @@ def pairwise(iterable,op=None,loop=False):
         else:
             yield x[0],x[1]
             
+def chunks(iterable, n, dtype=float):
+    """converts an iterable to a stream of `numpy.ndarray` blocks
+
+    :param iterable: iterable of numbers, or of equal length vectors
+    :param n: int number of items per block. the last block may be shorter
+    :param dtype: numpy dtype of blocks
+    :result: iterator over numpy.ndarray of shape (n,) or (n,len(vector))
+    """
+    import numpy
+    it=iter(iterable)
+    while True:
+        block=list(itertools.islice(it,n))
+        if not block:
+            return
+        yield numpy.array(block,dtype=dtype)
+
+def unchunk(blocks):
+    """converts a stream of `numpy.ndarray` blocks back to items
+
+    :param blocks: iterable of numpy.ndarray, as generated by :func:`chunks`
+    :result: iterator over Python numbers, or lists for 2D blocks
+    """
+    for block in blocks:
+        for x in block.tolist():
+            yield x
+
+def pairwise_chunks(blocks, op=None, loop=False):
+    """vectorized :func:`pairwise` over a stream of `numpy.ndarray` blocks
+
+    :param blocks: iterable of numpy.ndarray, as generated by :func:`chunks`
+    :param op: numpy ufunc applied to each (si+1,si) pair. numpy.subtract by default.
+      use numpy.divide for ratios
+    :param loop: boolean True if last pair should be (sn,s1) to close the loop
+    :result: iterator over numpy.ndarray of op(si+1,si)
+    """
+    import numpy
+    if op is None:
+        op=numpy.subtract
+    head=prev=None
+    for block in blocks:
+        if not len(block):
+            continue
+        if prev is None:
+            head=block[:1]
+            res=op(block[1:],block[:-1])
+        else:
+            res=op(block,numpy.concatenate((prev,block[:-1])))
+        prev=block[-1:]
+        if len(res):
+            yield res
+    if loop and prev is not None:
+        yield op(head,prev)
+
 def reshape(data,dims):
     """
     :result: data as a n-dim matrix
@@ -306,17 +389,125 @@ def occurrences(it, exchange=False):
     """Return dictionary with occurrences from iterable"""
     return six.moves.reduce(lambda occur, x: dict(occur, **{x: occur.get(x, 0) + 1}), it, {})
 
-def cartesian_product(*iterables, **kwargs):
-    """http://stackoverflow.com/questions/12093364/cartesian-product-of-large-iterators-itertools
+def _cartesian_pools(iterables, kwargs):
+    """materialize each factor once, except callables which are called when needed"""
+    pools=[]
+    for it in iterables * kwargs.get('repeat', 1):
+        if not (callable(it) or isinstance(it,(list,tuple))):
+            it=list(it)
+        pools.append(it)
+    return pools
+
+def cartesian_len(*iterables, **kwargs):
     """
-    if len(iterables) == 0:
-        yield ()
-    else:
-        iterables = iterables * kwargs.get('repeat', 1)
-        it = iterables[0]
-        for item in it() if isinstance(it, collections.Callable) else iter(it):
-            for items in cartesian_product(*iterables[1:]):
-                yield (item, ) + items
+    :param iterables: finite iterables (not callables)
+    :param repeat: int number of repetitions of iterables, as in `itertools.product`
+    :result: int number of tuples in the cartesian product
+    """
+    res=1
+    for pool in _cartesian_pools(iterables,kwargs):
+        res*=len(pool)
+    return res
+
+def cartesian_split(n, *iterables, **kwargs):
+    """split a cartesian product in disjoint index ranges, for parallel enumeration
+
+    :param n: int number of ranges
+    :param iterables: finite iterables (not callables)
+    :param repeat: int number of repetitions of iterables, as in `itertools.product`
+    :result: list of n (start,stop) tuples to pass to :func:`cartesian_product`
+    """
+    size=cartesian_len(*iterables,**kwargs)
+    bounds=[size*i//n for i in range(n+1)]
+    return list(zip(bounds[:-1],bounds[1:]))
+
+def cartesian_product(*iterables, **kwargs):
+    """cartesian product of iterables, compatible with `itertools.product`
+
+    iterables are materialized once, so iterators can be passed too,
+    except a first iterator which is iterated only once, so it is consumed lazily and can be infinite.
+
+    :param iterables: iterables, or callables returning an iterator.
+      callables are called each time their factor restarts and are never materialized,
+      which allows huge or infinite factors
+    :param repeat: int number of repetitions of iterables, as in `itertools.product`
+    :param prune: optional function(prefix) returning True to skip all tuples starting with prefix
+    :param start: optional int index of the first tuple to generate
+    :param stop: optional int index of the tuple after the last one to generate
+    :result: iterator over tuples
+    :see: :func:`cartesian_split` to enumerate disjoint (start,stop) ranges in parallel
+    """
+    head=[]
+    if iterables and kwargs.get('repeat',1)==1 and not callable(iterables[0]) and iter(iterables[0]) is iterables[0]:
+        head,iterables=[iterables[0]],iterables[1:] # outer iterator is iterated only once
+    pools=head+_cartesian_pools(iterables,kwargs)
+    prune=kwargs.get('prune',None)
+    start=kwargs.get('start',0)
+    stop=kwargs.get('stop',None)
+    lazy=[pool for pool in pools if callable(pool)]
+    if lazy and (start or stop is not None):
+        raise ValueError('start and stop cannot be used with callable iterables')
+    if not (lazy or head) and prune is None and not start and stop is None:
+        return itertools.product(*pools) # fast path
+    return _cartesian_odometer(pools,prune,start,stop)
+
+def _cartesian_odometer(pools,prune,start,stop):
+    """iterative cartesian product, see :func:`cartesian_product`"""
+    n=len(pools)
+    if n==0:
+        if start==0 and (stop is None or stop>0):
+            yield ()
+        return
+
+    strides=[1]*n # number of tuples under each digit
+    first=[0]*n # digits of start index
+    if start or stop is not None:
+        if any(len(pool)==0 for pool in pools[1:]):
+            return
+        for d in range(n-1,0,-1):
+            strides[d-1]=strides[d]*len(pools[d])
+        q=start
+        for d in range(n-1,0,-1):
+            q,first[d]=divmod(q,len(pools[d]))
+        first[0]=q # the first factor, possibly an iterator, is exhausted if start is beyond the end
+
+    def restart(d,i=0):
+        pool=pools[d]
+        if callable(pool):
+            return iter(pool())
+        return itertools.islice(pool,i,None) if i else iter(pool)
+
+    its=[restart(0,first[0])]+[None]*(n-1)
+    digits=[first[0]-1]+[None]*(n-1)
+    prefix=[None]*n
+    index=[0]*(n+1) # index[d+1] = index of the first tuple starting with prefix[:d+1]
+    seek=0 # deepest level still on the path to start, or -1
+    d=0
+    while d>=0:
+        try:
+            prefix[d]=six.next(its[d])
+        except StopIteration:
+            d-=1
+            continue
+        digits[d]+=1
+        if stop is not None:
+            index[d+1]=index[d]+digits[d]*strides[d]
+            if index[d+1]>=stop:
+                return
+        if prune is not None and prune(tuple(prefix[:d+1])):
+            continue
+        if d==n-1:
+            yield tuple(prefix)
+            continue
+        if seek==d and digits[d]==first[d]:
+            seek=d+1
+            i=first[d+1]
+        else:
+            seek=-1
+            i=0
+        d+=1
+        its[d]=restart(d,i)
+        digits[d]=i-1
 
 # my functions added
 
@@ -348,13 +539,11 @@ def takenth(n, iterable, default=None):
 nth=takenth
 
 def icross(*sequences):
-    """Cartesian product of sequences (recursive version)"""
-    # http://stackoverflow.com/questions/15099647/cross-product-of-sets-using-recursion
-    if sequences:
-        for x in sequences[0]:
-            for y in icross(*sequences[1:]):
-                yield (x,)+y
-    else: yield ()
+    """Cartesian product of sequences
+
+    :see: :func:`cartesian_product`
+    """
+    return cartesian_product(*sequences)
 
 def quantify(iterable, pred=bool):
     """
@@ -397,39 +586,124 @@ def all_pairs(size):
         for j in rand_seq(size):
             yield (i,j)
 
+def _isndarray(x):
+    return hasattr(x,'argsort') and hasattr(x,'dtype')
+
+def _negative(a):
+    """-a for numpy arrays, avoiding unsigned and bool overflows"""
+    if a.dtype.kind in 'ub':
+        a=a.astype('int64')
+    return -a
+
 def index_min(values, key=identity):
     """
     :result: min_index, min_value
     """
+    if key is identity:
+        if _isndarray(values) and values.ndim==1:
+            i=int(values.argmin())
+            return i,values[i]
+        return min(enumerate(values), key=operator.itemgetter(1))
     return min(enumerate(values), key=lambda v:key(v[1]))
 
 def index_max(values, key=identity):
     """
-    :result: min_index, min_value
+    :result: max_index, max_value
     """
+    if key is identity:
+        if _isndarray(values) and values.ndim==1:
+            i=int(values.argmax())
+            return i,values[i]
+        return max(enumerate(values), key=operator.itemgetter(1))
     return max(enumerate(values), key=lambda v:key(v[1]))
 
 def best(iterable, key=None, n=1, reverse=False):
-    """ generate items corresponding to the n best values of key sort order"""
-    v=sorted(iterable,key=key,reverse=reverse)
+    """ generate items corresponding to the n best values of key sort order
+
+    items with equal keys are all generated, in their original order.
+    runs in O(len(iterable)*log(n)) comparisons and keeps only the n best keys in memory
+
+    :param key: optional function returning a sort key
+    :param n: int number of distinct key values
+    :param reverse: bool True to get the largest values
+    """
+    if n<1: return
     if key is None : key=identity
-    i,k=0,None
-    for x in v:
-        k2=key(x)
-        if k2==k:
-            yield x
-        else:
-            k=k2
-            i+=1
-            if i>n: break #end
+    keys=[] # n best distinct keys in increasing order, compared but never hashed
+    items=[] # items[i] is the list of items with key keys[i]
+    for x in iterable:
+        k=key(x)
+        i=bisect.bisect_left(keys,k)
+        if i<len(keys) and not k<keys[i]: # equal keys
+            items[i].append(x)
+        elif len(keys)<n:
+            keys.insert(i,k)
+            items.insert(i,[x])
+        elif reverse and i>0: # larger than the smallest kept key
+            del keys[0],items[0]
+            keys.insert(i-1,k)
+            items.insert(i-1,[x])
+        elif not reverse and i<n: # smaller than the largest kept key
+            del keys[-1],items[-1]
+            keys.insert(i,k)
+            items.insert(i,[x])
+    for group in (reversed(items) if reverse else items):
+        for x in group:
             yield x
 
+def kbest(iterable, k=1, key=None, reverse=False):
+    """the k best items, without ties. like `heapq.nsmallest` and `heapq.nlargest`
+
+    runs in O(len(iterable)*log(k)), or in O(len(iterable)) for numpy arrays
+
+    :param key: optional function returning a sort key
+    :param reverse: bool True to get the largest values
+    :result: list of k items in sorted order
+    """
+    if key is None and _isndarray(iterable) and iterable.ndim==1:
+        return [iterable[i] for i in _kbest_indexes(iterable,k,reverse)]
+    return (heapq.nlargest if reverse else heapq.nsmallest)(k,iterable,key=key)
+
+def _kbest_indexes(a, k, reverse):
+    """indexes of the k best values in numpy array a, in sorted order"""
+    if reverse:
+        a=_negative(a)
+    k=min(k,len(a))
+    if k<=0:
+        return []
+    i=a.argpartition(k-1)[:k]
+    return i[a[i].argsort(kind='mergesort')]
+
+def nth_element(iterable, n, key=None, reverse=False):
+    """like C++ std::nth_element : the item that would be at index n if iterable was sorted
+
+    runs in O(len(iterable)*log(n)), or in O(len(iterable)) for numpy arrays
+    """
+    if key is None and _isndarray(iterable) and iterable.ndim==1:
+        if not 0<=n<len(iterable):
+            raise IndexError
+        import numpy
+        i=len(iterable)-1-n if reverse else n
+        return numpy.partition(iterable,i)[i]
+    res=kbest(iterable,n+1,key,reverse)
+    if len(res)<=n:
+        raise IndexError
+    return res[n]
+
 def sort_indexes(iterable, key=identity, reverse=False):
     """
     :return: iterator over indexes of iterable that correspond to the sorted iterable
     """
+    if key is identity and _isndarray(iterable) and iterable.ndim==1:
+        res=(_negative(iterable) if reverse else iterable).argsort(kind='mergesort')
+        return res.tolist()
     # http://stackoverflow.com/questions/6422700/how-to-get-indices-of-a-sorted-array-in-python
-    return [i[0] for i in sorted(enumerate(iterable), key=lambda x:key(x[1]))]
+    if not isinstance(iterable,(list,tuple)):
+        iterable=list(iterable)
+    f=iterable.__getitem__
+    if key is not identity:
+        f=compose(key,f)
+    return sorted(range(len(iterable)), key=f, reverse=reverse)
 
 # WARNING : filter2 has been renamed from "split" at v.1.7.0 for coherency
 def filter2(iterable,condition):
@@ -636,29 +910,264 @@ def sorted_iterable(iterable, key=None, buffer=100):
 
 # operations on sorted iterators
 
+class SortedCursor(object):
+    """forward cursor over a sorted iterable, able to skip ahead quickly
+
+    - objects with find_ge, index and key members like :class:`~Goulib.container.SortedCollection`
+      are sought with find_ge on the key of items
+    - sequences like lists, tuples or numpy arrays are sought by galloping (exponential) search
+    - other iterables are scanned
+
+    :raise: StopIteration when the iterable is exhausted
+    """
+    def __init__(self, iterable):
+        self.value=None
+        self._pos=-1
+        if hasattr(iterable,'find_ge') and hasattr(iterable,'index'):
+            self._seq=iterable
+            self._mode=0
+        elif hasattr(iterable,'__getitem__') and hasattr(iterable,'__len__'):
+            self._seq=iterable
+            self._mode=1
+        else:
+            self._it=iter(iterable)
+            self._mode=2
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """:result: next item"""
+        if self._mode==2:
+            self.value=six.next(self._it)
+            self._pos=0
+        else: # items are read by position to keep duplicates
+            self._pos+=1
+            if self._pos>=len(self._seq):
+                raise StopIteration
+            self.value=self._seq[self._pos]
+        return self.value
+
+    next=__next__ #Python2-3 compatibility
+
+    def seek(self, x):
+        """advances to the first item >= x
+
+        :result: this item
+        """
+        if self._pos>=0 and not self.value<x:
+            return self.value
+        if self._mode==2:
+            v=six.next(self._it)
+            while v<x:
+                v=six.next(self._it)
+            self.value=v
+            self._pos=0
+        elif self._mode==0:
+            key=getattr(self._seq,'key',None) or identity
+            try:
+                v=self._seq.find_ge(key(x))
+            except ValueError:
+                self._pos=len(self._seq)
+                raise StopIteration
+            self._pos=self._seq.index(v)
+            self.value=v
+        else: # galloping search for the smallest item >= x
+            seq,n=self._seq,len(self._seq)
+            lo=self._pos+1
+            step=1
+            hi=lo
+            while hi<n and seq[hi]<x:
+                lo=hi+1
+                hi=lo+step
+                step*=2
+            hi=min(hi,n)
+            while lo<hi: # bisect in [lo,hi)
+                mid=(lo+hi)//2
+                if seq[mid]<x:
+                    lo=mid+1
+                else:
+                    hi=mid
+            if lo>=n:
+                self._pos=n
+                raise StopIteration
+            self._pos=lo
+            self.value=seq[lo]
+        return self.value
+
 def unique_sorted(iterable):
     """generates items in sorted iterable without repetition"""
-    prev=None
-    for x in iterable:
-        if x!=prev:
-            yield x
-        prev=x
+    for x,_ in itertools.groupby(iterable):
+        yield x
 
 def diff(iterable1,iterable2):
-    """generate items in sorted iterable1 that are not in sorted iterable2"""
-    b=six.next(iterable2)
-    for a in iterable1:
-        while b<a:
-            b=six.next(iterable2)
-        if a==b: continue
+    """generate items in sorted iterable1 that are not in sorted iterable2
+
+    :param iterable2: sorted iterable, preferably seekable, see :class:`SortedCursor`
+    """
+    b=SortedCursor(iterable2)
+    it=iter(iterable1)
+    for a in it:
+        try:
+            if b.seek(a)==a:
+                continue
+        except StopIteration: # nothing more to remove
+            yield a
+            break
+        yield a
+    for a in it:
         yield a
 
 merge=heapq.merge
 
-#http://stackoverflow.com/questions/969709/joining-a-set-of-ordered-integer-yielding-python-iterators
+def union(*its):
+    """generate items in any of sorted iterables, without repetition"""
+    return unique_sorted(heapq.merge(*its))
+
 def intersect(*its):
-    for key, values in itertools.groupby(heapq.merge(*its)):
-        if len(list(values)) == len(its):
-            yield key
+    """generate items present in all sorted iterables, without repetition
+
+    sparse intersections skip ahead in the iterables that are seekable,
+    see :class:`SortedCursor`
+    """
+    if not its:
+        return
+    cursors=[SortedCursor(it) for it in its]
+    try:
+        x=max([six.next(c) for c in cursors])
+        while True:
+            for c in cursors:
+                v=c.seek(x)
+                if x<v:
+                    x=v
+                    break
+            else: # x is in all iterables
+                yield x
+                c=cursors[0]
+                while not x<c.value:
+                    six.next(c)
+                x=c.value
+    except StopIteration:
+        return
+
+def symdiff(*its):
+    """generate items present in exactly one of sorted iterables, without repetition"""
+    tagged=[six.moves.zip(it,itertools.repeat(i)) for i,it in enumerate(its)]
+    merged=heapq.merge(*tagged)
+    for x,group in itertools.groupby(merged,key=operator.itemgetter(0)):
+        if count_unique(group,key=operator.itemgetter(1))==1:
+            yield x
+
+
 
+# parallel pipeline stages
 
+def _map_chunk(f, chunk):
+    return [f(x) for x in chunk]
+
+def ipmap(f, iterable, processes=None, threads=False, chunksize=64, buffer=None, ordered=True, pool=None):
+    """evaluates f on items of iterable in a pool of workers
+
+    iterable is consumed lazily in chunks, with at most buffer chunks in flight,
+    so it can be infinite. The pool is terminated when the generator is closed.
+
+    :param f: function of one item. must be picklable (top level function) unless threads=True
+    :param iterable: any iterable
+    :param processes: int number of workers. cpu_count() by default
+    :param threads: bool True to use a pool of threads instead of processes
+    :param chunksize: int number of items sent to a worker at once
+    :param buffer: int max number of chunks in flight. 2*processes by default
+    :param ordered: bool False to yield results as soon as they're available
+    :param pool: optional existing `multiprocessing.Pool` or `ThreadPool` to use.
+      it is not closed when done
+    :result: iterator over (index,item,f(item)) tuples
+    """
+    processes=processes or multiprocessing.cpu_count()
+    buffer=buffer or 2*processes
+    own=pool is None
+    if own:
+        pool=ThreadPool(processes) if threads else multiprocessing.Pool(processes)
+    it=iter(iterable)
+    pending=collections.deque() # of (index of first item, chunk, async result)
+    i=0
+    try:
+        while True:
+            while len(pending)<buffer:
+                chunk=list(itertools.islice(it,chunksize))
+                if not chunk:
+                    break
+                pending.append((i,chunk,pool.apply_async(_map_chunk,(f,chunk))))
+                i+=len(chunk)
+            if not pending:
+                break
+            j=0
+            if not ordered: # first ready chunk, or wait for the oldest
+                j=next((k for k,p in enumerate(pending) if p[2].ready()),0)
+            start,chunk,res=pending[j]
+            del pending[j]
+            for k,(x,y) in enumerate(zip(chunk,res.get())):
+                yield start+k,x,y
+        if own:
+            pool.close()
+    finally:
+        if own:
+            pool.terminate()
+            pool.join()
+
+def pmap(f, iterable, **kwargs):
+    """like `python.map` but f is evaluated in a pool of workers
+
+    :param kwargs: see :func:`ipmap`
+    :result: iterator over f(item) values
+    """
+    for _,_,y in ipmap(f, iterable, **kwargs):
+        yield y
+
+def pcompact(iterable, f=bool, **kwargs):
+    """like :func:`compact` but f is evaluated in a pool of workers
+
+    :param kwargs: see :func:`ipmap`
+    """
+    for _,x,y in ipmap(f, iterable, **kwargs):
+        if y:
+            yield x
+
+pfilter=pcompact
+
+def pfilter2(iterable, condition, **kwargs):
+    """like :func:`filter2` but condition is evaluated in a pool of workers
+
+    :param kwargs: see :func:`ipmap`
+    """
+    yes,no=[],[]
+    for _,x,y in ipmap(condition, iterable, **kwargs):
+        if y:
+            yes.append(x)
+        else:
+            no.append(x)
+    return yes,no
+
+def pifind(iterable, f, **kwargs):
+    """like :func:`ifind` but f is evaluated in a pool of workers
+
+    :param kwargs: see :func:`ipmap`. indexes are correct even if ordered=False
+    """
+    for i,x,y in ipmap(f, iterable, **kwargs):
+        if y:
+            yield (i,x)
+
+def paccumulate(iterable, f, func=operator.add, skip_first=False, **kwargs):
+    """:func:`accumulate` of f(item), where f is evaluated in a pool of workers
+
+    :param kwargs: see :func:`ipmap`. func should be commutative if ordered=False
+    """
+    return accumulate(pmap(f, iterable, **kwargs), func, skip_first)
+
+def pbest(iterable, key, n=1, reverse=False, **kwargs):
+    """like :func:`best` but key is evaluated in a pool of workers
+
+    :param kwargs: see :func:`ipmap`
+    """
+    pairs=((y,x) for _,x,y in ipmap(key, iterable, **kwargs))
+    for _,x in best(pairs, key=operator.itemgetter(0), n=n, reverse=reverse):
+        yield x
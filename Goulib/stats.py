@@ -11,7 +11,8 @@ __copyright__ = "Copyright 2012, Philippe Guglielmetti"
 __credits__ = []
 __license__ = "LGPL"
 
-import six, math, logging, matplotlib
+import six, math, logging, matplotlib, random, collections, bisect
+import itertools, datetime
 
 from . import plot #sets matplotlib backend
 import matplotlib.pyplot as plt # after import .plot
@@ -64,33 +65,238 @@ def confidence_interval(data,conf=0.95):
     e = 1.96 * math.sqrt(v) / math.sqrt(len(data))
     return m-e,m+e
 
+def _select(data, k):
+    """:return: k-th smallest item of data, in O(len(data)) expected time (quickselect)"""
+    if hasattr(data,'dtype'):
+        import numpy
+        return numpy.partition(data,k)[k]
+    while True:
+        pivot=data[random.randrange(len(data))]
+        lower=[x for x in data if x<pivot]
+        if k<len(lower):
+            data=lower
+            continue
+        k-=len(lower)
+        equal=sum(1 for x in data if x==pivot)
+        if k<equal:
+            return pivot
+        k-=equal
+        data=[x for x in data if pivot<x]
+
 def median(data, is_sorted=False):
-    """:return: median of data"""
-    x=data if is_sorted else sorted(data)
+    """:return: median of data, computed by selection in O(len(data)) if data isn't sorted
+    :raise ValueError: if data contains nan
+    """
     n=len(data)
     i=n//2
-    if n % 2:
-        return x[i]
+    if is_sorted:
+        return data[i] if n % 2 else avg(data[i-1:i+1])
+    if hasattr(data,'dtype') and data.dtype.kind!='O':
+        nan=data.dtype.kind in 'fc' and (data!=data).any()
     else:
-        return avg(x[i-1:i+1])
+        nan=any(x!=x for x in data)
+    if nan: # nan cannot be ordered
+        raise ValueError('median of data containing nan')
+    if n % 2:
+        return _select(data,i)
+    return avg([_select(data,i-1),_select(data,i)])
 
 def mode(data, is_sorted=False):
-    """:return: mode (most frequent value) of data"""
-    #we could use a collection.Counter, but we're only looking for the largest value
-    x=data if is_sorted else sorted(data)
-    res,count=None,0
-    prev,c=None,0
-    x.append(None)# to force the last loop
-    for v in x:
-        if v==prev:
-            c+=1
-        else:
+    """:return: mode (most frequent value) of data. smallest one in case of ties"""
+    if is_sorted:
+        res,count=None,0
+        for v,c in itertools2.compress(data):
             if c>count: #best so far
-                res,count=prev,c
-            c=1
-        prev=v
-    x.pop() #no side effect please
-    return res
+                res,count=v,c
+        return res
+    counts=collections.Counter(data)
+    if not counts:
+        return None
+    count=max(six.itervalues(counts))
+    return min(v for v,c in six.iteritems(counts) if c==count)
+
+class Quantiles(object):
+    """streaming quantiles sketch
+
+    KLL sketch by Karnin, Lang and Liberty : keeps O(k) items and estimates
+    ranks with an error of about len(data)/k, whatever the data size.
+    Sketches computed on separate data can be combined with :meth:`merge`
+    """
+    def __init__(self, data=[], k=200, c=2./3):
+        """
+        :param data: optional iterable of values
+        :param k: int size of the sketch. controls accuracy
+        :param c: float ratio between capacities of successive levels
+        """
+        self.k=k
+        self.c=c
+        self.n=0
+        self.compactors=[] # compactors[h] contains items of weight 2**h
+        self.size=0
+        self._grow()
+        self._cdf=None
+        self.extend(data)
+
+    def __repr__(self):
+        return "{}(n={}, k={})".format(self.__class__.__name__,self.n,self.k)
+
+    def _capacity(self,h):
+        depth=len(self.compactors)-h-1
+        return int(math.ceil(self.c**depth*self.k))+1
+
+    def _grow(self):
+        self.compactors.append([])
+        self.maxsize=sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    def _compress(self):
+        for h,items in enumerate(self.compactors):
+            if len(items)>=self._capacity(h):
+                if h+1>=len(self.compactors):
+                    self._grow()
+                items.sort()
+                keep=items[random.randint(0,1)::2] if len(items)%2==0 else items[random.randint(0,1):-1:2]
+                self.compactors[h+1].extend(keep)
+                self.compactors[h]=items[-1:] if len(items)%2 else []
+                self.size=sum(len(c) for c in self.compactors)
+                return
+
+    def append(self,x):
+        """add data x"""
+        self.compactors[0].append(x)
+        self.n+=1
+        self.size+=1
+        self._cdf=None
+        if self.size>=self.maxsize:
+            self._compress()
+
+    def extend(self,data):
+        """add data
+
+        :param data: iterable of values. numpy arrays are added by chunks
+        """
+        if hasattr(data,'dtype'):
+            data=data.ravel().tolist()
+        it=iter(data)
+        while True:
+            chunk=list(itertools2.take(max(self.maxsize-self.size,1),it))
+            if not chunk:
+                break
+            self.compactors[0].extend(chunk)
+            self.n+=len(chunk)
+            self.size+=len(chunk)
+            self._cdf=None
+            while self.size>=self.maxsize:
+                self._compress()
+
+    def merge(self,other):
+        """add a sketch computed on other data
+
+        :return: self
+        """
+        while len(self.compactors)<len(other.compactors):
+            self._grow()
+        for h,items in enumerate(other.compactors):
+            self.compactors[h].extend(items)
+        self.n+=other.n
+        self.size=sum(len(c) for c in self.compactors)
+        self._cdf=None
+        while self.size>=self.maxsize:
+            self._compress()
+        return self
+
+    def _weights(self):
+        """:return: sorted list of items, list of cumulated weights"""
+        if self._cdf is None:
+            pairs=sorted((x,1<<h) for h,items in enumerate(self.compactors) for x in items)
+            self._cdf=[x for x,_ in pairs],list(itertools2.accumulate(w for _,w in pairs))
+        return self._cdf
+
+    def rank(self,x):
+        """:return: estimated number of data <= x"""
+        items,cum=self._weights()
+        i=bisect.bisect_right(items,x)
+        r=cum[i-1] if i else 0
+        return r*self.n//cum[-1] if cum else 0
+
+    def cdf(self,x):
+        """:return: estimated fraction of data <= x, nan if no data"""
+        if self.n==0:
+            return float('nan')
+        return self.rank(x)/self.n
+
+    def quantile(self,q):
+        """:return: estimated value below which a fraction q of data falls"""
+        items,cum=self._weights()
+        if not items:
+            return None
+        i=bisect.bisect_left(cum,q*cum[-1])
+        return items[min(i,len(items)-1)]
+
+    def percentile(self,p):
+        """:return: estimated p-th percentile"""
+        return self.quantile(p/100.)
+
+    @property
+    def median(self):
+        return self.quantile(0.5)
+
+class HeavyHitters(object):
+    """streaming estimation of most frequent values, by Misra-Gries algorithm
+
+    keeps at most k counters. counts are underestimated by at most n/(k+1),
+    so any value more frequent than that is guaranteed to be kept
+    """
+    def __init__(self, data=[], k=100):
+        self.k=k
+        self.n=0
+        self.counters={}
+        self.extend(data)
+
+    def __repr__(self):
+        return "{}(n={}, k={})".format(self.__class__.__name__,self.n,self.k)
+
+    def append(self,x):
+        """add data x"""
+        self.n+=1
+        counters=self.counters
+        if x in counters:
+            counters[x]+=1
+        elif len(counters)<self.k:
+            counters[x]=1
+        else:
+            for v in list(counters):
+                counters[v]-=1
+                if not counters[v]:
+                    del counters[v]
+
+    def extend(self,data):
+        """add data"""
+        for x in data:
+            self.append(x)
+
+    def merge(self,other):
+        """add counters computed on other data
+
+        :return: self
+        """
+        counts=collections.Counter(self.counters)
+        counts.update(other.counters)
+        self.n+=other.n
+        if len(counts)>self.k: # subtract the (k+1)th largest count
+            cut=sorted(six.itervalues(counts),reverse=True)[self.k]
+            counts=dict((v,c-cut) for v,c in six.iteritems(counts) if c>cut)
+        self.counters=dict(counts)
+        return self
+
+    def most_common(self,n=None):
+        """:return: list of (value, estimated count) of the n most frequent values"""
+        return collections.Counter(self.counters).most_common(n)
+
+    @property
+    def mode(self):
+        """:return: estimated most frequent value"""
+        best=self.most_common(1)
+        return best[0][0] if best else None
 
 def kurtosis(data):
     # https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance
@@ -134,13 +340,26 @@ def stats(l):
     return s.lo,s.hi,s.sum1,s.sum2,s.avg,s.var
 
 class Stats(object):
-    def __init__(self,data=[]):
+    """online statistics : mean, variance, skewness and kurtosis in a single pass
+
+    uses sums of powers of data shifted by the first value for numerical stability.
+    Stats computed on separate data can be combined with :meth:`merge`
+    """
+    def __init__(self,data=[],quantiles=None):
+        """
+        :param data: optional iterable of values
+        :param quantiles: optional int size of a :class:`Quantiles` sketch
+          to estimate median and percentiles in the same pass
+        """
+        self.quantiles=Quantiles(k=quantiles) if quantiles else None
         self.lo=float("inf")
         self.hi=float("-inf")
         self.n=0
         self._offset=0
         self._dsum1=0
         self._dsum2=0
+        self._dsum3=0
+        self._dsum4=0
         self.extend(data)
         
     def __repr__(self):
@@ -152,15 +371,49 @@ class Stats(object):
             self._offset = x
         self.n+=1
         delta=x - self._offset
+        delta2=delta*delta
         self._dsum1 += delta
-        self._dsum2 += delta*delta
+        self._dsum2 += delta2
+        self._dsum3 += delta2*delta
+        self._dsum4 += delta2*delta2
 
         if x<self.lo: self.lo=x
         if x>self.hi: self.hi=x
+        if self.quantiles is not None:
+            self.quantiles.append(x)
         
     def extend(self,data):
+        """add data to Stats
+
+        :param data: iterable of values. numpy arrays are processed in a single vectorized call,
+          other values are added by :meth:`append`, which subclasses may override
+        """
+        if hasattr(data,'dtype'):
+            self._extend_array(data)
+            return
+        append=self.append
         for x in data:
-            self.append(x)
+            append(x)
+
+    def _extend_array(self,data):
+        data=data.ravel()
+        if not len(data):
+            return
+        if self.n==0:
+            self._offset=data[0].item()
+        delta=data-self._offset
+        self._dsum1 += delta.sum().item()
+        if delta.dtype.kind in 'iub': # avoid overflows of integer powers
+            delta=delta.astype(float)
+        delta2=delta*delta
+        self._dsum2 += delta2.sum().item()
+        self._dsum3 += (delta2*delta).sum().item()
+        self._dsum4 += (delta2*delta2).sum().item()
+        self.n+=len(data)
+        self.lo=min(self.lo,data.min().item())
+        self.hi=max(self.hi,data.max().item())
+        if self.quantiles is not None:
+            self.quantiles.extend(data)
 
     def remove(self,data):
         """remove data from Stats
@@ -169,13 +422,50 @@ class Stats(object):
         if not hasattr(data, '__iter__'):
             data=[data]
         for x in data:
-            self.n-=1
-            delta=x - self._offset
-            self._dsum1 -= delta
-            self._dsum2 -= delta*delta
-    
+            self._remove(x)
             if x<=self.lo: logging.warning('lo value possibly invalid')
             if x>=self.hi: logging.warning('hi value possibly invalid')
+        if self.quantiles is not None:
+            logging.warning('quantiles possibly invalid')
+
+    def _remove(self,x):
+        self.n-=1
+        if self.n==0: # avoid accumulating rounding errors
+            self._dsum1=self._dsum2=self._dsum3=self._dsum4=0
+            return
+        delta=x - self._offset
+        delta2=delta*delta
+        self._dsum1 -= delta
+        self._dsum2 -= delta2
+        self._dsum3 -= delta2*delta
+        self._dsum4 -= delta2*delta2
+
+    def merge(self,other):
+        """add Stats computed on other data, as in parallel algorithm by Chan et al.
+
+        :param other: Stats
+        :return: self, updated as if it had been fed with all data of other.
+          the quantiles sketch is dropped if other has none
+        """
+        if other.n==0:
+            return self
+        if self.n==0:
+            self._offset=other._offset
+        d=other._offset-self._offset # shift other sums to our offset
+        s1,s2,s3,s4=other._dsum1,other._dsum2,other._dsum3,other._dsum4
+        n=other.n
+        self._dsum4 += s4+4*d*s3+6*d*d*s2+4*d**3*s1+n*d**4
+        self._dsum3 += s3+3*d*s2+3*d*d*s1+n*d**3
+        self._dsum2 += s2+2*d*s1+n*d*d
+        self._dsum1 += s1+n*d
+        self.n+=n
+        self.lo=min(self.lo,other.lo)
+        self.hi=max(self.hi,other.hi)
+        if other.quantiles is None: # our sketch would ignore other data
+            self.quantiles=None
+        elif self.quantiles is not None:
+            self.quantiles.merge(other.quantiles)
+        return self
         
     @property
     def sum(self):    
@@ -206,42 +496,456 @@ class Stats(object):
         return math.sqrt(self.variance)
 
     sigma=stddev
+
+    def _central_sums(self):
+        """:return: sums of 2nd, 3rd and 4th powers of deviations from the mean"""
+        n=self.n
+        a=self._dsum1/n
+        m2=self._dsum2-a*self._dsum1
+        m3=self._dsum3-3*a*self._dsum2+2*n*a**3
+        m4=self._dsum4-4*a*self._dsum3+6*a*a*self._dsum2-3*n*a**4
+        return m2,m3,m4
+
+    @property
+    def skewness(self):
+        """population skewness"""
+        m2,m3,_=self._central_sums()
+        if not m2:
+            return 0
+        return math.sqrt(self.n)*m3/m2**1.5
+
+    skew=skewness #alias
+
+    @property
+    def kurtosis(self):
+        """population excess kurtosis, like :func:`kurtosis`"""
+        m2,_,m4=self._central_sums()
+        if not m2:
+            return 0
+        return self.n*m4/(m2*m2)-3
+
+    def quantile(self,q):
+        """:return: estimated value below which a fraction q of data falls"""
+        if self.quantiles is None:
+            raise ValueError('Stats has no quantiles sketch')
+        return self.quantiles.quantile(q)
+
+    def percentile(self,p):
+        """:return: estimated p-th percentile"""
+        return self.quantile(p/100.)
+
+    @property
+    def median(self):
+        return self.quantile(0.5)
     
+class Window(Stats):
+    """Stats over a sliding window of the last data
+
+    the window is limited by a number of data, or by a duration.
+    mean and variance are updated in O(1) per data,
+    lo and hi in O(1) amortized using monotonic deques
+    """
+    def __init__(self,data=[],size=None,duration=None):
+        """
+        :param data: optional iterable of values
+        :param size: optional int max number of data in window
+        :param duration: optional timedelta max age of data in window,
+          relative to the time of the last data
+        """
+        self.size=size
+        self.duration=duration
+        self.clear()
+        Stats.__init__(self,data)
+
+    def clear(self):
+        """remove all data"""
+        self._data=collections.deque() # of (time,value)
+        self._min=collections.deque() # of (index,value) with increasing values
+        self._max=collections.deque() # of (index,value) with decreasing values
+        self._count=0 # number of data ever appended
+        self.n=0
+        self._dsum1=self._dsum2=self._dsum3=self._dsum4=0
+        self.lo=float("inf")
+        self.hi=float("-inf")
+
+    def _push(self,x,t):
+        """appends x to the window and min/max deques"""
+        self._data.append((t,x))
+        i=self._count
+        self._count+=1
+        while self._min and not self._min[-1][1]<x:
+            self._min.pop()
+        self._min.append((i,x))
+        while self._max and not x<self._max[-1][1]:
+            self._max.pop()
+        self._max.append((i,x))
+
+    def _evict(self):
+        """removes data outside the window"""
+        data=self._data
+        if self.size is not None:
+            while len(data)>self.size:
+                self._remove(data.popleft()[1])
+        if self.duration is not None and data:
+            start=data[-1][0]-self.duration
+            while not start<data[0][0]:
+                self._remove(data.popleft()[1])
+        first=self._count-len(data) # index of first data in window
+        while self._min and self._min[0][0]<first:
+            self._min.popleft()
+        while self._max and self._max[0][0]<first:
+            self._max.popleft()
+        self.lo=self._min[0][1] if self._min else float("inf")
+        self.hi=self._max[0][1] if self._max else float("-inf")
+
+    def append(self,x,t=None):
+        """add data x to window
+
+        :param t: optional datetime of x, now by default
+        """
+        if self.duration is not None and t is None:
+            t=datetime.datetime.now()
+        Stats.append(self,x)
+        self._push(x,t)
+        self._evict()
+
+    def extend(self,data,times=None):
+        """add data to window
+
+        :param data: iterable of values. sums of numpy arrays are updated in one vectorized call
+        :param times: optional iterable of datetimes of data
+        """
+        if times is not None or self.duration is not None:
+            times=itertools.repeat(None) if times is None else times
+            for x,t in six.moves.zip(data,times):
+                self.append(x,t)
+            return
+        if not hasattr(data,'dtype'):
+            for x in data:
+                self.append(x)
+            return
+        data=data.ravel()
+        if self.size is not None and len(data)>=self.size: # whole window replaced
+            self.clear()
+            self._count=len(data)-self.size
+            data=data[-self.size:]
+        Stats._extend_array(self,data)
+        for x in data.tolist():
+            self._push(x,None)
+        self._evict()
+
+    def _rebuild(self):
+        """rebuilds min/max deques after data was removed inside the window"""
+        data=self._data
+        self._data=collections.deque()
+        self._min.clear()
+        self._max.clear()
+        self._count=0
+        for t,x in data:
+            self._push(x,t)
+        self._evict()
+
+    def remove(self,data):
+        """remove data from window in O(len(window))
+
+        :param data: value or iterable of values
+        :raise ValueError: if a value is not in window
+        """
+        if not hasattr(data, '__iter__'):
+            data=[data]
+        values=[x for _,x in self._data]
+        try:
+            for x in data:
+                i=values.index(x)
+                del values[i]
+                del self._data[i]
+                self._remove(x)
+        finally:
+            self._rebuild()
+
+    def merge(self,other):
+        """add data of other window, as if data of both windows were appended in time order.
+        if some data have no time, data of other is appended after data of self
+
+        :param other: Window
+        :return: self, limited to its size and duration
+        """
+        data=list(self._data)+list(other._data)
+        if all(t is not None for t,_ in data):
+            data.sort(key=lambda d:d[0]) # stable
+        self.clear()
+        for t,x in data:
+            Stats.append(self,x)
+            self._push(x,t)
+        self._evict()
+        return self
+
+class EWMA(object):
+    """exponentially weighted moving average and variance
+
+    weight of data decreases by a factor (1-alpha) at each new data
+    """
+    def __init__(self,data=[],alpha=None,halflife=None):
+        """
+        :param data: optional iterable of values
+        :param alpha: float smoothing factor in ]0,1]
+        :param halflife: number of data after which weight is halved, alternative to alpha
+        """
+        if alpha is None:
+            alpha=1-0.5**(1./halflife)
+        self.alpha=alpha
+        self.n=0
+        self.mean=0
+        self.variance=0
+        self.extend(data)
+
+    def __repr__(self):
+        return "{}(mean={:.12g}, var={:.12g})".format(self.__class__.__name__,self.mean,self.variance)
+
+    def append(self,x):
+        """add data x"""
+        self.n+=1
+        if self.n==1:
+            self.mean=x
+            return
+        delta=x-self.mean
+        incr=self.alpha*delta
+        self.mean+=incr
+        self.variance=(1-self.alpha)*(self.variance+delta*incr)
+
+    def extend(self,data):
+        """add data
+
+        :param data: iterable of values. numpy arrays are processed in one vectorized call
+        """
+        if not hasattr(data,'dtype'):
+            for x in data:
+                self.append(x)
+            return
+        import numpy
+        data=data.ravel()
+        if not len(data):
+            return
+        if self.n==0:
+            self.append(data[0].item())
+            data=data[1:]
+        k=len(data)
+        a=self.alpha
+        w=a*(1-a)**numpy.arange(k-1,-1,-1) # weights of data
+        decay=(1-a)**k # weight of previous state
+        delta=data-self.mean
+        shift=numpy.dot(w,delta).item()
+        m2=decay*self.variance+numpy.dot(w,delta*delta).item() # 2nd moment around old mean
+        self.mean+=shift
+        self.variance=m2-shift*shift
+        self.n+=k
+
+    avg=property(lambda self:self.mean) #alias
+    mu=avg #alias
+    var=property(lambda self:self.variance) #alias
+
+    @property
+    def stddev(self):
+        return math.sqrt(self.variance)
+
+    sigma=stddev
+
+def _erf(x):
+    """vectorized error function"""
+    try:
+        from scipy.special import erf
+        return erf(x)
+    except ImportError:
+        import numpy
+        return numpy.frompyfunc(math.erf,1,1)(x).astype(float)
+
+def _vectorized(f):
+    """decorator making a method of a numpy array work on numbers and iterables too
+    :return: float for numbers, numpy.ndarray otherwise
+    """
+    def wrapper(self,x):
+        import numpy
+        a=numpy.asarray(x,dtype=float)
+        res=f(self,a)
+        return res.item() if a.ndim==0 else res
+    wrapper.__name__=f.__name__
+    wrapper.__doc__=f.__doc__
+    return wrapper
+
+# rational approximation of the normal ppf by Peter Acklam
+_ppf_a=(-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+    1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+_ppf_b=(-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+    6.680131188771972e+01, -1.328068155288572e+01, 1.)
+_ppf_c=(-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+    -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+_ppf_d=(7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+    3.754408661907416e+00, 1.)
+
+def _normal_ppf(p):
+    """inverse of the standard normal cdf, for numpy arrays"""
+    import numpy
+    polyval=lambda c,x:six.moves.reduce(lambda r,k:r*x+k,c,0)
+    with numpy.errstate(all='ignore'):
+        q=numpy.sqrt(-2*numpy.log(numpy.minimum(p,1-p))) # tails
+        tail=polyval(_ppf_c,q)/polyval(_ppf_d,q)
+        tail=numpy.where(p<0.5,tail,-tail)
+        q=p-0.5 # center
+        r=q*q
+        center=polyval(_ppf_a,r)*q/polyval(_ppf_b,r)
+        x=numpy.where(numpy.abs(q)<0.5-0.02425,center,tail)
+        # one step of Halley's method for full machine precision
+        e=0.5*(1+_erf(x/math.sqrt(2)))-p
+        u=e*math.sqrt(2*math.pi)*numpy.exp(x*x/2)
+        x=numpy.where(numpy.isfinite(u),x-u/(1+x*u/2),x)
+    return x
+
 def normal_pdf(x,mu,sigma):
     """Return the probability density function at x"""
     try:
         return 1./(math.sqrt(2*math.pi)*sigma)*math.exp(-0.5 * (1./sigma*(x - mu))**2)
     except ZeroDivisionError:
-        return 1 if math2.isclose(x,mean) else 0
+        return 1 if math2.isclose(x,mu) else 0
 
 expr.functions["normal_pdf"]=normal_pdf #add to allowed functions
 
-class Normal(Stats, list, expr.Expr):
+class Distribution(object):
+    """base class for probability distributions
+    with pdf, cdf and ppf methods working on numbers and numpy arrays
+    """
+
+    def __call__(self,x):
+        return self.pdf(x)
+
+    def pdf(self,x):
+        """:return: probability density function at x"""
+        raise NotImplementedError
+
+    def cdf(self,x):
+        """:return: cumulative distribution function at x"""
+        raise NotImplementedError
+
+    def ppf(self,q):
+        """:return: percent point function (inverse of cdf) at q"""
+        raise NotImplementedError
+
+    def interval(self,conf=0.95):
+        """:return: (low,high) bounds of the conf confidence interval"""
+        return self.ppf((1-conf)/2), self.ppf((1+conf)/2)
+
+    def sample(self,n):
+        """:return: numpy.ndarray of n random values drawn from the distribution"""
+        import numpy
+        return self.ppf(numpy.random.random_sample(n))
+
+class Uniform(Distribution):
+    """uniform distribution on [a,b]"""
+    def __init__(self,a=0,b=1):
+        self.a=a
+        self.b=b
+
+    def __repr__(self):
+        return "{}(a={:.12g}, b={:.12g})".format(self.__class__.__name__,self.a,self.b)
+
+    @property
+    def mean(self):
+        return (self.a+self.b)/2
+
+    @property
+    def variance(self):
+        return (self.b-self.a)**2/12
+
+    @_vectorized
+    def pdf(self,x):
+        import numpy
+        return numpy.where((self.a<=x)&(x<=self.b),1/(self.b-self.a),0.)
+
+    @_vectorized
+    def cdf(self,x):
+        import numpy
+        return numpy.clip((x-self.a)/(self.b-self.a),0,1)
+
+    @_vectorized
+    def ppf(self,q):
+        return self.a+q*(self.b-self.a)
+
+class Exponential(Distribution):
+    """exponential distribution of rate lambda"""
+    def __init__(self,rate=1):
+        self.rate=rate
+
+    def __repr__(self):
+        return "{}(rate={:.12g})".format(self.__class__.__name__,self.rate)
+
+    @property
+    def mean(self):
+        return 1/self.rate
+
+    @property
+    def variance(self):
+        return 1/self.rate**2
+
+    @_vectorized
+    def pdf(self,x):
+        import numpy
+        with numpy.errstate(over='ignore'):
+            return numpy.where(x<0,0.,self.rate*numpy.exp(-self.rate*x))
+
+    @_vectorized
+    def cdf(self,x):
+        import numpy
+        return numpy.where(x<0,0.,-numpy.expm1(-self.rate*x))
+
+    @_vectorized
+    def ppf(self,q):
+        import numpy
+        return -numpy.log1p(-q)/self.rate
+
+class Normal(Distribution, Stats, list, expr.Expr):
     """represents a normal distributed variable
     the base class (list) optionally contains data
     """
     
-    def __init__(self,data=[],mean=0,var=1):
+    def __init__(self,data=[],mean=0,var=1,keep=True):
+        """
+        :param data: optional iterable of values
+        :param mean: float mean if there is no data
+        :param var: float variance if there is no data
+        :param keep: bool False to compute statistics of data without storing it
+        """
+        self.keep=keep
         Stats.__init__(self,data)
         expr.Expr.__init__(self,lambda x:normal_pdf(x,self.mu,self.sigma))
-        if not data: #cheat 
+        if self.n==0: #cheat 
             s=math.sqrt(var/2)
             Stats.append(self,mean-s)
             Stats.append(self,mean+s)
             #this way we preserve mean and variance, but have no real data
     
+    def __call__(self,x=None,**kwargs):
+        if hasattr(x,'dtype'): # vectorized
+            return self.pdf(x)
+        return expr.Expr.__call__(self,x,**kwargs)
+
     def append(self,x):
-        list.append(self,x)
+        if self.keep:
+            list.append(self,x)
         Stats.append(self,x)
 
     def extend(self,x):
-        Stats.extend(self,x) #calls self.append
+        if self.keep and hasattr(x,'dtype'):
+            list.extend(self,x.ravel().tolist())
+        Stats.extend(self,x) # calls self.append for other iterables
         
     def remove(self,x):
-        list.remove(self,x)
+        """remove value x. If data is not kept, only statistics are updated"""
+        if self.keep:
+            list.remove(self,x)
         Stats.remove(self,x)
         
     def pop(self,i=-1,n=1):
+        if not self.keep:
+            raise ValueError('cannot pop data of a Normal created with keep=False')
         for _ in range(n):
             x=list.pop(self,i)
             Stats.remove(self,x)
@@ -253,11 +957,28 @@ class Normal(Stats, list, expr.Expr):
         return "\mathcal{N}(\mu=%s, \sigma=%s)"%(self.mean,self.stddev)
 
     def _plot(self, ax, x=None, **kwargs):
+        import numpy
         if x is None:
-            x=itertools2.linspace(self.mu-3*self.sigma,self.mu+3*self.sigma, 101)
-        x=list(x)
-        y=list(self(x))
-        return expr.Expr._plot(self,ax,x,y,**kwargs)
+            x=numpy.linspace(self.mu-3*self.sigma,self.mu+3*self.sigma, 101)
+        x=numpy.asarray(x,dtype=float)
+        y=self.pdf(x)
+        return expr.Expr._plot(self,ax,x.tolist(),y.tolist(),**kwargs)
+
+    @_vectorized
+    def pdf(self,x):
+        import numpy
+        mu,sigma=self.mu,self.sigma
+        if not sigma:
+            return numpy.where(numpy.isclose(x,mu),1.,0.)
+        return numpy.exp(-0.5*((x-mu)/sigma)**2)/(math.sqrt(2*math.pi)*sigma)
+
+    @_vectorized
+    def cdf(self,x):
+        return 0.5*(1+_erf((x-self.mu)/(self.sigma*math.sqrt(2))))
+
+    @_vectorized
+    def ppf(self,q):
+        return self.mu+self.sigma*_normal_ppf(q)
 
     def linear(self,a,b=0):
         """
@@ -266,7 +987,7 @@ class Normal(Stats, list, expr.Expr):
         return Normal(
             data=[a*x+b for x in self],
             mean=self.mean*a+b,
-            var=abs(self.var*a)
+            var=self.var*a*a
         )
 
     def __mul__(self,a):
@@ -319,6 +1040,187 @@ class Normal(Stats, list, expr.Expr):
 
 
 
+def histogram(data, bins=10, bounds=None):
+    """fast histogram with bins of equal width
+
+    :param data: iterable or numpy.ndarray of values
+    :param bins: int number of bins
+    :param bounds: optional (low,high) range of the histogram. data outside is ignored.
+      min and max of data by default, (0,1) if there is no data, as in numpy.histogram
+    :return: numpy.ndarray counts, numpy.ndarray of bins+1 edges
+    """
+    import numpy
+    data=numpy.asarray(data,dtype=float).ravel()
+    if bounds:
+        lo,hi=bounds
+    elif len(data):
+        lo,hi=data.min(),data.max()
+    else:
+        lo,hi=0.,1.
+    if hi==lo:
+        hi=lo+1.
+    data=data[(lo<=data)&(data<=hi)]
+    i=((data-lo)*(bins/(hi-lo))).astype(numpy.intp)
+    numpy.minimum(i,bins-1,out=i) # include high bound in last bin
+    return numpy.bincount(i,minlength=bins),numpy.linspace(lo,hi,bins+1)
+
+def kde(data, bandwidth=None, n=512, bounds=None):
+    """Gaussian kernel density estimation
+
+    data is binned on a regular grid, then convolved with the kernel by FFT,
+    so the cost is O(len(data)+n*log(n))
+
+    :param data: iterable or numpy.ndarray of values
+    :param bandwidth: optional float standard deviation of the kernel.
+      Silverman's rule of thumb by default
+    :param n: int number of points of the grid
+    :param bounds: optional (low,high) range of the grid. data outside is ignored.
+      by default the grid extends 3 bandwidths beyond data
+    :return: numpy.ndarray x, numpy.ndarray density at x
+    """
+    import numpy
+    data=numpy.asarray(data,dtype=float).ravel()
+    count=len(data)
+    if bandwidth is None:
+        bandwidth=1.06*data.std()*count**-0.2 if count>1 else 0
+        bandwidth=bandwidth or 1.
+    lo,hi=bounds if bounds else (data.min()-3*bandwidth,data.max()+3*bandwidth)
+    x=numpy.linspace(lo,hi,n)
+    dx=x[1]-x[0]
+    # linear binning
+    data=data[(lo<=data)&(data<=hi)]
+    pos=(data-lo)/dx
+    i=numpy.minimum(pos.astype(numpy.intp),n-2)
+    w=pos-i
+    grid=numpy.bincount(i,1-w,minlength=n)+numpy.bincount(i+1,w,minlength=n)
+    # convolution with the kernel, zero padded to avoid wrapping
+    k=min(int(math.ceil(4*bandwidth/dx)),n)
+    kernel=numpy.exp(-0.5*(numpy.arange(-k,k+1)*dx/bandwidth)**2)
+    kernel/=count*math.sqrt(2*math.pi)*bandwidth
+    size=1<<int(math.ceil(math.log(n+2*k+1,2)))
+    fft=numpy.fft.rfft(grid,size)*numpy.fft.rfft(kernel,size)
+    return x,numpy.fft.irfft(fft,size)[k:k+n]
+
+class LinearRegression(object):
+    """incremental least squares fit of y = b0 + b1*x1 + b2*x2 + ...
+
+    keeps only the sufficient statistics (the Gram matrix of [1,x,y] around
+    the first point), so data can be added by single points or numpy chunks,
+    and fits computed on separate data can be combined with :meth:`merge`
+    """
+    def __init__(self, x=None, y=None, dim=1):
+        """
+        :param x: optional iterable of data. numbers, or vectors of dim numbers
+        :param y: optional iterable of values to fit
+        :param dim: int number of variables in x
+        """
+        import numpy
+        self.dim=dim
+        self._offset=None # first [x,y] point
+        self._zz=numpy.zeros((dim+2,dim+2))
+        if x is not None:
+            self.extend(x,y)
+
+    def __repr__(self):
+        coef=[float(c) for c in self.coef] if self.n>self.dim else None # not determined yet
+        return "{}(n={}, coef={})".format(self.__class__.__name__,self.n,coef)
+
+    @property
+    def n(self):
+        return int(round(self._zz[0,0]))
+
+    def _shifted(self,x,y):
+        """:return: numpy.ndarray of [1,x,y] rows around offset"""
+        import numpy
+        x=numpy.asarray(x,dtype=float).reshape(-1,self.dim)
+        y=numpy.asarray(y,dtype=float).reshape(-1,1)
+        xy=numpy.hstack((x,y))
+        if self._offset is None:
+            self._offset=xy[0].copy()
+        return numpy.hstack((numpy.ones((len(xy),1)),xy-self._offset))
+
+    def append(self,x,y):
+        """add a point"""
+        import numpy
+        z=self._shifted(x,y)[0]
+        self._zz+=numpy.outer(z,z)
+
+    def extend(self,x,y):
+        """add points in a single vectorized call"""
+        z=self._shifted(x,y)
+        self._zz+=z.T.dot(z)
+
+    def merge(self,other):
+        """add a fit computed on other data
+
+        :return: self
+        """
+        if other._offset is None:
+            return self
+        if self._offset is None:
+            self._offset=other._offset.copy()
+        import numpy
+        m=numpy.eye(self.dim+2) # shifts other's [1,x,y] to our offset
+        m[0,1:]=other._offset-self._offset
+        self._zz+=m.T.dot(other._zz).dot(m)
+        return self
+
+    def _solve(self):
+        """:return: coefficients around offset, inverse of Gram matrix"""
+        import numpy
+        d=self.dim+1
+        inv=numpy.linalg.pinv(self._zz[:d,:d])
+        return inv.dot(self._zz[:d,d]),inv
+
+    @property
+    def coef(self):
+        """:return: numpy.ndarray [b0,b1,...]"""
+        c,_=self._solve()
+        x0,y0=self._offset[:-1],self._offset[-1]
+        c[0]+=y0-c[1:].dot(x0)
+        return c
+
+    @property
+    def rss(self):
+        """:return: residual sum of squares"""
+        c,_=self._solve()
+        d=self.dim+1
+        return max(0.,self._zz[d,d]-c.dot(self._zz[:d,d]))
+
+    def predict(self,x):
+        """:return: fitted value(s) at x"""
+        import numpy
+        c=self.coef
+        x=numpy.asarray(x,dtype=float)
+        single=x.ndim==(0 if self.dim==1 else 1)
+        res=c[0]+x.reshape(-1,self.dim).dot(c[1:])
+        return res.item() if single else res
+
+    def intervals(self,conf=0.95):
+        """confidence intervals, computed without data
+
+        :param conf: float confidence level [0..1]
+        :return: list of (low,high) intervals of coefficients [b0,b1,...],
+          (low,high) interval of rss/n
+        """
+        import scipy.stats, numpy
+        n,p=self.n,self.dim+1
+        _,inv=self._solve()
+        rss=self.rss
+        cov=inv*rss/(n-p) # covariance of coefficients around offset
+        g=numpy.zeros(p) # gradient of b0 with respect to coefficients around offset
+        g[0]=1
+        g[1:]=-self._offset[:-1]
+        var=numpy.diag(cov).copy()
+        var[0]=g.dot(cov).dot(g)
+        alpha=1-conf
+        t=-scipy.stats.t.ppf(alpha/2.,n-p)
+        e=t*numpy.sqrt(var)
+        c=self.coef
+        c1=scipy.stats.chi2.ppf(alpha/2.,n-p)
+        c2=scipy.stats.chi2.ppf(1-alpha/2.,n-p)
+        return [(b-x,b+x) for b,x in zip(c,e)],(rss/c2,rss/c1)
+
 def linear_regression(x, y, conf=None):
     """
     :param x,y: iterable data
@@ -331,36 +1233,19 @@ def linear_regression(x, y, conf=None):
     >>> linear_regression([.1,.2,.3],[10,11,11.5],0.95)
     """
     # https://gist.github.com/riccardoscalco/5356167
-    try:
-        import scipy.stats, numpy #TODO remove these requirements
-    except:
-        logging.error('scipy needed')
-        return None
-
-    x = numpy.array(x)
-    y = numpy.array(y)
-    n = len(x)
-    xy = x * y
-    xx = x * x
-
-    # estimates
-
-    b1 = (xy.mean() - x.mean() * y.mean()) / (xx.mean() - x.mean()**2)
-    b0 = y.mean() - b1 * x.mean()
-    s2 = 1./n * sum([(y[i] - b0 - b1 * x[i])**2 for i in range(n)])
+    r=LinearRegression(x,y)
+    n=r.n
+    b0,b1=r.coef
+    s2=r.rss/n
 
     if not conf:
         return b1,b0,s2
 
     #confidence intervals
+    try:
+        (i0,i1),i2=r.intervals(conf)
+    except ImportError:
+        logging.error('scipy needed')
+        return None
 
-    alpha = 1 - conf
-    c1 = scipy.stats.chi2.ppf(alpha/2.,n-2)
-    c2 = scipy.stats.chi2.ppf(1-alpha/2.,n-2)
-
-    c = -1 * scipy.stats.t.ppf(alpha/2.,n-2)
-    bb1 = c * (s2 / ((n-2) * (xx.mean() - (x.mean())**2)))**.5
-
-    bb0 = c * ((s2 / (n-2)) * (1 + (x.mean())**2 / (xx.mean() - (x.mean())**2)))**.5
-
-    return b1,b0,s2,(b1-bb1,b1+bb1),(b0-bb0,b0+bb0),(n*s2/c2,n*s2/c1)
+    return b1,b0,s2,i1,i0,i2
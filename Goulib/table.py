@@ -9,7 +9,9 @@ __copyright__ = "Copyright 2013, Philippe Guglielmetti"
 __credits__ = []
 __license__ = "LGPL"
 
-import csv, itertools, operator, string, codecs, six, logging
+import csv, itertools, operator, string, codecs, six, logging, collections, bisect, multiprocessing
+import json, struct, zlib, heapq, functools
+from six.moves import cPickle as pickle
 
 from datetime import datetime, date, timedelta
 
@@ -24,6 +26,17 @@ except: #ElementTree
     
 Element=ElementTree._Element
 
+try: # ColumnTable needs numpy
+    import numpy
+except ImportError:
+    logging.info('numpy unavailable : ColumnTable disabled')
+    numpy=None
+
+try: # python 3.8+ : numeric columns are sent to worker processes through shared memory
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory=None
+
 from .datetime2 import datef, datetimef,strftimedelta
 from .markup import tag, style_str2dict
 from .itertools2 import isiterable
@@ -69,6 +82,11 @@ class Cell():
     @staticmethod
     def read(x):
         """interprets x as int, float, string or None"""
+        if isinstance(x,six.string_types):
+            try: #most numeric cells are ints, parsed exactly in one pass
+                return int(x)
+            except ValueError:
+                pass
         try:
             x=float(x) #works for x in unicode
             xi=int(x)  #does not work if x is floating point in unicode (?)
@@ -188,6 +206,183 @@ class Row():
             res+=cell.html(**cell_args)
         return tag('tr',res,**kwargs)
     
+def _html_text(s,levels=3):
+    """encodes text as :func:`markup.tag` does at each of the nested cell, row and table levels"""
+    for _ in range(levels):
+        s=s.encode('ascii', 'xmlcharrefreplace').decode('unicode_escape')
+    return s
+
+class _HtmlColumns(object):
+    """list of cell renderers of HTML table columns, built on demand"""
+    def __init__(self,tagname,style=None):
+        """
+        :param tagname: string 'td' or 'th'
+        :param style: (list of) string for HTML style attribute, as in :class:`Row`
+        """
+        self.tagname=tagname
+        self.style=style if isinstance(style,list) else [style]
+        self.renderers=[]
+
+    def __getitem__(self,i):
+        """:return: function rendering a value in column i"""
+        while len(self.renderers)<=i:
+            j=len(self.renderers)
+            style=self.style[j] if j<len(self.style) else None
+            self.renderers.append(_cell_renderer(self.tagname,style))
+        return self.renderers[i]
+
+def _cell_renderer(tagname,style=None):
+    """
+    :return: function rendering a value like :meth:`Cell.html`,
+      with alignment, style and format determined once per type of value
+    """
+    style=style_str2dict(style) if style else {}
+    end='</%s>'%tagname
+    def start(align):
+        s=dict(style,**{'text-align':align}) if align else style
+        return tag(tagname,None,style=s) if s else '<%s>'%tagname
+
+    def compile(t):
+        if hasattr(t,'_repr_html_'):
+            return lambda v:'<%s>'%tagname+_html_text(v._repr_html_())+end
+        if issubclass(t,int):
+            s=start('right')
+            return lambda v:s+(six.text_type(v) if v else '&nbsp;')+end
+        if issubclass(t,float):
+            s=start('right')
+            return lambda v:s+'%0.2f'%v+end
+        if issubclass(t,date):
+            s=start('right')
+            return lambda v:s+v.strftime('%Y-%m-%d')+end
+        if issubclass(t,timedelta):
+            s=start('right')
+            return lambda v:s+_html_text(six.text_type(strftimedelta(v,'%H:%M:%S')))+end
+        s=start(None)
+        strip=issubclass(t,str) #as in Cell.__init__
+        def render(v):
+            if strip: v=v.lstrip().rstrip()
+            if not v or v=='':
+                return s+'&nbsp;'+end
+            v=six.text_type(v)
+            try: #fast path for ascii text without backslashes
+                v.encode('ascii')
+                if '\\' in v: v=_html_text(v)
+            except UnicodeError:
+                v=_html_text(v)
+            return s+v+end
+        return render
+
+    cache={}
+    def renderer(v):
+        t=type(v)
+        try:
+            f=cache[t]
+        except KeyError:
+            f=cache[t]=compile(t)
+        return f(v)
+    return renderer
+
+def _html_row(row,columns):
+    """:return: string HTML table row"""
+    return '<tr>'+''.join([columns[i](v) for i,v in enumerate(row)])+'</tr>\n'
+
+def _isnull(key):
+    """:return: bool True if key is None or a tuple containing None"""
+    return key is None or (isinstance(key,tuple) and None in key)
+
+def _invalidating(method):
+    """wraps a method modifying a table so that it drops the table indexes"""
+    def wrapper(self,*args,**kwargs):
+        self.drop_indexes()
+        return method(self,*args,**kwargs)
+    wrapper.__name__=method.__name__
+    wrapper.__doc__=method.__doc__
+    return wrapper
+
+#candidate formats of date columns, tried in the order they match a sample of the column
+DATE_FORMATS=['%Y-%m-%d','%Y-%m-%d %H:%M:%S','%Y-%m-%dT%H:%M:%S',
+    '%d/%m/%Y','%m/%d/%Y','%d.%m.%Y','%Y/%m/%d','%Y%m%d',
+    '%d/%m/%Y %H:%M:%S','%m/%d/%Y %H:%M:%S','%d.%m.%Y %H:%M:%S']
+
+def _attempt(f,x):
+    """:return: (f(x),False) or (x,True) if f(x) fails"""
+    try:
+        return f(x),False
+    except Exception:
+        return x,True
+
+def convert_column(values,f):
+    """converts a column, calling f only once per distinct value
+    :param values: iterable of cell values. None (missing) values are kept
+    :param f: function of the form lambda cell:content, raising an exception if cell can't be converted
+    :return: list of converted values (unchanged where conversion failed),
+      list of bool True where conversion failed
+    """
+    cache={(type(None),None):(None,False)}
+    res,failed=[],[]
+    for x in values:
+        key=(type(x),x) #1, 1.0 and True are distinct values
+        try:
+            y,e=cache[key]
+        except KeyError:
+            y,e=cache[key]=_attempt(f,x)
+        except TypeError: #unhashable
+            y,e=_attempt(f,x)
+        res.append(y)
+        failed.append(e)
+    return res,failed
+
+def detect_formats(values,formats=None,sample=100):
+    """orders date formats by the number of strings they parse in a sample of a column
+    :param values: iterable of cell values. Only strings are considered
+    :param formats: list of candidate format strings. default DATE_FORMATS
+    :param sample: int max number of distinct strings tested
+    :return: list of formats, best first. Formats parsing no sample are kept last, in the same order
+    """
+    formats=list(formats or DATE_FORMATS)
+    strings=set()
+    for x in values:
+        if isinstance(x,six.string_types):
+            strings.add(x)
+            if len(strings)>=sample:
+                break
+    def score(fmt):
+        n=0
+        for x in strings:
+            try:
+                datetime.strptime(x,fmt)
+                n+=1
+            except ValueError:
+                pass
+        return -n
+    return sorted(formats,key=score) #stable
+    
+def convert_dates(values,fmt=None,todate=False,sample=100):
+    """converts a column to datetimes or dates, parsing each distinct string only once
+    :param values: iterable of cell values : strings, numbers (Excel dates), dates or datetimes.
+      None values are kept
+    :param fmt: format string, or list of candidate formats. default DATE_FORMATS.
+      Candidate formats are tried in the order of their matches in a sample of the column
+    :param todate: bool. if True, converts to date instead of datetime
+    :param sample: int max number of distinct strings used to order formats
+    :return: list of converted values (unchanged where conversion failed),
+      list of bool True where conversion failed
+    """
+    values=list(values)
+    formats=fmt if isinstance(fmt,(list,tuple)) else [fmt] if fmt else DATE_FORMATS
+    if len(formats)>1:
+        formats=detect_formats(values,formats,sample)
+    f=datef if todate else datetimef
+    def parse(x):
+        if isinstance(x,six.string_types):
+            for fmt in formats[:-1]:
+                try:
+                    return f(x,fmt=fmt)
+                except ValueError:
+                    pass
+        return f(x,fmt=formats[-1])
+    return convert_column(values,parse)
+
 class Table(list):
     """Table class with CSV I/O, easy access to columns, HTML output"""
     def __init__(self,data=[],**kwargs):
@@ -218,6 +413,8 @@ class Table(list):
             ext=filename.split('.')[-1].lower()
             if ext=='xls':
                 self.read_xls(filename,**kwargs)
+            elif ext=='ctb':
+                self.read_bin(filename,allow_pickle=kwargs.get('allow_pickle',False))
             elif ext[:3]=='htm':
                 self.read_html(filename,**kwargs)
             else: #try ...
@@ -236,44 +433,74 @@ class Table(list):
             res+=str(line)+'\n'
         return res
     
+    pagesize=100 #max number of rows displayed in notebooks. See :meth:`page`
+    
     def _repr_html_(self):
-        return self.html()
+        if len(self)<=self.pagesize:
+            return self.html()
+        return self.page(0)+'<p>%d rows</p>'%len(self)
     
     def html(self,head=None,foot=None,colstyle=None,**kwargs):
-        """:return: string HTML representation of table"""
-                
-        def TR(data,align=None,fmt=None,tag=None,style=None):
-            res=''
-            row=Row(data=data,align=align,fmt=fmt,tag=tag,style=style)
-            res+=row.html()+'\n'
-            return res
-            
-        def THEAD(data,fmt=None,style=None):
-            res="<thead>\n"
-            res+=TR(data=data,fmt=fmt,tag='th',style=style)
-            res+="</thead>\n"
-            return res
-            
-        def TFOOT(data,fmt=None,style=None):
-            res="<tfoot>\n"
-            res+=TR(data=data,fmt=fmt,tag='th',style=style)
-            res+="</tfoot>\n"
-            return res
-        
-        res=''
-            
+        """:return: string HTML representation of table. See :meth:`ihtml` for parameters"""
+        return ''.join(self.ihtml(head,foot,colstyle,**kwargs))
+    
+    def page(self,n=0,size=None,**kwargs):
+        """
+        :param n: int page number, starting at 0
+        :param size: int number of rows per page, :attr:`pagesize` by default
+        :return: string HTML representation of page n of the table
+        """
+        size=size or self.pagesize
+        return self.html(start=n*size,stop=(n+1)*size,**kwargs)
+    
+    def write_html(self,f,**kwargs):
+        """writes the HTML representation of table by chunks of rows
+        :param f: file-like object or string filename
+        :param kwargs: see :meth:`ihtml`
+        """
+        if isinstance(f,six.string_types):
+            with open(f,'w') as f:
+                return self.write_html(f,**kwargs)
+        for chunk in self.ihtml(**kwargs):
+            f.write(chunk)
+    
+    def ihtml(self,head=None,foot=None,colstyle=None,start=0,stop=None,chunksize=1000,**kwargs):
+        """iterates the HTML representation of table by chunks.
+        Cells are rendered as by :meth:`Cell.html`, but alignment and format
+        are computed once per column and type of value.
+        :param head: list of header cells. titles by default
+        :param foot: list of footer cells. footer by default
+        :param colstyle: (list of) string for HTML style attribute of cells
+        :param start: int first row to render
+        :param stop: int row after the last one to render, or None for all
+        :param chunksize: int number of rows per chunk
+        :param kwargs: attributes of the table tag
+        :return: iterator over strings 
+        """
+        yield tag('table',None,**kwargs)
         if head is None:
             head=self.titles
         if head:
-            res+=THEAD(head)
-        for row in self:
-            res+=TR(row,style=colstyle)  
+            yield '<thead>\n'+_html_row(head,_HtmlColumns('th'))+'</thead>\n'
+        columns=_HtmlColumns('td',colstyle)
+        if isinstance(self,ColumnTable): #render column by column
+            stop=len(self) if stop is None else min(stop,len(self))
+            for i in range(start,stop,chunksize):
+                j=min(i+chunksize,stop)
+                cells=[list(map(columns[k],_tolist(c[i:j]))) for k,c in enumerate(self.columns)]
+                yield ''.join('<tr>'+''.join(row)+'</tr>\n' for row in zip(*cells))
+        else:
+            rows=itertools.islice(self,start,stop)
+            while True:
+                chunk=[_html_row(row,columns) for row in itertools.islice(rows,chunksize)]
+                if not chunk:
+                    break
+                yield ''.join(chunk)
         if foot is None:
             foot=self.footer
         if foot:
-            res+=TFOOT(foot)             
-        
-        return tag('table',res,**kwargs)+'\n'
+            yield '<tfoot>\n'+_html_row(foot,_HtmlColumns('th'))+'</tfoot>\n'
+        yield '</table>\n'
     
     def read_element(self,element, **kwargs):
         """read table from a DOM element"""
@@ -292,106 +519,53 @@ class Table(list):
                 self.append(line)
         return self
     
+    def _read_chunks(self, chunks):
+        """appends chunks of tables, with titles of the first one if any"""
+        for chunk in chunks:
+            if chunk.titles:
+                self.titles=chunk.titles
+            self.extend(chunk)
+        return self
+    
     def read_html(self,filename, **kwargs):
-        """read first table in HTML file
+        """read first table in HTML file.
+        See :func:`iread_html` for parameters
         """
-        parser=kwargs.get('parser',defaultparser)
-        element = ElementTree.parse(filename,parser()).getroot()
-        try:
-            if element.tag!='table': # file contains table as topmost tag
-                element = element.find('.//table') #find first table
-        except: 
-            pass
-        
-        if element is None:
-            raise LookupError('no table found in file')
-        
-        self.read_element(element, **kwargs)
-        return self
+        kwargs.setdefault('titles',self.titles or None)
+        return self._read_chunks(iread_html(filename, **kwargs))
     
     def read_xls(self, filename, **kwargs):
-        """appends an Excel table"""
-        titles_line=kwargs.pop('titles_line',1)-1
-        data_line=kwargs.pop('data_line',2)-1
-        
-        from xlrd import open_workbook
-        wb = open_workbook(filename)
-        for s in wb.sheets():
-            for i in range(s.nrows):
-                line=[Cell.read(s.cell(i,j).value) for j in range(s.ncols)]
-                if i==titles_line:
-                    self.titles=line
-                elif i>=data_line:
-                    self.append(line)
-        return self
+        """appends an Excel table.
+        See :func:`iread_xls` for parameters
+        """
+        return self._read_chunks(iread_xls(filename, **kwargs))
         
     def read_csv(self, filename, **kwargs):
-        """appends a .csv or similar file to the table"""
-        titles_line=kwargs.pop('titles_line',1)-1
-        data_line=kwargs.pop('data_line',2)-1
-        
-        dialect=kwargs.setdefault('dialect',csv.excel)
-        delimiter=kwargs.setdefault('delimiter',';')
-        encoding=kwargs.pop('encoding','utf-8') #must be iso-8859-15 in some cases
-        errors=kwargs.pop('errors','strict')
-        
-        def csv_reader2(): # version for Python 2
-            with codecs.open(filename, 'rb', errors=errors) as f:
-                csv_reader = csv.reader(f, **kwargs)
-                for row in csv_reader:
-                    yield [unicode(cell, encoding) for cell in row]
-        
-        def csv_reader3():  # version for Python 3
-            with open(filename, 'rt', errors=errors, encoding=encoding) as f:
-                csv_reader = csv.reader(f, **kwargs)
-                for row in csv_reader:
-                    yield row
-        
-        reader = csv_reader2() if six.PY2 else csv_reader3()
-        
-        for i,row in enumerate(reader):
-            if i==titles_line: #titles can have no left/right spaces
-                self.titles=[Cell.read(x) for x in row]
-            elif i>=data_line:
-                line=[Cell.read(x) for x in row]
-                if line!=[None]: #strange last line sometimes ...
-                    self.append(line)
+        """appends a .csv or similar file to the table.
+        See :func:`iread_csv` for parameters"""
+        return self._read_chunks(iread_csv(filename, **kwargs))
+            
+    def read_bin(self, filename, **kwargs):
+        """appends a binary file written by :meth:`write_bin`.
+        See :meth:`ColumnTable.read_bin` for parameters"""
+        c=ColumnTable().read_bin(filename, **kwargs)
+        self.titles=c.titles
+        self.extend(c)
         return self
+    
+    def write_bin(self, filename, compress=0):
+        """write the table in binary columnar format. See :meth:`ColumnTable.write_bin`"""
+        self.columnar().write_bin(filename,compress)
             
     def write_csv(self,filename, transpose=False, **kwargs):
         """ write the table in Excel csv format, optionally transposed"""
-    
-        dialect=kwargs.get('dialect','excel')
-        delimiter=kwargs.get('delimiter',';')
-        encoding=kwargs.pop('encoding','utf-8') #was iso-8859-15 earlier
-        empty=''.encode(encoding)
-        
-        if six.PY3 :
-            f = open(filename, 'w', newline='', encoding=encoding)
-            def _encode(line): 
-                return [s for s in line]
-        else: #Python 2
-            f = open(filename, 'wb')
-            def _encode(line): 
-                return [empty if s is None else unicode(s).encode(encoding) for s in line]
-        
-        writer=csv.writer(f, dialect=dialect, delimiter=delimiter)
         if transpose:
-            i=0
-            while self.col(i)[0]:
-                line=[empty]
-                if self.titles: line=[self.titles[i]]
-                line.extend(self.col(i))
-                writer.writerow(_encode(line))
-                i+=1
+            titles=self.titles or [None]*self.ncols()
+            columns=six.moves.zip_longest(*self) if self else []
+            rows=([title]+list(column) for title,column in zip(titles,columns))
+            write_csv_chunks(filename,[rows],**kwargs)
         else:
-            if self.titles:
-                s=_encode(self.titles)
-                writer.writerow(s)
-            for line in self:
-                s=_encode(line)
-                writer.writerow(s)
-        f.close()
+            write_csv_chunks(filename,[self],self.titles,**kwargs)
     
     def ncols(self):
         """return number of columns, ignoring title"""
@@ -416,11 +590,13 @@ class Table(list):
     
     def icol(self,column):
         '''iterates column'''
+        i=self._i(column)
         for row in self:
             try:
-                yield row[self._i(column)]
-            except:
-                yield None
+                x=row[i]
+            except: #missing cell, or column
+                x=None
+            yield x
                 
     def col(self,column):
         return [x for x in self.icol(column)]
@@ -429,16 +605,181 @@ class Table(list):
         """
         :return: int row number of first line where column contains value
         """
-        for i,v in enumerate(self.icol(column)):
-            if v==value:
-                return i
-        return None
+        try:
+            rows=self.lookup(column,value)
+        except TypeError: #unhashable values
+            for i,v in enumerate(self.icol(column)):
+                if v==value:
+                    return i
+            return None
+        return rows[0] if rows else None
+    
+    # list methods modifying the table
+    __setitem__=_invalidating(list.__setitem__)
+    __delitem__=_invalidating(list.__delitem__)
+    __iadd__=_invalidating(list.__iadd__)
+    __imul__=_invalidating(list.__imul__)
+    extend=_invalidating(list.extend)
+    insert=_invalidating(list.insert)
+    pop=_invalidating(list.pop)
+    remove=_invalidating(list.remove)
+    reverse=_invalidating(list.reverse)
+    if six.PY2:
+        __setslice__=_invalidating(list.__setslice__)
+        __delslice__=_invalidating(list.__delslice__)
+    else:
+        clear=_invalidating(list.clear)
+    
+    def drop_indexes(self):
+        """drops the indexes built by :meth:`hashindex` and :meth:`sortindex`.
+        called automatically by methods modifying the table, 
+        but must be called explicitly after modifying cells of rows in place
+        """
+        self.__dict__.pop('_indexes',None)
+        
+    def _keys(self,columns):
+        """:return: list of key values (tuples if several columns) for each row"""
+        if isinstance(columns,(list,tuple)):
+            return list(zip(*[self.icol(c) for c in columns]))
+        return list(self.icol(columns))
+    
+    def _cached_index(self,kind,columns,build):
+        """:return: index of kind over columns, built by build(columns) if needed"""
+        if isinstance(columns,(list,tuple)):
+            key=(kind,tuple(self._i(c) for c in columns))
+        else:
+            key=(kind,self._i(columns))
+        indexes=self.__dict__.setdefault('_indexes',{})
+        if key not in indexes:
+            indexes[key]=build(columns)
+        return indexes[key]
+    
+    def hashindex(self,columns):
+        """hash index built on first call and kept until the table is modified
+        :param columns: column, or list of columns for tuple keys
+        :return: dict of value:list of row numbers
+        """
+        def build(columns):
+            res={}
+            for i,k in enumerate(self._keys(columns)):
+                res.setdefault(k,[]).append(i)
+            return res
+        return self._cached_index('hash',columns,build)
+    
+    def sortindex(self,columns):
+        """sorted index built on first call and kept until the table is modified
+        :param columns: column, or list of columns for tuple keys
+        :return: keys,rows : sorted list of column values, and list of corresponding row numbers.
+          None values (or keys containing None) are not indexed
+        """
+        def build(columns):
+            keys=self._keys(columns)
+            rows=[i for i,k in enumerate(keys) if not _isnull(k)]
+            rows.sort(key=keys.__getitem__)
+            return [keys[i] for i in rows],rows
+        return self._cached_index('sort',columns,build)
+    
+    def lookup(self,columns,value):
+        """
+        :param columns: column, or list of columns
+        :param value: value, or tuple of values
+        :return: list of row numbers where columns contain value, in O(1) through :meth:`hashindex`
+        """
+        return self.hashindex(columns).get(value,[])
+    
+    def between(self,columns,start=None,stop=None):
+        """range selection in O(log n) through :meth:`sortindex`
+        :param columns: column, or list of columns
+        :param start: lowest value selected. None for no limit
+        :param stop: value above selected ones. None for no limit
+        :return: list of row numbers where start <= column < stop, sorted by column value
+        """
+        keys,rows=self.sortindex(columns)
+        a=0 if start is None else bisect.bisect_left(keys,start)
+        b=len(keys) if stop is None else bisect.bisect_left(keys,stop)
+        return [int(i) for i in rows[a:b]]
+    
+    def join(self,other,on,how='inner',right_on=None,algorithm='hash'):
+        """joins rows of two tables with equal keys
+        :param other: table to join with self
+        :param on: column, or list of columns of keys in self
+        :param how: string 'inner', 'left' to keep all rows of self,
+          or 'outer' to keep all rows of both tables. Missing values are None
+        :param right_on: column(s) of keys in other. Same as on by default
+        :param algorithm: string 'hash' to join through :meth:`hashindex` of other, 
+          resulting rows are in self order, then unmatched other rows for outer join.
+          or 'merge' for sort-merge join through :meth:`sortindex` of both tables, 
+          resulting rows are sorted by keys.
+          None keys never match.
+        :return: table of the same type than self, with columns of self followed by other non-key columns
+        """
+        if right_on is None:
+            right_on=on
+        ion=[self._i(c) for c in on] if isinstance(on,(list,tuple)) else [self._i(on)]
+        iright=[other._i(c) for c in right_on] if isinstance(right_on,(list,tuple)) else [other._i(right_on)]
+        left,right=list(self),list(other)
+        nleft=max([len(self.titles)]+[len(r) for r in left])
+        nright=max([len(other.titles)]+[len(r) for r in right])
+        rcols=[j for j in range(nright) if j not in iright]
+        titles=list(self.titles)+[other.titles[j] for j in rcols if j<len(other.titles)]
+        
+        def row(i,j):
+            a=left[i] if i is not None else [None]*nleft
+            b=right[j] if j is not None else [None]*nright
+            res=list(a)+[None]*(nleft-len(a))+[b[k] if k<len(b) else None for k in rcols]
+            if i is None: #keys from other
+                for k,l in zip(ion,iright):
+                    res[k]=b[l]
+            return res
+        
+        rows,matched=[],set()
+        if algorithm=='hash':
+            index=other.hashindex(right_on)
+            for i,k in enumerate(self._keys(on)):
+                js=[] if _isnull(k) else index.get(k,[])
+                for j in js:
+                    rows.append(row(i,j))
+                matched.update(js)
+                if not js and how!='inner':
+                    rows.append(row(i,None))
+        elif algorithm=='merge':
+            lk,lr=self.sortindex(on)
+            rk,rr=other.sortindex(right_on)
+            a=b=0
+            while a<len(lk) and b<len(rk):
+                if lk[a]<rk[b]:
+                    if how!='inner': rows.append(row(lr[a],None))
+                    a+=1
+                elif rk[b]<lk[a]:
+                    if how=='outer': rows.append(row(None,rr[b]))
+                    b+=1
+                else: #same keys: cross product of both groups
+                    a2,b2=a,b
+                    while a2<len(lk) and lk[a2]==lk[a]: a2+=1
+                    while b2<len(rk) and rk[b2]==rk[b]: b2+=1
+                    for i in lr[a:a2]:
+                        for j in rr[b:b2]:
+                            rows.append(row(i,j))
+                    matched.update(rr[b:b2])
+                    a,b=a2,b2
+            if how!='inner':
+                rows.extend(row(i,None) for i in lr[a:])
+                rows.extend(row(i,None) for i,k in enumerate(self._keys(on)) if _isnull(k))
+            if how=='outer':
+                rows.extend(row(None,j) for j in rr[b:])
+                matched.update(rr[b:])
+        else:
+            raise ValueError('unknown join algorithm %s'%algorithm)
+        if how=='outer':
+            rows.extend(row(None,j) for j,k in enumerate(other._keys(right_on)) if j not in matched and (algorithm=='hash' or _isnull(k)))
+        return self.__class__(rows,titles=titles)
     
     def get(self,row,col):
         col=self._i(col)
         return self[row][col]
     
     def set(self,row,col,value):
+        self.drop_indexes()
         col=self._i(col)
         if row>=len(self): 
             self.extend([list()]*(1+row-len(self)))
@@ -468,6 +809,7 @@ class Table(list):
                     self.titles.append(k)
                 self.set(r,i,v)
         else:
+            self.drop_indexes()
             list.append(self,line)
             
     def addcol(self,title,val=None,i=0):
@@ -482,6 +824,7 @@ class Table(list):
             
     def sort(self,by,reverse=False):
         '''sort by column'''
+        self.drop_indexes()
         i=self._i(by)
         if isinstance(i, int):
             list.sort(self,key=lambda x:x[i],reverse=reverse)
@@ -493,22 +836,38 @@ class Table(list):
         return dict(list(zip(self.titles,self[i])))
         
     def groupby(self,by,sort=True,removecol=True):
-        '''dictionary of subtables grouped by a column'''
-        i=self._i(by)
+        '''dictionary of subtables grouped by one or more columns.
+        rows are grouped by hashing, so the table is not modified
+        :param by: column or list of columns. keys are tuples if several columns
+        :param sort: bool if True, the dict is ordered by keys
+        :param removecol: bool if True, key columns are removed from subtables
+        '''
+        ikeys=[self._i(k) for k in by] if isinstance(by,(list,tuple)) else [self._i(by)]
+        res=collections.OrderedDict()
+        for row in self:
+            k=tuple(row[i] for i in ikeys) if len(ikeys)>1 else row[ikeys[0]]
+            res.setdefault(k,[]).append(row)
         t=self.titles
-        if removecol: t=t[:i]+t[i+1:]
-        res={}
-        if sort: 
-            self.sort(i) 
-        else:
-            pass #groupby will group CONSECUTIVE lines with same i, so entries at bottom of table will replace the earlier entries in dict
-        for k, g in itertools.groupby(self, key=lambda x:x[i]):
+        if removecol: t=[x for j,x in enumerate(t) if j not in ikeys]
+        for k,g in res.items():
             if removecol:
-                r=Table(titles=t,data=[a[:i]+a[i+1:] for a in g])
-            else:
-                r=Table(titles=t,data=list(g))
-            res[k]=r
-        return res
+                g=[[x for j,x in enumerate(a) if j not in ikeys] for a in g]
+            res[k]=Table(titles=list(t),data=g)
+        return _sorted_dict(res) if sort else res
+    
+    def aggregate(self,by,aggregates,sort=True,processes=None):
+        """aggregates groups of rows in a single pass, without building subtables
+        :param by: column or list of columns defining groups
+        :param aggregates: list of (column,function) or (column,function,title) tuples.
+          function is 'count', 'sum', 'mean', 'min', 'max' (or builtins len, sum, min, max),
+          or any function of a list of values, like footer functions.
+          None values are ignored. column can be None to count rows
+        :param sort: bool if True, result is sorted by keys, otherwise in order of first appearance
+        :param processes: optional int number of processes among which rows are partitioned
+        :return: Table with key columns followed by aggregates columns, one row per group
+        """
+        titles,rows=_aggregate(self,by,aggregates,sort,processes)
+        return Table(rows,titles=titles)
     
     def hierarchy(self,by='Level',
                   factory=lambda row:(row,[]),          #creates an object from a line
@@ -530,15 +889,24 @@ class Table(list):
             stack.append(obj)
         return res
         
-    def applyf(self,by,f,skiperrors=False):
+    def applyf(self,by,f,skiperrors=False,processes=None):
         """ apply a function to a column
         :param by: column name of number
         :param f: function of the form lambda cell:content
         :param skiperrors: bool. if True, errors while running f are ignored
+        :param processes: optional int number of processes among which the column is partitioned.
+          f must then be picklable, and the column is unchanged if an error is raised
         :return: bool True if ok, False if skiperrors==True and conversion failed
         """
+        self.drop_indexes()
         res=True
         i=self._i(by)
+        if processes:
+            values=[row[i] for row in self]
+            values,res=_papplyf([values[a:b] for a,b in _partitions(len(values),processes)],f,skiperrors,processes)
+            for row,x in zip(self,values):
+                row[i]=x
+            return res
         for row in self:
             x=row[i]
             try:
@@ -550,45 +918,116 @@ class Table(list):
                 res=False
         return res
             
+    def _converted(self,by,values,failed):
+        """stores converted values in a column
+        :return: failed
+        """
+        self.drop_indexes()
+        i=self._i(by)
+        for row,x in zip(self,values):
+            if i<len(row): #missing cells stay missing
+                row[i]=x
+        return failed
+
+    def convert(self,by,f):
+        """converts a column, calling f only once per distinct value.
+        Unlike :meth:`applyf`, failures do not raise
+        :param by: column name of number
+        :param f: function of the form lambda cell:content
+        :return: list of bool True for rows where conversion failed and cell was kept
+        """
+        return self._converted(by,*convert_column(self.icol(by),f))
+
+    def _convert_dates(self,by,fmt,skiperrors,todate):
+        values,failed=convert_dates(self.icol(by),fmt,todate)
+        if any(failed) and not skiperrors:
+            logging.error('could not convert %s'%values[list(failed).index(True)])
+            raise(ValueError)
+        failed=self._converted(by,values,failed)
+        return not any(failed)
+
     def to_datetime(self,by,fmt='%Y-%m-%d',skiperrors=False):
         """convert a column to datetime
         :param by: column name of number
-        :param fmt: string defining datetime format
+        :param fmt: string defining datetime format, or list of candidate formats
+          tried in the order of their matches in a sample of the column
         :param skiperrors: bool. if True, conversion errors are ignored
         :return: bool True if ok, False if skiperrors==True and conversion failed
         """
-        if isinstance(fmt,list):
-            for f in fmt:
-                res=self.to_datetime(by, f, skiperrors=True if f!=fmt[-1] else skiperrors)
-            return res
-        return self.applyf(by,lambda x: datetimef(x,fmt=fmt),skiperrors)
+        return self._convert_dates(by,fmt,skiperrors,False)
         
     def to_date(self,by,fmt='%Y-%m-%d',skiperrors=False):
         """convert a column to date
         :param by: column name of number
-        :param fmt: string defining datetime format
+        :param fmt: string defining date format, or list of candidate formats
+          tried in the order of their matches in a sample of the column
         :param skiperrors: bool. if True, conversion errors are ignored
         :return: bool True if ok, False if skiperrors==True and conversion failed
         """  
-        if isinstance(fmt,list):
-            for f in fmt:
-                res=self.to_date(by, f, skiperrors=True if f!=fmt[-1] else skiperrors)
-            return res
-        return self.applyf(by,lambda x: datef(x,fmt=fmt),skiperrors)
+        return self._convert_dates(by,fmt,skiperrors,True)
             
 
-    def total(self,funcs):
+    def total(self,funcs,processes=None):
         """build a footer row by appling funcs to all columns
+        :param processes: optional int number of processes computing
+          len, sum, min and max on partitions of rows, merged afterwards
         """
         funcs=funcs+[None]*(len(self.titles)-len(funcs))
+        totals=self._ptotals(funcs,processes) if processes else {}
         self.footer=[]
         for i,f in enumerate(funcs):
+            if i in totals:
+                self.footer.append(totals[i])
+                continue
             try:
                 self.footer.append(f(self.col(i)))
             except:
                 self.footer.append(f)
         return self.footer
     
+    def _ptotals(self,funcs,processes):
+        """:return: dict of column number:total of mergeable funcs computed on partitions"""
+        funcs=[f if _mergeable(f) else None for f in funcs]
+        parts=self.map_partitions(functools.partial(_partial_totals,funcs),processes)
+        res={}
+        for i,f in enumerate(funcs):
+            values=[p[i] for p in parts]
+            if f is not None and values and all(ok for ok,_ in values):
+                res[i]=six.moves.reduce(_MERGES[f],[v for _,v in values])
+        return res
+    
+    def _parts(self,ranges):
+        """:return: list of tables of rows in ranges, function releasing resources"""
+        return [Table(self[a:b],titles=list(self.titles)) for a,b in ranges],lambda:None
+    
+    def map_partitions(self,f,processes=None,merge=None,partitions=None):
+        """applies f to partitions of rows in a pool of processes
+        :param f: picklable function of a table of the same class and titles as this one
+        :param processes: int number of processes. default cpu count
+        :param merge: optional function of 2 results, used to reduce the results
+        :param partitions: int number of partitions. default processes
+        :return: list of results of f for each partition in rows order, or merged result
+        """
+        from .itertools2 import pmap
+        processes=processes or multiprocessing.cpu_count()
+        parts,release=self._parts(_partitions(len(self),partitions or processes))
+        try:
+            res=list(pmap(_run_partition,[(f,p) for p in parts],processes=processes,chunksize=1))
+        finally:
+            release()
+        if merge and res:
+            return six.moves.reduce(merge,res)
+        return res
+    
+    def maprows(self,f,processes=None):
+        """
+        :param f: picklable function of a row
+        :param processes: int number of processes. default cpu count
+        :return: list of f(row) for all rows, computed on partitions of rows in a pool of processes
+        """
+        res=self.map_partitions(functools.partial(_maprows,f),processes)
+        return list(itertools.chain.from_iterable(res))
+    
     def remove_lines_where(self,f):
         """
         :param f: function of the form lambda line:bool returning True if line should be removed
@@ -607,4 +1046,1418 @@ class Table(list):
             if self[i]!=other[i]:
                 return False
         return True
+
+    def query(self):
+        """:return: :class:`Query` lazy query over the table"""
+        return Query(self)
+
+    def columnar(self):
+        """:return: :class:`ColumnTable` copy of the table"""
+        return ColumnTable(self,titles=list(self.titles),footer=list(self.footer))
                 
+
+_NUMTYPES=six.integer_types+(float,)
+
+def _column(values):
+    """builds a column array
+    :param values: iterable, or numpy array returned as is
+    :return: numpy array of bool, int64, float64 (with None stored as NaN),
+      datetime64 for dates or naive datetimes (with None stored as NaT)
+      or object if values cannot be typed
+    """
+    if isinstance(values,numpy.ndarray):
+        return values
+    values=list(values)
+    types=set(map(type,values))
+    if values and types<=set(six.integer_types):
+        try:
+            return numpy.array(values,dtype=numpy.int64)
+        except OverflowError:
+            pass
+    elif values and types=={bool}:
+        return numpy.array(values,dtype=bool)
+    elif types-{type(None)} and types<=set(_NUMTYPES+(type(None),)):
+        return numpy.array([numpy.nan if v is None else v for v in values],dtype=numpy.float64)
+    elif types-{type(None)}=={date}:
+        return numpy.array(values,dtype='M8[D]')
+    elif types-{type(None)}=={datetime} and all(v is None or v.tzinfo is None for v in values):
+        return numpy.array(values,dtype='M8[us]')
+    res=numpy.empty(len(values),dtype=object)
+    res[:]=values
+    return res
+
+def _tolist(column):
+    """:return: list of Python values in column, with NaN converted back to None"""
+    res=column.tolist()
+    if column.dtype.kind=='f':
+        res=[None if v!=v else v for v in res]
+    return res
+
+def _fits(column,value):
+    """:return: bool True if value can be stored in column without changing its dtype"""
+    k=column.dtype.kind
+    if k=='O':
+        return True
+    if k=='b':
+        return isinstance(value,bool)
+    if isinstance(value,bool):
+        return False
+    if k=='i':
+        return isinstance(value,six.integer_types) and -2**63<=value<2**63
+    if k=='U':
+        return isinstance(value,six.text_type) and len(value)<=column.dtype.itemsize//4
+    if k=='S':
+        return isinstance(value,bytes) and len(value)<=column.dtype.itemsize
+    if k=='M':
+        if value is None:
+            return True
+        if column.dtype==numpy.dtype('M8[D]'):
+            return type(value) is date
+        return type(value) is datetime and value.tzinfo is None
+    return value is None or isinstance(value,_NUMTYPES)
+
+def _concat(a,b):
+    """:return: concatenation of columns a and b, retyped if needed"""
+    if len(a)==0:
+        return b.copy()
+    if len(b)==0:
+        return a
+    if a.dtype==b.dtype or (a.dtype.kind in 'if' and b.dtype.kind in 'if'):
+        return numpy.concatenate((a,b))
+    return _column(_tolist(a)+_tolist(b))
+
+#vectorized versions of usual footer functions. NaN (None) values are ignored
+_REDUCERS={sum:'nansum', min:'nanmin', max:'nanmax'}
+
+def _reduce(f,column):
+    """:return: f applied to column, vectorized if possible"""
+    if f is len:
+        return len(column)
+    if column.dtype.kind in 'biuf' and f in _REDUCERS:
+        return getattr(numpy,_REDUCERS[f])(column).item()
+    return f(_tolist(column))
+
+#single pass aggregates, as (initial state, update(state,value), merge(state,state), final(state))
+def _min(a,b):
+    return a if b is None else b if a is None else min(a,b)
+
+def _max(a,b):
+    return a if b is None else b if a is None else max(a,b)
+
+def _mean_final(s):
+    return s[0]/float(s[1]) if s[1] else None
+
+_AGGREGATES={
+    'count':(lambda:0, lambda s,x:s+1, operator.add, None),
+    'sum':(lambda:0, operator.add, operator.add, None),
+    'mean':(lambda:(0,0), lambda s,x:(s[0]+x,s[1]+1), lambda a,b:(a[0]+b[0],a[1]+b[1]), _mean_final),
+    'min':(lambda:None, _min, _min, None),
+    'max':(lambda:None, _max, _max, None),
+    'values':(list, lambda s,x:s.append(x) or s, operator.add, None), # for custom reducers
+}
+
+_BUILTIN_AGGREGATES={len:'count', sum:'sum', min:'min', max:'max'}
+
+def _factorize(keys):
+    """
+    :param keys: list of key columns
+    :return: codes, uniques : int array of group number of each row, list of keys
+    """
+    if len(keys)==1 and keys[0].dtype.kind in 'biu':
+        uniques,codes=numpy.unique(keys[0],return_inverse=True)
+        return codes.ravel(),uniques.tolist()
+    keys=[_tolist(k) for k in keys]
+    keys=keys[0] if len(keys)==1 else zip(*keys)
+    index={}
+    codes=numpy.fromiter((index.setdefault(k,len(index)) for k in keys),dtype=numpy.intp)
+    uniques=[None]*len(index)
+    for k,i in index.items():
+        uniques[i]=k
+    return codes,uniques
+
+def _array_states(kind,codes,g,column):
+    """:return: list of states of aggregate kind for each of the g groups"""
+    if column is None: #count rows
+        return numpy.bincount(codes,minlength=g).tolist()
+    init,update=_AGGREGATES[kind][:2]
+    if column.dtype.kind not in 'biuf' or kind=='values':
+        states=[init() for _ in range(g)]
+        for c,x in zip(codes.tolist(),_tolist(column)):
+            if x is not None:
+                states[c]=update(states[c],x)
+        return states
+    if column.dtype.kind=='f':
+        valid=~numpy.isnan(column)
+        codes,column=codes[valid],column[valid]
+    n=numpy.bincount(codes,minlength=g)
+    if kind=='count':
+        return n.tolist()
+    if kind in ('sum','mean'):
+        if column.dtype.kind=='f':
+            s=numpy.bincount(codes,weights=column,minlength=g)
+        else: #keep ints exact
+            s=numpy.zeros(g,dtype=numpy.int64)
+            numpy.add.at(s,codes,column)
+        s=s.tolist()
+        return s if kind=='sum' else list(zip(s,n.tolist()))
+    #min or max : sort by group, then value
+    order=numpy.lexsort((column,codes))
+    ends=numpy.cumsum(n)
+    i=ends-n if kind=='min' else ends-1
+    v=column[order][numpy.minimum(i,len(column)-1)].tolist() if len(column) else [None]*g
+    return [x if k else None for x,k in zip(v,n.tolist())]
+
+def _partial_aggregate(args):
+    """aggregates a partition
+    :param args: tuple (keys, values, kinds) of lists of key columns, value columns and aggregates names
+    :return: OrderedDict of key:list of states
+    """
+    keys,values,kinds=args
+    if numpy is not None and all(isinstance(c,numpy.ndarray) for c in keys):
+        codes,uniques=_factorize(keys)
+        states=[_array_states(kind,codes,len(uniques),c) for kind,c in zip(kinds,values)]
+        return collections.OrderedDict((k,list(s)) for k,s in zip(uniques,zip(*states)))
+    res=collections.OrderedDict()
+    funcs=[_AGGREGATES[kind] for kind in kinds]
+    for r,k in enumerate(keys[0] if len(keys)==1 else zip(*keys)):
+        s=res.get(k)
+        if s is None:
+            s=res[k]=[f[0]() for f in funcs]
+        for j,c in enumerate(values):
+            x=True if c is None else c[r]
+            if x is not None:
+                s[j]=funcs[j][1](s[j],x)
+    return res
+
+def _merge_aggregates(a,b,kinds):
+    """merges partial aggregates b into a"""
+    merges=[_AGGREGATES[kind][2] for kind in kinds]
+    for k,s in b.items():
+        if k in a:
+            a[k]=[f(x,y) for f,x,y in zip(merges,a[k],s)]
+        else:
+            a[k]=s
+    return a
+
+def _sorted_dict(d):
+    """:return: OrderedDict sorted by keys if they can be compared, else d"""
+    try:
+        return collections.OrderedDict(sorted(d.items(),key=operator.itemgetter(0)))
+    except TypeError:
+        return d
+
+def _aggregate_titles(titles,ikeys,aggregates):
+    """:return: list of key titles + aggregate titles of an aggregation"""
+    res=[titles[i] if i<len(titles) else i for i in ikeys]
+    for a in aggregates:
+        column,f=a[:2]
+        res.append(a[2] if len(a)>2 else '%s(%s)'%(getattr(f,'__name__',f),'' if column is None else column))
+    return res
+
+def _aggregate(table,by,aggregates,sort=True,processes=None):
+    """implements :meth:`Table.aggregate` and :meth:`ColumnTable.aggregate`
+    :return: list of key titles + aggregate titles, list of result rows
+    """
+    by=by if isinstance(by,(list,tuple)) else [by]
+    ikeys=[table._i(k) for k in by]
+    titles=_aggregate_titles(table.titles,ikeys,aggregates)
+    kinds,columns,finals=[],[],[]
+    for a in aggregates:
+        column,f=a[:2]
+        kind=_BUILTIN_AGGREGATES.get(f,f)
+        if kind not in _AGGREGATES or kind=='values': #custom reducer
+            finals.append(f)
+            kind='values'
+        else:
+            finals.append(_AGGREGATES[kind][3])
+        kinds.append(kind)
+        columns.append(None if column is None else table.col(column))
+    keys=[table.col(i) for i in ikeys]
+    if processes and len(keys[0])>processes:
+        from .itertools2 import pmap
+        size=-(-len(keys[0])//processes)
+        parts=[([k[i:i+size] for k in keys],[None if c is None else c[i:i+size] for c in columns],kinds)
+            for i in range(0,len(keys[0]),size)]
+        res=collections.OrderedDict()
+        for part in pmap(_partial_aggregate,parts,processes=processes,chunksize=1):
+            _merge_aggregates(res,part,kinds)
+    else:
+        res=_partial_aggregate((keys,columns,kinds))
+    if sort:
+        res=_sorted_dict(res)
+    rows=[]
+    for k,s in res.items():
+        row=list(k) if len(by)>1 else [k]
+        row.extend(x if f is None else f(x) for f,x in zip(finals,s))
+        rows.append(row)
+    return titles,rows
+
+def _partitions(n,parts):
+    """:return: list of (start,stop) ranges splitting range(n) in at most parts parts of equal size"""
+    size=max(1,-(-n//max(1,parts)))
+    return [(i,min(i+size,n)) for i in range(0,n,size)]
+
+class _SharedColumns(object):
+    """numeric columns copied once to shared memory, so that partitions
+    are sent to worker processes as block names instead of pickled arrays
+    """
+    def __init__(self,columns):
+        self.blocks=[]
+        self.columns=[]
+        for c in columns:
+            if shared_memory is None or c.dtype.kind not in 'biufM' or not len(c):
+                self.columns.append(c)
+                continue
+            shm=shared_memory.SharedMemory(create=True,size=c.nbytes)
+            numpy.ndarray(c.shape,dtype=c.dtype,buffer=shm.buf)[:]=c
+            self.blocks.append(shm)
+            self.columns.append((shm.name,c.dtype.str,len(c)))
+
+    def close(self):
+        """releases shared memory"""
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks=[]
+
+class _SharedPartition(object):
+    """range of rows of columns, some of which are in shared memory"""
+    def __init__(self,titles,columns,start,stop):
+        self.titles=titles
+        self.start,self.stop=start,stop
+        self.columns=[c if isinstance(c,tuple) else c[start:stop] for c in columns]
+
+    def arrays(self):
+        """:return: list of columns of the partition, copied from shared memory"""
+        res=[]
+        for c in self.columns:
+            if isinstance(c,tuple): #(shared memory name, dtype, length)
+                shm=shared_memory.SharedMemory(c[0])
+                a=numpy.ndarray((c[2],),dtype=c[1],buffer=shm.buf)
+                c=a[self.start:self.stop].copy()
+                del a #release the buffer before closing
+                shm.close()
+            res.append(c)
+        return res
+
+    def table(self):
+        """:return: :class:`ColumnTable` of the partition"""
+        res=ColumnTable.__new__(ColumnTable)
+        res.titles=list(self.titles)
+        res.footer=[]
+        res.columns=self.arrays()
+        return res
+
+def _run_partition(args):
+    """calls f on a partition in a worker process"""
+    f,part=args
+    return f(part.table() if isinstance(part,_SharedPartition) else part)
+
+def _maprows(f,table):
+    return [f(row) for row in table]
+
+def _applyf_values(args):
+    """applies f to a list or partition of values, as :meth:`Table.applyf`
+    :return: list of values, bool True if ok
+    """
+    f,values,skiperrors=args
+    if isinstance(values,_SharedPartition):
+        values=_tolist(values.arrays()[0])
+    res=True
+    for k,x in enumerate(values):
+        try:
+            values[k]=f(x)
+        except:
+            if not skiperrors:
+                logging.error('could not applyf to %s'%x)
+                raise(ValueError)
+            res=False
+    return values,res
+
+def _papplyf(parts,f,skiperrors,processes):
+    """applies f to partitions of a column in a pool of processes
+    :param parts: list of lists of values, or of :class:`_SharedPartition`
+    :return: list of values, bool True if ok
+    """
+    from .itertools2 import pmap
+    values,res=[],True
+    for v,ok in pmap(_applyf_values,[(f,p,skiperrors) for p in parts],processes=processes,chunksize=1):
+        values.extend(v)
+        res=res and ok
+    return values,res
+
+#functions merging footer totals of partitions
+_MERGES={len:operator.add, sum:operator.add, min:min, max:max}
+
+def _mergeable(f):
+    try:
+        return f in _MERGES
+    except TypeError: #unhashable
+        return False
+
+def _partial_totals(funcs,table):
+    """:return: list of (bool ok,value) of funcs applied to the columns of a partition"""
+    res=[]
+    for i,f in enumerate(funcs):
+        try:
+            if isinstance(table,ColumnTable):
+                res.append((True,_reduce(f,table.col(i))))
+            else:
+                res.append((True,f(table.col(i))))
+        except Exception:
+            res.append((False,None))
+    return res
+
+_MAGIC=b'GoulibCT' #binary ColumnTable file signature
+_ALIGN=64 #column blocks are aligned on this number of bytes
+
+def _aligned(n):
+    return -(-n//_ALIGN)*_ALIGN
+
+_JSONTYPES=(type(None),bool,float,six.text_type)+six.integer_types
+
+def _tojson(x):
+    """:return: JSON serializable form of cell x, with dates and times tagged in a dict"""
+    if isinstance(x,datetime):
+        return {'$datetime':[x.year,x.month,x.day,x.hour,x.minute,x.second,x.microsecond]}
+    if isinstance(x,date):
+        return {'$date':[x.year,x.month,x.day]}
+    if isinstance(x,timedelta):
+        return {'$timedelta':[x.days,x.seconds,x.microseconds]}
+    return x
+
+def _fromjson(d):
+    """object hook of :func:`json.loads` reverting :func:`_tojson`"""
+    for k,f in (('$datetime',datetime),('$date',date),('$timedelta',timedelta)):
+        if k in d:
+            return f(*d[k])
+    return d
+
+def _jsonable(x):
+    """:return: True if cell x is stored losslessly by :func:`_tojson`"""
+    if isinstance(x,datetime):
+        return x.tzinfo is None
+    return isinstance(x,_JSONTYPES+(date,timedelta))
+
+def _storable(column):
+    """
+    :return: array,encoding: column as an array of fixed size items if possible
+      with 'raw' encoding, or the column with 'json' encoding if its cells are
+      numbers, strings, dates or times, or with 'pickle' encoding
+    """
+    if column.dtype.kind!='O':
+        return column,'raw'
+    types=set(map(type,column))
+    if types=={six.text_type}:
+        return numpy.array(column.tolist(),dtype=six.text_type),'raw'
+    if types=={date}:
+        return numpy.array(column.tolist(),dtype='M8[D]'),'raw'
+    if types=={datetime} and all(d.tzinfo is None for d in column):
+        return numpy.array(column.tolist(),dtype='M8[us]'),'raw'
+    if all(_jsonable(x) for x in column):
+        return column,'json'
+    return column,'pickle'
+
+class ColumnTable(object):
+    """columnar counterpart of :class:`Table`, with the same interface
+
+    each column is stored as a numpy array, typed (bool, int64, float64, datetime64) when possible,
+    so column extraction, conversions and reductions are vectorized
+    and memory footprint is much smaller than with lists of rows.
+    Rows are built on the fly as lists of Python values.
+    """
+    def __init__(self,data=[],**kwargs):
+        """
+        :param data: :class:`Table` or ColumnTable, list of rows, dict of columns,
+          or string as filename, read through :class:`Table`
+        :param titles: optional list of strings used as column id
+        :param footer: optional list of functions used as column reducers
+        """
+        if numpy is None:
+            raise ImportError('ColumnTable requires numpy')
+        titles=kwargs.pop('titles',None)
+        self.footer=kwargs.pop('footer',[])
+        if isinstance(data,six.string_types): #read file by chunks
+            self.titles,self.columns=list(titles or []),[]
+            ext=data.split('.')[-1].lower()
+            if ext=='ctb':
+                self.read_bin(data,**kwargs)
+                if titles is not None:
+                    self.titles=list(titles)
+                return
+            if self.titles: #explicitely set
+                kwargs.setdefault('titles_line',0)
+                kwargs.setdefault('data_line',1)
+            if ext=='xls':
+                self.read_xls(data,**kwargs)
+            elif ext[:3]=='htm':
+                self.read_html(data,**kwargs)
+            else:
+                self.read_csv(data,**kwargs)
+            return
+        if isinstance(data,ColumnTable):
+            columns=[c.copy() for c in data.columns]
+        elif isinstance(data,dict):
+            if titles is None:
+                titles=list(data.keys())
+            columns=[_column(data[k]) for k in titles]
+        else:
+            rows=[row if isiterable(row) else [row] for row in data]
+            columns=[_column(c) for c in six.moves.zip_longest(*rows)]
+        if titles is None:
+            titles=getattr(data,'titles',[])
+        self.titles=list(titles)
+        self.columns=columns
+
+    def _new(self,columns,titles=None):
+        """:return: ColumnTable made of columns, with same titles by default"""
+        res=self.__class__.__new__(self.__class__)
+        res.titles=list(self.titles if titles is None else titles)
+        res.footer=list(self.footer)
+        res.columns=columns
+        return res
+
+    def __repr__(self):
+        """:return: repr string of titles+5 first lines"""
+        return 'ColumnTable(len=%d,titles=%s,data=%s)'%(len(self),self.titles,list(self[:5]))
+
+    __str__=six.get_unbound_function(Table.__str__)
+    pagesize=Table.pagesize
+    _repr_html_=six.get_unbound_function(Table._repr_html_)
+    html=six.get_unbound_function(Table.html)
+    ihtml=six.get_unbound_function(Table.ihtml)
+    page=six.get_unbound_function(Table.page)
+    write_html=six.get_unbound_function(Table.write_html)
+    find_col=six.get_unbound_function(Table.find_col)
+    _i=six.get_unbound_function(Table._i)
+    rowasdict=six.get_unbound_function(Table.rowasdict)
+    hierarchy=six.get_unbound_function(Table.hierarchy)
+    query=six.get_unbound_function(Table.query)
+    map_partitions=six.get_unbound_function(Table.map_partitions)
+    maprows=six.get_unbound_function(Table.maprows)
+    _ptotals=six.get_unbound_function(Table._ptotals)
+    convert=six.get_unbound_function(Table.convert)
+    _convert_dates=six.get_unbound_function(Table._convert_dates)
+    to_datetime=six.get_unbound_function(Table.to_datetime)
+    to_date=six.get_unbound_function(Table.to_date)
+    _read_chunks=six.get_unbound_function(Table._read_chunks)
+    drop_indexes=six.get_unbound_function(Table.drop_indexes)
+    _keys=six.get_unbound_function(Table._keys)
+    _cached_index=six.get_unbound_function(Table._cached_index)
+    hashindex=six.get_unbound_function(Table.hashindex)
+    lookup=six.get_unbound_function(Table.lookup)
+    between=six.get_unbound_function(Table.between)
+    join=six.get_unbound_function(Table.join)
+    
+    def sortindex(self,columns):
+        """See :meth:`Table.sortindex`. Numeric columns are sorted by numpy, and keys is an array"""
+        if isinstance(columns,(list,tuple)) or self.col(columns).dtype.kind not in 'biuf':
+            return six.get_unbound_function(Table.sortindex)(self,columns)
+        def build(column):
+            c=self.col(column)
+            rows=numpy.argsort(c,kind='mergesort')
+            if c.dtype.kind=='f': #remove NaNs, sorted at the end
+                rows=rows[~numpy.isnan(c[rows])]
+            return c[rows],rows
+        return self._cached_index('sort',columns,build)
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def __iter__(self):
+        """iterates rows as lists"""
+        for row in zip(*[_tolist(c) for c in self.columns]):
+            yield list(row)
+
+    def __getitem__(self,i):
+        """
+        :param i: int row number, or slice, indexes or bool array selecting rows
+        :return: list row, or ColumnTable of selected rows
+        """
+        if isinstance(i,six.integer_types+(numpy.integer,)):
+            return [self.get(i,j) for j in range(self.ncols())]
+        return self._new([c[i] for c in self.columns])
+
+    def __eq__(self,other):
+        """compare 2 tables contents, mainly for tests"""
+        if self.titles!=other.titles or len(self)!=len(other):
+            return False
+        return all(a==b for a,b in zip(self,other))
+
+    def __ne__(self,other):
+        return not self==other
+
+    @property
+    def nbytes(self):
+        """:return: int number of bytes used by columns arrays"""
+        return sum(c.nbytes for c in self.columns)
+
+    def to_table(self):
+        """:return: :class:`Table` copy with rows as lists"""
+        return Table(self,titles=list(self.titles),footer=list(self.footer))
+
+
+    def read_html(self,filename, **kwargs):
+        """read first table in HTML file. See :func:`iread_html` for parameters"""
+        kwargs.setdefault('titles',self.titles or None)
+        return self._read_chunks(iread_html(filename, columnar=True, **kwargs))
+
+    def read_xls(self, filename, **kwargs):
+        """appends an Excel table. See :func:`iread_xls` for parameters"""
+        return self._read_chunks(iread_xls(filename, columnar=True, **kwargs))
+
+    def read_csv(self, filename, **kwargs):
+        """appends a .csv or similar file to the table. See :func:`iread_csv` for parameters"""
+        return self._read_chunks(iread_csv(filename, columnar=True, **kwargs))
+
+    def write_bin(self,filename,compress=0):
+        """writes the table in a binary file that can be memory mapped by :meth:`read_bin`.
+
+        The file contains a signature, a JSON header with titles and column types,
+        then a contiguous block per column.
+        Numbers, booleans, strings, dates and datetimes are stored as raw arrays,
+        columns mixing these types as JSON, other columns are pickled.
+        Pickled columns can only be read with allow_pickle=True.
+        Footer is not saved.
+        :param filename: string, with .ctb extension to be recognized by constructors
+        :param compress: int zlib compression level from 0 (no compression) to 9
+        """
+        header={'titles':self.titles,'nrows':len(self),'columns':[]}
+        blocks=[]
+        offset=0
+        for c in self.columns:
+            c,encoding=_storable(c)
+            if encoding=='json':
+                data=json.dumps([_tojson(x) for x in c.tolist()]).encode('utf-8')
+            elif encoding=='pickle':
+                data=pickle.dumps(c.tolist(),protocol=2)
+            else:
+                data=numpy.ascontiguousarray(c).tostring() if six.PY2 else numpy.ascontiguousarray(c).tobytes()
+            if compress:
+                data=zlib.compress(data,compress)
+            header['columns'].append({'dtype':c.dtype.str,'encoding':encoding,
+                'compressed':bool(compress),'offset':offset,'nbytes':len(data)})
+            blocks.append(data)
+            offset=_aligned(offset+len(data))
+        header=json.dumps(header).encode('utf-8')
+        with open(filename,'wb') as f:
+            f.write(_MAGIC)
+            f.write(struct.pack('<Q',len(header)))
+            f.write(header)
+            start=_aligned(f.tell())
+            for data,h in zip(blocks,json.loads(header.decode('utf-8'))['columns']):
+                f.write(b'\0'*(start+h['offset']-f.tell())) #padding
+                f.write(data)
+                
+    def read_bin(self,filename,mmap=True,allow_pickle=False):
+        """reads a table written by :meth:`write_bin`, replacing the table content
+        :param filename: string
+        :param mmap: bool if True, uncompressed raw columns are memory mapped copy-on-write:
+          opening is immediate and data is read from disk only when columns are accessed.
+          Modifications are not written to the file.
+        :param allow_pickle: bool True to load pickled columns.
+          Unpickling can execute arbitrary code, so only set it for trusted files
+        :raise ValueError: if the file contains pickled columns and allow_pickle is False
+        """
+        with open(filename,'rb') as f:
+            if f.read(len(_MAGIC))!=_MAGIC:
+                raise IOError('%s is not a ColumnTable file'%filename)
+            n=struct.unpack('<Q',f.read(8))[0]
+            header=json.loads(f.read(n).decode('utf-8'))
+            start=_aligned(f.tell())
+            nrows=header['nrows']
+            if not allow_pickle and any(h['encoding']=='pickle' for h in header['columns']):
+                raise ValueError('%s contains pickled columns, use allow_pickle=True if it is trusted'%filename)
+            columns=[]
+            for h in header['columns']:
+                dtype=numpy.dtype(str(h['dtype']))
+                raw=h['encoding']=='raw' and not h['compressed']
+                if mmap and raw and nrows:
+                    c=numpy.memmap(filename,dtype=dtype,mode='c',offset=start+h['offset'],shape=(nrows,))
+                    columns.append(c.view(numpy.ndarray))
+                    continue
+                f.seek(start+h['offset'])
+                data=f.read(h['nbytes'])
+                if h['compressed']:
+                    data=zlib.decompress(data)
+                if h['encoding']=='json':
+                    c=numpy.empty(nrows,dtype=object)
+                    c[:]=json.loads(data.decode('utf-8'),object_hook=_fromjson)
+                elif h['encoding']=='pickle':
+                    c=numpy.empty(nrows,dtype=object)
+                    c[:]=pickle.loads(data)
+                else:
+                    c=numpy.frombuffer(data,dtype=dtype).copy()
+                columns.append(c)
+        self.drop_indexes()
+        self.titles=header['titles']
+        self.columns=columns
+        return self
+
+    def write_csv(self,filename,transpose=False,**kwargs):
+        """ write the table in Excel csv format, optionally transposed"""
+        if transpose:
+            rows=([title]+_tolist(c) for title,c in zip(self.titles or [None]*self.ncols(),self.columns))
+            write_csv_chunks(filename,[rows],**kwargs)
+        else:
+            write_csv_chunks(filename,[self],self.titles,**kwargs)
+
+    def ncols(self):
+        """return number of columns, ignoring title"""
+        return len(self.columns)
+
+    def col(self,column):
+        """:return: numpy array of column values. Not a copy"""
+        i=self._i(column)
+        if i is None or i>=self.ncols():
+            return _column([None]*len(self))
+        return self.columns[i]
+
+    def icol(self,column):
+        '''iterates column'''
+        return iter(_tolist(self.col(column)))
+
+    def index(self,value,column=0):
+        """
+        :return: int row number of first line where column contains value
+        """
+        c=self.col(column)
+        mask=numpy.asarray(c==value)
+        if mask.shape!=c.shape: #incomparable types
+            return None
+        found=numpy.flatnonzero(mask)
+        return int(found[0]) if len(found) else None
+
+    def get(self,row,col):
+        c=self.columns[self._i(col)]
+        v=c[row]
+        if c.dtype.kind!='O':
+            v=v.item()
+            if v!=v: v=None #NaN
+        return v
+
+    def _resize(self,nrows,ncols):
+        """grows the table with None values to at least nrows x ncols"""
+        self.drop_indexes()
+        n=len(self)
+        while self.ncols()<ncols:
+            self.columns.append(_column([None]*n))
+        if nrows>n:
+            pad=_column([None]*(nrows-n))
+            self.columns=[_concat(c,pad) for c in self.columns]
+
+    def set(self,row,col,value):
+        col=self._i(col)
+        self._resize(row+1,col+1) #drops indexes
+        c=self.columns[col]
+        if not _fits(c,value): #retype column
+            values=_tolist(c)
+            values[row]=value
+            self.columns[col]=_column(values)
+        else:
+            c[row]=numpy.nan if value is None and c.dtype.kind=='f' else value
+
+    def setcol(self,by,val,i=0):
+        '''set column'''
+        self.drop_indexes()
+        j=self._i(by)
+        val=list(val)
+        if i==0 and len(val)==len(self) and j<self.ncols():
+            self.columns[j]=_column(val)
+            return
+        for v in val:
+            self.set(i,j,v)
+            i+=1
+
+    def extend(self,lines):
+        ''' appends lines to table with a single concatenation per column
+        :param lines: ColumnTable, or iterable of lists, or dicts of column names:values
+        '''
+        self.drop_indexes()
+        if isinstance(lines,ColumnTable):
+            if len(lines)==0:
+                return
+            new=list(lines.columns)
+            n=len(lines)
+        else:
+            rows=self._rows(lines)
+            if not rows:
+                return
+            new=[_column(c) for c in six.moves.zip_longest(*rows)]
+            n=len(rows)
+        self._resize(0,len(new))
+        new.extend(_column([None]*n) for _ in range(len(new),self.ncols()))
+        self.columns=[_concat(a,b) for a,b in zip(self.columns,new)]
+
+    def _rows(self,lines):
+        """:return: list of lines as lists, adding titles of dict lines"""
+        rows=[]
+        for line in lines:
+            if isinstance(line,dict):
+                row=[None]*len(self.titles)
+                for k,v in line.items():
+                    i=self._i(k)
+                    if i is None: #column doesn't exist:
+                        i=len(self.titles)
+                        self.titles.append(k)
+                        row.append(None)
+                    row[i]=v
+                line=row
+            rows.append(line)
+        return rows
+
+    def append(self,line):
+        ''' appends a line to table. Use extend to append many lines
+        :param line: can be either:
+        * a list
+        * a dict or column names:values
+        '''
+        self.extend([line])
+
+    def addcol(self,title,val=None,i=0):
+        '''add column to the right'''
+        col=len(self.titles)
+        self.titles.append(title)
+        if not isinstance(val,list):
+            val=[val]*(len(self)-i)
+        n=max(len(self),i+len(val))
+        self._resize(n,col)
+        val=[None]*i+val
+        self.columns.insert(col,_column(val+[None]*(n-len(val))))
+
+    def sort(self,by,reverse=False):
+        '''stable sort by column'''
+        self.drop_indexes()
+        c=self.col(by)
+        if reverse: #stable descending order
+            order=len(c)-1-numpy.argsort(c[::-1],kind='mergesort')[::-1]
+        else:
+            order=numpy.argsort(c,kind='mergesort')
+        self.columns=[c[order] for c in self.columns]
+
+    def groupby(self,by,sort=True,removecol=True):
+        '''dictionary of subtables grouped by one or more columns.
+        See :meth:`Table.groupby`
+        '''
+        ikeys=[self._i(k) for k in by] if isinstance(by,(list,tuple)) else [self._i(by)]
+        codes,uniques=_factorize([self.columns[i] for i in ikeys])
+        order=numpy.argsort(codes,kind='mergesort')
+        groups=numpy.split(order,numpy.cumsum(numpy.bincount(codes,minlength=len(uniques)))[:-1])
+        titles,columns=self.titles,self.columns
+        if removecol:
+            titles=[x for j,x in enumerate(titles) if j not in ikeys]
+            columns=[c for j,c in enumerate(columns) if j not in ikeys]
+        res=collections.OrderedDict((k,self._new([c[g] for c in columns],titles)) for k,g in zip(uniques,groups))
+        return _sorted_dict(res) if sort else res
+
+    def aggregate(self,by,aggregates,sort=True,processes=None):
+        """aggregates groups of rows in a single pass, vectorized on numeric columns.
+        See :meth:`Table.aggregate`
+        :return: ColumnTable with key columns followed by aggregates columns, one row per group
+        """
+        titles,rows=_aggregate(self,by,aggregates,sort,processes)
+        return ColumnTable(rows,titles=titles)
+
+    def _converted(self,by,values,failed):
+        """stores converted values in a column, as datetime64 if possible
+        :return: bool array of failed
+        """
+        self.drop_indexes()
+        self.columns[self._i(by)]=_column(values)
+        return numpy.array(failed,dtype=bool)
+
+    def applyf(self,by,f,skiperrors=False,vectorized=False,processes=None):
+        """ apply a function to a column
+        :param by: column name of number
+        :param f: function of the form lambda cell:content
+        :param skiperrors: bool. if True, errors while running f are ignored
+        :param vectorized: bool. if True, f is called once with the column array
+        :param processes: optional int number of processes among which the column is partitioned.
+          f must then be picklable, and the column is unchanged if an error is raised
+        :return: bool True if ok, False if skiperrors==True and conversion failed
+        """
+        self.drop_indexes()
+        i=self._i(by)
+        if vectorized:
+            self.columns[i]=_column(f(self.columns[i]))
+            return True
+        if processes:
+            shared=_SharedColumns([self.columns[i]])
+            try:
+                parts=[_SharedPartition([],shared.columns,a,b) for a,b in _partitions(len(self),processes)]
+                values,res=_papplyf(parts,f,skiperrors,processes)
+            finally:
+                shared.close()
+            self.columns[i]=_column(values)
+            return res
+        res=True
+        values=_tolist(self.columns[i])
+        for k,x in enumerate(values):
+            try:
+                values[k]=f(x)
+            except:
+                if not skiperrors:
+                    logging.error('could not applyf to %s'%x)
+                    raise(ValueError)
+                res=False
+        self.columns[i]=_column(values)
+        return res
+
+    def total(self,funcs,processes=None):
+        """build a footer row by appling funcs to all columns.
+        sum, min and max are vectorized on numeric columns, and ignore None
+        :param processes: optional int number of processes computing
+          len, sum, min and max on partitions of rows, merged afterwards
+        """
+        funcs=funcs+[None]*(len(self.titles)-len(funcs))
+        totals=self._ptotals(funcs,processes) if processes else {}
+        self.footer=[]
+        for i,f in enumerate(funcs):
+            if i in totals:
+                self.footer.append(totals[i])
+                continue
+            try:
+                self.footer.append(_reduce(f,self.col(i)))
+            except:
+                self.footer.append(f)
+        return self.footer
+
+    def _parts(self,ranges):
+        """:return: list of partitions of rows in ranges, with numeric columns in shared memory,
+          function releasing shared memory
+        """
+        shared=_SharedColumns(self.columns)
+        return [_SharedPartition(self.titles,shared.columns,a,b) for a,b in ranges],shared.close
+
+    def remove_lines_where(self,f):
+        """
+        :param f: function of the form lambda line:bool returning True if line should be removed,
+          or bool array of lines to remove
+        :return: int number of lines removed
+        """
+        self.drop_indexes()
+        if callable(f):
+            f=[bool(f(line)) for line in self]
+        keep=~numpy.asarray(f,dtype=bool)
+        self.columns=[c[keep] for c in self.columns]
+        return len(keep)-int(keep.sum())
+
+def _stage(step):
+    """:return: function of a row returning the transformed row, or None to drop it"""
+    kind=step[0]
+    if kind=='select':
+        idx=step[1]
+        return lambda row:[row[i] if i<len(row) else None for i in idx]
+    if kind=='derive':
+        f,n=step[1],step[2]
+        def derive(row):
+            row=row[:n]+[None]*(n-len(row))
+            row.append(f(row))
+            return row
+        return derive
+    if kind=='where':
+        f=step[1]
+        return lambda row:row if f(row) else None
+    #match
+    tests=[(i,v if callable(v) else functools.partial(operator.eq,v)) for i,v in step[1]]
+    return lambda row:row if all(t(row[i] if i<len(row) else None) for i,t in tests) else None
+
+def _stream(rows,stages):
+    """applies fused stages to rows in a single pass"""
+    for row in rows:
+        for f in stages:
+            row=f(row)
+            if row is None:
+                break
+        else:
+            yield row
+
+def _both(f,g):
+    return lambda row:f(row) and g(row)
+
+def _rewrite(a,b):
+    """
+    :param a,b: consecutive steps of a query plan
+    :return: list of equivalent steps, cheaper to execute, or None
+    """
+    ka,kb=a[0],b[0]
+    if ka==kb=='match':
+        return [('match',a[1]+b[1])]
+    if ka==kb=='where':
+        return [('where',_both(a[1],b[1]))]
+    if ka==kb=='select' and all(i<len(a[1]) for i in b[1]):
+        return [('select',[a[1][i] for i in b[1]])]
+    if ka==kb=='limit':
+        return [('limit',max(0,min(a[1]-b[2],b[1])),a[2]+b[2])]
+    if kb=='match':
+        if ka=='select' and all(i<len(a[1]) for i,_ in b[1]):
+            return [('match',[(a[1][i],v) for i,v in b[1]]),a]
+        if ka=='derive' and all(i<a[2] for i,_ in b[1]):
+            return [b,a]
+    if kb in ('match','where') and ka=='sort':
+        return [b,a]
+    if ka=='derive' and kb=='select' and a[2] not in b[1]:
+        return [b] #derived column is not used
+    if kb=='limit':
+        if ka in ('select','derive'):
+            return [b,a]
+        if ka=='sort':
+            return [('top',a[1],a[2],b[1],b[2])]
+        if ka=='top':
+            return [('top',a[1],a[2],max(0,min(a[3]-b[2],b[1])),a[4]+b[2])]
+    return None
+
+class Query(object):
+    """lazy query over a :class:`Table` or :class:`ColumnTable`,
+    built by chaining :meth:`select`, :meth:`where`, :meth:`derive`,
+    :meth:`sort`, :meth:`limit` and :meth:`aggregate`.
+
+    Nothing is computed until the query is iterated or executed.
+    Then filters on column values are moved before projections, sorts and derived columns,
+    consecutive filters and projections are fused in a single pass over rows,
+    limits stop the scan early or keep the top rows of a sort in a heap,
+    and only the final result is materialized.
+    """
+    def __init__(self,table,titles=None,plan=[],ncols=None):
+        """
+        :param table: :class:`Table` or :class:`ColumnTable`
+        """
+        self.table=table
+        self.titles=list(table.titles if titles is None else titles)
+        self.plan=list(plan)
+        if ncols is None:
+            ncols=len(self.titles) or max([0]+[len(row) for row in table[:1]])
+        self.ncols=ncols
+
+    def __repr__(self):
+        return 'Query(titles=%s,plan=%s)'%(self.titles,self.explain())
+
+    def _then(self,step,titles=None,ncols=None):
+        """:return: new Query with step appended to the plan"""
+        if titles is None:
+            titles,ncols=self.titles,self.ncols
+        return Query(self.table,titles,self.plan+[step],ncols)
+
+    def _i(self,column):
+        '''column index'''
+        if isinstance(column,six.integer_types):
+            return column
+        return self.titles.index(column)
+
+    def _title(self,i):
+        return self.titles[i] if i<len(self.titles) else i
+
+    def select(self,*columns):
+        """keeps only some columns
+        :param columns: column names or numbers
+        """
+        idx=[self._i(c) for c in columns]
+        return self._then(('select',idx),[self._title(i) for i in idx],len(idx))
+
+    def where(self,f):
+        """keeps rows matching a condition
+        :param f: function of the form lambda row:bool,
+          or dict of column:value or column:predicate, all of which must match
+        """
+        if isinstance(f,dict):
+            return self._then(('match',[(self._i(k),v) for k,v in f.items()]))
+        return self._then(('where',f))
+
+    def derive(self,title,f):
+        """appends a computed column
+        :param title: string title of the new column
+        :param f: function of the form lambda row:value
+        """
+        titles=[self._title(i) for i in range(self.ncols)]+[title]
+        return self._then(('derive',f,self.ncols),titles,self.ncols+1)
+
+    def sort(self,by,reverse=False):
+        '''stable sort by column'''
+        return self._then(('sort',self._i(by),reverse))
+
+    def limit(self,n,offset=0):
+        """keeps at most n rows, after skipping offset rows"""
+        return self._then(('limit',n,offset))
+
+    def aggregate(self,by,aggregates,sort=True):
+        """aggregates groups of rows. See :meth:`Table.aggregate`"""
+        ikeys=[self._i(k) for k in by] if isinstance(by,(list,tuple)) else [self._i(by)]
+        titles=_aggregate_titles(self.titles,ikeys,aggregates)
+        aggregates=[(None if a[0] is None else self._i(a[0]),a[1],t)
+            for a,t in zip(aggregates,titles[len(ikeys):])]
+        return self._then(('aggregate',ikeys,aggregates,sort),titles,len(titles))
+
+    def explain(self):
+        """:return: list of the kinds of steps of the optimized plan"""
+        return [step[0] for step in self._optimized()]
+
+    def _optimized(self):
+        """:return: plan rewritten until no rule applies"""
+        plan=list(self.plan)
+        k=0
+        while k<len(plan)-1:
+            steps=_rewrite(plan[k],plan[k+1])
+            if steps is None:
+                k+=1
+            else:
+                plan[k:k+2]=steps
+                k=max(0,k-1)
+        return plan
+
+    def _scan(self,plan):
+        """
+        :return: iterator over rows of the table, and remaining plan.
+          a ColumnTable applies leading equality filters as vectorized masks
+          and builds rows only from the selected columns
+        """
+        t=self.table
+        if not isinstance(t,ColumnTable):
+            return iter(t),plan
+        while plan and plan[0][0]=='match':
+            mask=numpy.ones(len(t),dtype=bool)
+            for i,v in plan[0][1]:
+                m=None if v is None or callable(v) else numpy.asarray(t.col(i)==v)
+                if m is None or m.shape!=mask.shape: #not vectorizable
+                    break
+                mask&=m
+            else:
+                t=t[mask]
+                plan=plan[1:]
+                continue
+            break
+        if plan and plan[0][0]=='select':
+            columns=[t.icol(i) for i in plan[0][1]]
+            return (list(row) for row in zip(*columns)),plan[1:]
+        return iter(t),plan
+
+    def __iter__(self):
+        """iterates the result rows as lists"""
+        rows,plan=self._scan(self._optimized())
+        cls=ColumnTable if isinstance(self.table,ColumnTable) else Table
+        stages=[]
+        for step in plan:
+            kind=step[0]
+            if kind in ('select','derive','where','match'):
+                stages.append(_stage(step))
+                continue
+            rows,stages=_stream(rows,stages),[]
+            if kind=='limit':
+                rows=itertools.islice(rows,step[2],step[2]+step[1])
+            elif kind in ('sort','top'):
+                i=step[1]
+                key=lambda row:row[i] if i<len(row) else None
+                if kind=='sort':
+                    rows=iter(sorted(rows,key=key,reverse=step[2]))
+                else:
+                    top=heapq.nlargest if step[2] else heapq.nsmallest
+                    rows=iter(top(step[3]+step[4],rows,key=key)[step[4]:])
+            else: #aggregate
+                rows=iter(_aggregate(cls(list(rows)),*step[1:])[1])
+        for row in _stream(rows,stages):
+            yield list(row)
+
+    def execute(self):
+        """:return: table of the same class as the queried one, containing the result"""
+        cls=ColumnTable if isinstance(self.table,ColumnTable) else Table
+        return cls(list(self),titles=list(self.titles))
+
+def _csv_rows(filename,encoding='utf-8',errors='strict',**kwargs):
+    """iterates a .csv file as lists of strings"""
+    if six.PY2:
+        with codecs.open(filename, 'rb', errors=errors) as f:
+            for row in csv.reader(f, **kwargs):
+                yield [unicode(cell, encoding) for cell in row]
+    else:
+        with open(filename, 'rt', errors=errors, encoding=encoding) as f:
+            for row in csv.reader(f, **kwargs):
+                yield row
+
+def _readfloat(x):
+    """float, or int if integral, as :meth:`Cell.read`"""
+    x=float(x)
+    xi=int(x)
+    return xi if xi==x else x
+
+def _infer_type(values):
+    """
+    :param values: iterable of strings from a column sample
+    :return: function to convert the column: int, _readfloat, or Cell.read if the sample is not all numeric,
+      so that numbers in rows after the sample are still read as numbers
+    """
+    values=[x for x in values if x!='']
+    if not values:
+        return Cell.read
+    for f in (int,_readfloat):
+        try:
+            for x in values:
+                f(x)
+            return f
+        except (ValueError,OverflowError):
+            pass
+    return Cell.read
+
+def _convert(f,values):
+    """converts a column of strings at once with f, empty strings to None.
+    falls back to :meth:`Cell.read` on the whole column if f fails, once per distinct string
+    """
+    try:
+        return [None if x=='' else f(x) for x in values]
+    except (ValueError,TypeError,OverflowError):
+        return convert_column(values,Cell.read)[0]
+
+def _convert_array(f,values):
+    """converts a column of strings to a numpy array, parsed by numpy when possible"""
+    dtype={int:numpy.int64, _readfloat:numpy.float64}.get(f)
+    if dtype is not None and '' not in values:
+        try:
+            return numpy.array(values,dtype=dtype)
+        except (ValueError,OverflowError):
+            pass
+    return _column(_convert(f,values))
+
+def iread_csv(filename,chunksize=65536,columns=None,where=None,types=None,sample=1000,columnar=False,**kwargs):
+    """reads a .csv or similar file lazily, by chunks of rows
+
+    numeric column types are inferred once from the first rows, so these columns
+    are converted at once instead of cell by cell with :meth:`Cell.read`.
+    Results are the same as with :meth:`Cell.read`
+
+    :param filename: string
+    :param chunksize: int max number of rows in each chunk
+    :param columns: optional list of column titles or indexes to read (projection). All by default
+    :param where: optional filter of rows to read, either a function of the raw row
+      (list of strings) returning True if the row is kept,
+      or a dict of column:function of the converted value, evaluated before converting other columns
+    :param types: optional dict of column:function converting a string, overriding inferred types
+    :param sample: int number of rows used to infer column types
+    :param columnar: bool if True, chunks are :class:`ColumnTable` instead of :class:`Table`
+    :param titles: optional list of strings used as column id
+    :param titles_line: int 1-based line number of titles in file, 0 if none. default 1
+    :param data_line: int 1-based line number of first data row. default 2
+    :param encoding: string file encoding. default 'utf-8'
+    :param errors: string how encoding errors are handled. default 'strict'
+    other kwargs are passed to :func:`csv.reader`, with ';' as default delimiter
+    :return: iterator of tables sharing the same titles
+    """
+    titles_line=kwargs.pop('titles_line',1)-1
+    data_line=kwargs.pop('data_line',2)-1
+    titles=kwargs.pop('titles',None)
+    kwargs.setdefault('dialect',csv.excel)
+    kwargs.setdefault('delimiter',';')
+    encoding=kwargs.pop('encoding','utf-8') #must be iso-8859-15 in some cases
+    errors=kwargs.pop('errors','strict')
+    where=where or {}
+
+    head=[] #titles read in file
+    def _rows():
+        for i,row in enumerate(_csv_rows(filename,encoding,errors,**kwargs)):
+            if i==titles_line: #titles can have no left/right spaces
+                head.extend(Cell.read(x) for x in row)
+            elif i>=data_line and row and row!=['']: #strange last line sometimes ...
+                if not callable(where) or where(row):
+                    yield row
+    rows=_rows()
+
+    def _index(column):
+        return column if isinstance(column,int) else titles.index(column)
+
+    converters=[] #one per column, inferred from the first chunk
+    ok=False #at least one chunk yielded
+    while True:
+        chunk=list(itertools.islice(rows,chunksize))
+        if titles is None and (chunk or head):
+            titles=head
+        if not chunk:
+            break
+        cols=list(six.moves.zip_longest(*chunk,fillvalue=''))
+        if not converters:
+            for j,c in enumerate(cols):
+                converters.append(_infer_type(c[:sample]))
+            for k,f in (types or {}).items():
+                converters[_index(k)]=f
+        converters.extend(Cell.read for _ in range(len(converters),len(cols)))
+        select=list(range(len(cols))) if columns is None else [_index(c) for c in columns]
+        convert=_convert_array if columnar else _convert
+        converted={}
+        if isinstance(where,dict) and where: #predicate push down
+            keep=None
+            for k,f in where.items():
+                j=_index(k)
+                converted[j]=convert(converters[j],cols[j] if j<len(cols) else ('',)*len(chunk))
+                mask=[bool(f(v)) for v in converted[j]]
+                keep=mask if keep is None else [a and b for a,b in zip(keep,mask)]
+            keep=[i for i,b in enumerate(keep) if b]
+            if not keep:
+                continue
+            cols=[[c[i] for i in keep] for c in cols]
+            for j in converted:
+                converted[j]=[converted[j][i] for i in keep]
+            if columnar:
+                converted=dict((j,_column(v)) for j,v in converted.items())
+            n=len(keep)
+        else:
+            n=len(chunk)
+        data=[]
+        for j in select:
+            if j not in converted:
+                converted[j]=convert(converters[j],cols[j]) if j<len(cols) else convert(Cell.read,['']*n)
+            data.append(converted[j])
+        ptitles=titles if columns is None else [titles[j] if j<len(titles) else None for j in select]
+        if columnar:
+            res=ColumnTable(titles=ptitles)
+            res.columns=[_column(c) for c in data]
+        else:
+            res=Table(zip(*data),titles=list(ptitles))
+        ok=True
+        yield res
+    if not ok: #empty file, but maybe with titles
+        titles=titles or []
+        ptitles=titles if columns is None else [titles[_index(j)] for j in columns]
+        yield ColumnTable(titles=ptitles) if columnar else Table(titles=list(ptitles))
+
+def write_csv_chunks(filename,chunks,titles=None,**kwargs):
+    """ writes tables or iterables of rows in Excel csv format, through a buffered file
+
+    :param filename: string
+    :param chunks: iterable of :class:`Table`, :class:`ColumnTable` or iterables of rows
+    :param titles: optional list of strings written on first line
+    :param encoding: string file encoding. default 'utf-8'
+    :param buffering: int size of file buffer. default 1MB
+    other kwargs are passed to :func:`csv.writer`, with ';' as default delimiter
+    """
+    dialect=kwargs.pop('dialect','excel')
+    delimiter=kwargs.pop('delimiter',';')
+    encoding=kwargs.pop('encoding','utf-8') #was iso-8859-15 earlier
+    buffering=kwargs.pop('buffering',1<<20)
+
+    if six.PY3 :
+        f = open(filename, 'w', newline='', encoding=encoding, buffering=buffering)
+        def _encode(rows):
+            return rows
+    else: #Python 2
+        f = open(filename, 'wb', buffering)
+        empty=''.encode(encoding)
+        def _encode(rows):
+            for line in rows:
+                yield [empty if s is None else unicode(s).encode(encoding) for s in line]
+
+    with f:
+        writer=csv.writer(f, dialect=dialect, delimiter=delimiter, **kwargs)
+        if titles:
+            writer.writerows(_encode([titles]))
+        for chunk in chunks:
+            writer.writerows(_encode(chunk))
+
+def _chunk(rows,titles,columnar):
+    """:return: Table or ColumnTable of rows"""
+    titles=list(titles or [])
+    return ColumnTable(rows,titles=titles) if columnar else Table(rows,titles=titles)
+
+def _iterparse(filename):
+    """iterates start and end events of a HTML file, parsed incrementally"""
+    try: #lxml
+        return ElementTree.iterparse(filename,events=('start','end'),html=True)
+    except TypeError: #ElementTree : (X)HTML must be well formed
+        pass
+    parser=ElementTree.XMLParser()
+    parser.entity['nbsp']=six.unichr(160)
+    return ElementTree.iterparse(filename,events=('start','end'),parser=parser)
+
+def iread_html(filename,chunksize=65536,columnar=False,titles=None,**kwargs):
+    """reads the first table of a HTML file incrementally, by chunks of rows.
+    Rows are parsed with :func:`iterparse` and cleared once read, so memory use doesn't depend on file size.
+    :param filename: string or file object
+    :param chunksize: int max number of rows in each chunk
+    :param columnar: bool if True, chunks are :class:`ColumnTable` instead of :class:`Table`
+    :param titles: optional list of strings used as column id. 
+      If None, titles are read from thead, or from the first row
+    :return: iterator of tables sharing the same titles
+    """
+    def read(tr):
+        res=[]
+        for td in tr:
+            x=Cell.read(td.text)
+            res.append(x.strip() if isinstance(x,str) else x) #as in Cell.__init__
+        return res
+
+    depth=0 #of nested tables
+    head=False #in thead
+    foot=False #in tfoot, ignored as in :meth:`Table.read_element`
+    found=False #a table was found
+    rows=[]
+    n=0 #number of chunks
+    stack=[] #opened elements
+    for event,element in _iterparse(filename):
+        name=element.tag.rsplit('}',1)[-1].lower() if isinstance(element.tag,six.string_types) else None
+        if event=='start':
+            stack.append(element)
+            if name=='table':
+                depth+=1
+                found=True
+            elif name=='thead' and depth==1:
+                head=True
+            elif name=='tfoot' and depth==1:
+                foot=True
+            continue
+        stack.pop()
+        if name=='tr' and depth==1:
+            line=read(element)
+            element.clear()
+            if stack: #free memory
+                stack[-1].remove(element)
+            if not line or foot: continue #skip empty lines and footer
+            if head or titles is None:
+                titles=line
+            else:
+                rows.append(line)
+                if len(rows)>=chunksize:
+                    yield _chunk(rows,titles,columnar)
+                    rows,n=[],n+1
+        elif name=='thead':
+            head=False
+        elif name=='tfoot' and depth==1:
+            foot=False
+        elif name=='table':
+            depth-=1
+            if depth==0:
+                break
+    if not found:
+        raise LookupError('no table found in file')
+    if rows or not n:
+        yield _chunk(rows,titles,columnar)
+
+def iread_xls(filename,chunksize=65536,columnar=False,**kwargs):
+    """reads all sheets of an Excel file by chunks of rows. 
+    Sheets are loaded on demand and rows are read as slices.
+    :param filename: string
+    :param chunksize: int max number of rows in each chunk
+    :param columnar: bool if True, chunks are :class:`ColumnTable` instead of :class:`Table`
+    :param titles_line: int 1-based line number of titles in each sheet, 0 if none. default 1
+    :param data_line: int 1-based line number of first data row. default 2
+    :return: iterator of tables, with titles of the sheet they come from
+    """
+    titles_line=kwargs.pop('titles_line',1)-1
+    data_line=kwargs.pop('data_line',2)-1
+    
+    from xlrd import open_workbook
+    wb = open_workbook(filename,on_demand=True)
+    try:
+        for name in wb.sheet_names():
+            s=wb.sheet_by_name(name)
+            titles=None
+            rows=[]
+            n=0 #number of chunks
+            for i in range(s.nrows):
+                line=[Cell.read(x) for x in s.row_values(i)]
+                if i==titles_line:
+                    titles=line
+                elif i>=data_line:
+                    rows.append(line)
+                    if len(rows)>=chunksize:
+                        yield _chunk(rows,titles,columnar)
+                        rows,n=[],n+1
+            if rows or (titles and not n):
+                yield _chunk(rows,titles,columnar)
+            wb.unload_sheet(name)
+    finally:
+        wb.release_resources()
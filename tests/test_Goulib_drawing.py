@@ -20,6 +20,9 @@ class TestTrans:
         s32=sqrt(3)/2
         res=Matrix3(0.5,+s32,0, -s32,0.5,0, 0,0,1) #warning : .new takes columnwise elements
         assert_almost_equal(Trans(rotation=60),res)
+        t=Trans(scale=2)
+        assert_equal(Trans(scale=2),t) # cached ...
+        assert_false(Trans(scale=2) is t) # ... but copied
 
 class TestBBox:
     @classmethod
@@ -258,6 +261,47 @@ class TestGroup:
         Drawing([self.group,g2]).save(path+'/results/drawing.Group.distance.png')
         assert_equal(self.group.distance(g2),2.026833782163534)
 
+    def test__apply_transform(self):
+        t=Trans(scale=2, offset=(10,1), rotation=30)
+        a=Arc2((0,0),(0,1),(1,0))
+        entities=[Segment2((-2,.5),Vector2(4,0)), Circle(Point2(4,4),1), a, Point2(1,2),
+            Chain([Segment2((0,0),(1,1)),Segment2((1,1),(2,0))]), Group([Arc2((1,1),(1,2),(2,1),dir=-1)])]
+        g=Group(entities)
+        res=t*g # batch transform
+        for e,r in zip(entities[:2]+entities[3:5],res[:2]+res[3:5]):
+            assert_almost_equal(r.distance(t*e),0)
+        for r,e in [(res[2],t*a),(res[5][0],t*entities[5][0])]:
+            assert_almost_equal(r.c,e.c)
+            assert_almost_equal(r.p,e.p)
+            assert_almost_equal(r.p2,e.p2)
+            assert_almost_equal(r.angle(),e.angle())
+        assert_almost_equal(res[2].r,2)
+
+    def test_intersect(self):
+        a=Arc2((0,0),(0,1),(1,0))
+        l1=Segment2((-2,.5),Vector2(4,0)) #horizontal at y=0.5
+        l2=Segment2((-2,-.5),Vector2(4,0)) #horizontal at y=-0.5
+        lines=Group([l1,l2])
+        res=list(lines.intersect(a))
+        assert_equal([e for _,e in res],[l1,l2,l2])
+        assert_almost_equal(res[0][0],Point2(-sqrt(3)/2,.5))
+        g=Group([Group([l1]),l2])
+        res=list(g.intersect(a))
+        assert_equal(len(res),3)
+        assert_true(res[0][1].group is g[0])
+        assert_equal(list(lines.intersect(Point2(0,.5))),[(Point2(0,.5),l1)])
+        others=Group([a,Circle((0,0),2)])
+        assert_equal(len(list(lines.intersect(others))),3+4)
+        p,e=next(lines.intersect(others))
+        assert_true(e is a)
+        assert_true(e.group is l1)
+
+    def test_nearest(self):
+        index=SpatialIndex(self.group)
+        p=Point2(4,2.5)
+        d,e=index.nearest(p)[0]
+        assert_equal(d,min(e.distance(p) for e in self.group))
+
     def test_append(self):
         # group = Group()
         # assert_equal(expected, group.append(entity, **kwargs))
@@ -372,6 +416,24 @@ class TestChain:
         # assert_equal(expected, chain.contiguous(edge, tol, allow_swap))
         raise SkipTest 
 
+    def test_to_polyline(self):
+        p=self.chain.to_polyline()
+        assert_equal(p,Polyline([(0,0),(1,1),(2,0)]))
+        p=Rect((0,0),(2,1)).to_polyline()
+        assert_true(isinstance(p,Polygon))
+        assert_equal(p.area,2)
+        arc=Chain([Segment2((0,0),(1,0)),Arc2((1,1),(1,0),(1,2)),Segment2((1,2),(0,2)),Segment2((0,2),(0,0))])
+        p=arc.to_polyline(1E-3)
+        assert_true(isinstance(p,Polygon))
+        assert_true(abs(p.area-(2+pi/2))<2E-3*pi)
+
+    def test_from_polyline(self):
+        chain=Chain.from_polyline(Polyline([(0,0),(1,1),(2,0)]))
+        assert_equal([(e.start,e.end) for e in chain],[(e.start,e.end) for e in self.chain])
+        chain=Chain.from_polyline(Polygon([(0,0),(2,0),(2,1),(0,1)]))
+        assert_equal(len(chain),4)
+        assert_true(chain.isclosed())
+
 class TestDrawing:
     @classmethod
     def setup_class(self):
@@ -8,6 +8,7 @@ from Goulib.tests import *
 from Goulib.geom import *
 
 from math import *
+import random
 
 
 class TestGeometry:
@@ -290,6 +291,20 @@ class TestMatrix3:
         # assert_equal(expected, matrix3.__mul__(other))
         raise SkipTest
 
+    def test_apply(self):
+        t=Matrix3.new_rotate(0.5).translate(1,2).scale(3)
+        pts=[Point2(1,0),Point2(3,4),Point2(-1,2)]
+        res=t.apply([p.xy for p in pts])
+        for r,p in zip(res,pts):
+            assert_almost_equal(Point2(*r),t*p)
+        res=t.apply([p.xy for p in pts],vectors=True)
+        for r,p in zip(res,pts):
+            assert_almost_equal(Vector2(*r),t*Vector2(p))
+        a=t*Point2Array(pts)
+        assert_true(isinstance(a,Point2Array))
+        for r,p in zip(a,pts):
+            assert_almost_equal(r,t*p)
+
     def test___setitem__(self):
         # matrix3 = Matrix3()
         # assert_equal(expected, matrix3.__setitem__(key, value))
@@ -657,9 +672,10 @@ class TestArc2:
         raise SkipTest 
 
     def test_intersect(self):
-        # arc2 = Arc2(center, p1, p2, r, dir)
-        # assert_equal(expected, arc2.intersect(other))
-        raise SkipTest 
+        s=Segment2((0.5,0),(0.5,2)) # single intersection with the supporting circle
+        assert_equal(self.a1.intersect(s),Point2(0.5,sqrt(3)/2))
+        assert_equal(s.intersect(self.a1),Point2(0.5,sqrt(3)/2))
+        assert_equal(self.a1.intersect(Segment2((0,-2),(0,-1))),None)
 
 
 
@@ -729,6 +745,293 @@ class TestEllipse:
         # assert_equal(expected, ellipse.__repr__())
         raise SkipTest 
 
+class TestIntersections:
+    @classmethod
+    def setup_class(self):
+        self.entities=[
+            Segment2((0,0),(2,2)),
+            Segment2((0,2),(2,0)),
+            Circle((1,1),1),
+            Arc2((0,0),(1,0),(0,1)), # quarter of circle
+            Segment2((3,3),(4,4)), # far from others
+            Line2((0,0.5),Vector2(1,0)),
+            Ray2((0.5,3),Vector2(0,-1)),
+        ]
+
+    def test_intersections(self):
+        res=intersections(self.entities)
+        # compare with scalar intersections
+        for i,a in enumerate(self.entities):
+            for j,b in enumerate(self.entities[i+1:],i+1):
+                inter=a.intersect(b)
+                if isinstance(inter,Point2):
+                    inter=[inter]
+                found=[p for p,k,l in res if (k,l)==(i,j)]
+                assert_equal(len(found),len(inter or []))
+                for p in inter or []: # order may differ
+                    assert_true(min(p.distance(q) for q in found)<1e-9)
+        assert_false(any(4 in (i,j) for _,i,j in res))
+        assert_equal(res,sorted(res,key=lambda r:r[1:]))
+
+    def test_others(self):
+        res=intersections(self.entities[:2],self.entities[2:])
+        assert_equal(len(res),2+1+1+1+2+1+1) # circle, arc, line and ray
+        assert_equal(res[0][1:],(0,0))
+        assert_equal(intersections([],self.entities),[])
+
+    def test_arcs(self):
+        a=Arc2((0,0),(0,1),(1,0)) # 3/4 of unit circle
+        c=Circle((1,0),1)
+        res=intersections([a],[c])
+        assert_equal(len(res),1)
+        assert_almost_equal(res[0][0],Point2(0.5,-sqrt(3)/2))
+
+    def test_chain(self):
+        # contiguous segments must meet at their shared vertex despite rounding
+        random.seed(1)
+        for _ in range(10):
+            pts=[Point2(random.uniform(-100,100),random.uniform(-100,100)) for _ in range(21)]
+            segs=[Segment2(p1,p2) for p1,p2 in zip(pts,pts[1:])]
+            res=intersections(segs)
+            found=set((i,j) for _,i,j in res if j==i+1)
+            assert_equal(len(found),len(segs)-1)
+
+class TestSpatialIndex:
+    @classmethod
+    def setup_class(self):
+        self.entities=[]
+        for i in range(10):
+            for j in range(10):
+                self.entities.append(Point2(i,j))
+                self.entities.append(Segment2((i+.5,j),(i+.5,j+.5)))
+        self.entities.append(Circle((20,20),5))
+        self.entities.append(Line2((0,-5),Vector2(1,0)))
+        self.index=SpatialIndex(self.entities)
+
+    def brute(self, q, entities=None):
+        return sorted(e.distance(q) for e in entities or self.entities)
+
+    def test___init__(self):
+        assert_equal(len(self.index),len(self.entities))
+        assert_true(self.entities[0] in self.index)
+        assert_false(Point2(0,0) in self.index) # identity, not equality
+        assert_true(len(self.index._nodes)>0)
+
+    def test_nearest(self):
+        for q in [Point2(3.2,4.1),Point2(-1,-1),Point2(12,18),Segment2((2.1,2.1),(2.2,2.9))]:
+            res=self.index.nearest(q,5)
+            assert_equal(len(res),5)
+            for (d,e),b in zip(res,self.brute(q)):
+                assert_almost_equal(d,b)
+                assert_almost_equal(e.distance(q),d)
+        d,e=self.index.nearest(Point2(4.6,6.2))[0]
+        assert_true(e is self.entities[2*(4*10+6)+1])
+        assert_true(self.index.nearest(Point2(25,25))[0][1] is self.entities[-2])
+
+    def test_arcs(self):
+        random.seed(2)
+        arcs=[Arc2((random.uniform(0,20),random.uniform(0,20)),random.uniform(0,6),random.uniform(0,6),r=random.uniform(.5,3))
+            for _ in range(30)]
+        entities=self.entities+arcs
+        index=SpatialIndex(entities)
+        for _ in range(50):
+            q=Point2(random.uniform(-5,25),random.uniform(-5,25))
+            res=[d for d,_ in index.nearest(q,5)]
+            assert_equal(res,sorted(res))
+            for d,b in zip(res,self.brute(q,entities)):
+                assert_almost_equal(d,b)
+            res=[d for d,_ in index.within(q,2)]
+            assert_equal(len(res),len([d for d in self.brute(q,entities) if d<=2]))
+
+    def test_within(self):
+        q=Point2(3.3,4.4)
+        res=self.index.within(q,1.2)
+        assert_equal([d for d,_ in res],[d for d in self.brute(q) if d<=1.2])
+        assert_true(self.index.within(Point2(0,-4),1.5)[0][1] is self.entities[-1])
+
+    def test_box(self):
+        res=self.index.box(2.9,2.9,4.1,4.1)
+        assert_equal(len(res),4+2) # points and segments
+        assert_equal(self.index.box(20,20,21,21),[self.entities[-2]])
+        assert_equal(len(self.index.box(0,-6,1,-5)),1) # infinite line
+
+    def test_insert(self):
+        index=SpatialIndex(self.entities[:10])
+        index.extend(self.entities[10:])
+        p=Point2(50,50)
+        index.insert(p)
+        assert_true(index.nearest(Point2(48,49))[0][1] is p)
+        p.x=-50
+        index.update(p)
+        assert_true(index.nearest(Point2(-48,49))[0][1] is p)
+        for e in self.entities[:150]:
+            index.remove(e)
+        assert_equal(len(index),len(self.entities)-150+1)
+        q=Point2(3.2,4.1)
+        live=self.entities[150:]+[p]
+        assert_equal([d for d,_ in index.nearest(q,3)],self.brute(q,live)[:3])
+        index.rebuild()
+        assert_equal([d for d,_ in index.nearest(q,3)],self.brute(q,live)[:3])
+
+class TestPolyline:
+    @classmethod
+    def setup_class(self):
+        self.p=Polyline([(0,0),(1,0),(1,1),(1.1,2),(1,3)])
+
+    def test___init__(self):
+        assert_equal(len(self.p),5)
+        assert_equal(self.p[2],Point2(1,1))
+        assert_equal(Polyline(self.p),self.p)
+        assert_false(Polygon(self.p)==self.p)
+
+    def test_length(self):
+        assert_almost_equal(self.p.length,sum(s.length for s in self.p.segments()))
+
+    def test_distance(self):
+        assert_equal(self.p.distance(Point2(2,0.5)),1)
+        assert_equal(self.p.distance(Point2(-1,0)),1)
+        assert_almost_equal(self.p.distance(Circle((3,0),1)),1)
+
+    def test_intersect(self):
+        assert_equal(self.p.intersect(Line2((0,0.5),Vector2(1,0))),[Point2(1,0.5)])
+        assert_equal(self.p.intersect(Segment2((3,0),(4,0))),None)
+
+    def test_simplify(self):
+        assert_equal(self.p.simplify(0.2),Polyline([(0,0),(1,0),(1,3)]))
+        assert_equal(self.p.simplify(0.01),self.p)
+
+    def test_offset(self):
+        p=Polyline([(0,0),(1,0),(1,1)]).offset(0.5) # on the left
+        assert_equal(p,Polyline([(0,0.5),(0.5,0.5),(0.5,1)]))
+
+    def test__apply_transform(self):
+        p=Matrix3.new_translate(1,2)*self.p
+        assert_equal(p[0],Point2(1,2))
+        assert_equal(self.p[0],Point2(0,0))
+
+class TestPolygon:
+    @classmethod
+    def setup_class(self):
+        self.square=Polygon([(0,0),(2,0),(2,2),(0,2)])
+        self.square2=Polygon([(1,1),(3,1),(3,3),(1,3)])
+
+    def test_area(self):
+        assert_equal(self.square.area,4)
+        assert_equal(self.square.signed_area,4)
+        assert_equal(Polygon(self.square).reverse().signed_area,-4)
+        assert_equal(self.square.orientation(),1)
+        assert_equal(self.square.length,8)
+
+    def test_centroid(self):
+        assert_equal(self.square.centroid,Point2(1,1))
+        l=Polygon([(0,0),(2,0),(2,1),(1,1),(1,2),(0,2)])
+        assert_almost_equal(l.centroid,Point2(5/6.,5/6.))
+
+    def test_contains(self):
+        pts=Point2Array([(1,1),(3,1),(0.5,1.9),(-1,-1)])
+        assert_equal(self.square.contains(pts).tolist(),[True,False,True,False])
+        assert_equal(Polygon(self.square).reverse().winding(pts).tolist(),[-1,0,-1,0])
+        assert_true(Point2(2,1) in self.square) # on edge
+        assert_false(Point2(2.1,1) in self.square)
+
+    def test_simplify(self):
+        p=Polygon([(0,0),(1,0.01),(2,0),(2,2),(0,2)])
+        assert_equal(p.simplify(0.1),self.square)
+
+    def test_offset(self):
+        assert_equal(self.square.offset(1),[Polygon([(-1,-1),(3,-1),(3,3),(-1,3)])])
+        assert_equal(self.square.offset(-0.5)[0].area,1)
+        assert_equal(self.square.offset(-1.5),[])
+        l=Polygon([(0,0),(4,0),(4,1),(1,1),(1,4),(0,4)])
+        assert_equal(l.offset(0.5)[0].area,16)
+        u=Polygon([(0,0),(5,0),(5,3),(4,3),(4,1),(1,1),(1,3),(0,3)])
+        assert_equal(len(u.offset(-0.4)),1)
+
+    def test_union(self):
+        res=self.square.union(self.square2)
+        assert_equal(len(res),1)
+        assert_equal(res[0].area,7)
+        assert_equal(len(res[0]),8)
+        # adjacent squares merge in a single rectangle
+        grid=[Polygon([(i,j),(i+1,j),(i+1,j+1),(i,j+1)]) for i in range(10) for j in range(10)]
+        res=grid[0].union(grid[1:])
+        assert_equal(res,[Polygon([(0,0),(10,0),(10,10),(0,10)])])
+
+    def test_intersection(self):
+        res=self.square.intersection(self.square2)
+        assert_equal(res,[Polygon([(2,1),(2,2),(1,2),(1,1)])])
+        assert_equal(self.square.intersection(Polygon([(5,5),(6,5),(6,6)])),[])
+
+    def test_difference(self):
+        res=self.square.difference(self.square2)
+        assert_equal(len(res),1)
+        assert_equal(res[0].area,3)
+        hole=Polygon([(0.5,0.5),(1,0.5),(1,1),(0.5,1)])
+        res=self.square.difference(hole)
+        assert_equal(sorted(p.signed_area for p in res),[-0.25,4])
+        pts=[(0.75,0.75),(1.5,1.5),(3,3)]
+        inside=sum(p.winding(pts) for p in res)
+        assert_equal(inside.tolist(),[0,1,0])
+
+class TestVector2Array:
+
+    @classmethod
+    def setup_class(self):
+        self.a=Vector2Array([Vector2(1,0),(3,4),Vector2(0,0)])
+
+    def test___init__(self):
+        assert_equal(Vector2Array([1,3,0],[0,4,0]),self.a)
+        assert_equal(Vector2Array(self.a.xy),self.a)
+        assert_equal(len(Vector2Array()),0)
+
+    def test___slots__(self):
+        assert_false(hasattr(Vector2(1,2),'__dict__'))
+
+    def test___getitem__(self):
+        assert_equal(self.a[1],Vector2(3,4))
+        assert_true(type(self.a[1]) is Vector2)
+        a=self.a.copy()
+        b=a[1:]
+        b*=2 # views share coordinates
+        assert_equal(a[1],Vector2(6,8))
+        assert_equal(list(Point2Array(a)),[Point2(1,0),Point2(6,8),Point2(0,0)])
+
+    def test___add__(self):
+        assert_equal(self.a+Vector2(1,1),Vector2Array([(2,1),(4,5),(1,1)]))
+        assert_true(isinstance(self.a+Point2(1,1),Point2Array))
+        p=Point2Array(self.a)
+        assert_true(type(p-p) is Vector2Array)
+        assert_equal(Vector2(1,1)+self.a,self.a+Vector2(1,1))
+        assert_equal((Vector2(1,1)-self.a)[1],Vector2(1,1)-self.a[1])
+
+    def test_mag(self):
+        assert_equal(abs(self.a).tolist(),[1,5,0])
+        assert_equal(self.a.normalized()[1],self.a[1].normalized())
+        assert_equal(self.a.normalized()[2],Vector2(0,0))
+
+    def test_dot(self):
+        assert_equal(self.a.dot(Vector2(1,1)).tolist(),[1,7,0])
+        assert_equal(self.a.dot(self.a).tolist(),[1,25,0])
+
+    def test_angle(self):
+        v=Vector2(0,1)
+        for a,b in zip(self.a.angle(v)[:2],[self.a[0].angle(v),self.a[1].angle(v)]):
+            assert_almost_equal(a,b)
+        assert_almost_equal(self.a.angle()[1],self.a[1].angle())
+
+    def test_project(self):
+        v=Vector2(1,2)
+        assert_equal(self.a.project(v)[1],self.a[1].project(v))
+
+    def test_distance(self):
+        p=Point2Array(self.a)
+        assert_equal(p.distance(Point2(0,0)).tolist(),[1,5,0])
+
+    def test__apply_transform(self):
+        t=Matrix3.new_translate(1,2)
+        assert_equal(t*self.a,self.a) # vectors are not translated
+        assert_equal(t*Point2Array(self.a),Point2Array(self.a+Vector2(1,2)))
+
 if __name__ == "__main__":
     runmodule()
 
@@ -319,6 +319,14 @@ class TestMatrix4:
         # assert_equal(expected, matrix4.transform(other))
         raise SkipTest
 
+    def test_apply(self):
+        m=Matrix4.new_rotate_axis(0.5,Vector3(1,1,0)).translate(1,2,3)
+        pts=[(1,0,0),(3,4,5),(-1,2,-3)]
+        for r,p in zip(m.apply(pts),pts):
+            assert_almost_equal(Point3(*r),m*Point3(*p))
+        for r,p in zip(m.apply(pts,vectors=True),pts):
+            assert_almost_equal(Vector3(*r),m*Vector3(*p))
+
     def test_translate(self):
         # matrix4 = Matrix4()
         # assert_equal(expected, matrix4.translate(x, y, z))
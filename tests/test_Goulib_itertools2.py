@@ -6,6 +6,7 @@ from nose import SkipTest
 from Goulib.tests import *
 
 from Goulib.itertools2 import *
+import random
 
 class TestTake:
     def test_take(self):
@@ -56,6 +57,17 @@ class TestLinspace:
         assert_equal(linspace(1,1,7),[1,1,1,1,1,1,1])
         assert_equal(linspace((1,0),(0,1),3),[(1,0),(.5,.5),(0,1)])
 
+class TestArangeArray:
+    def test_arange_array(self):
+        assert_equal(arange_array(-1,2.5,.5),[-1,-0.5,0,0.5,1,1.5,2])
+        assert_equal(arange_array(2,-1.5,.5),reversed([-1,-0.5,0,0.5,1,1.5,2]))
+        assert_equal(len(arange_array(1,step=.01)),100)
+
+class TestLinspaceArray:
+    def test_linspace_array(self):
+        assert_equal(linspace_array(-1,2,7),[-1,-0.5,0,0.5,1,1.5,2])
+        assert_equal(linspace_array((1,0),(0,1),3),[(1,0),(.5,.5),(0,1)])
+
 class TestFlatten:
     def test_flatten(self):
         f=list(flatten([[1,2],[3]]))
@@ -75,6 +87,26 @@ class TestGroups:
         assert_equal(groups([1,2,3,4,5,6],3),[[1,2,3],[4,5,6]]) 
         assert_equal(groups([1,2,3,4,5,6],4),[[1,2,3,4]]) 
         
+class TestChunks:
+    def test_chunks(self):
+        c=list(chunks(range(10),4))
+        assert_equal(c,[[0,1,2,3],[4,5,6,7],[8,9]])
+        assert_equal(c[0].shape,(4,))
+        c=list(chunks([(1,2),(3,4),(5,6)],2))
+        assert_equal(c[0].shape,(2,2))
+
+class TestUnchunk:
+    def test_unchunk(self):
+        assert_equal(unchunk(chunks(range(10),4)),range(10))
+
+class TestPairwiseChunks:
+    def test_pairwise_chunks(self):
+        import numpy
+        res=pairwise_chunks(chunks([1,2,4,8,16],2))
+        assert_equal(unchunk(res),[1,2,4,8])
+        res=pairwise_chunks(chunks([1,2,4,8,16],3),numpy.divide,loop=True)
+        assert_equal(unchunk(res),[2,2,2,2,1./16])
+
 class TestReshape:
     def test_reshape(self):
         data=[1,[2,[3,4],[5,6,7]]] #data can have any shape...
@@ -249,6 +281,40 @@ class TestCartesianProduct:
             lambda: itertools.permutations(range(100)))
         
         assert_equal(next(g),(range(100),range(100)))
+
+        #iterators are materialized once
+        assert_equal(cartesian_product(iter([1,2]),iter([3,4])),[(1,3),(1,4),(2,3),(2,4)])
+
+        #prune subtrees
+        res=cartesian_product(*arrays,prune=lambda p:p[0]<0 or p==(1,2,3))
+        assert_equal(res,[(1, -2, -3), (1, -2, 3), (1, 2, -3)])
+
+        #index ranges
+        res=cartesian_product(*arrays,start=3,stop=6)
+        assert_equal(res,[(-1, 2, 3), (1, -2, -3), (1, -2, 3)])
+        res=cartesian_product(iter([-1,1]),*arrays[1:],start=3,stop=100)
+        assert_equal(res,[(-1, 2, 3), (1, -2, -3), (1, -2, 3), (1, 2, -3), (1, 2, 3)])
+
+        #first iterator is consumed lazily, so it can be infinite
+        res=cartesian_product(itertools.count(),[0,1])
+        assert_equal(itertools.islice(res,3),[(0,0),(0,1),(1,0)])
+        res=cartesian_product(itertools.count(),[0,1],start=3)
+        assert_equal(next(res),(1,1))
+
+class TestCartesianLen:
+    def test_cartesian_len(self):
+        assert_equal(cartesian_len([1,2,3],'ab'),6)
+        assert_equal(cartesian_len([1,2,3],repeat=3),27)
+
+class TestCartesianSplit:
+    def test_cartesian_split(self):
+        arrays = [(-1,+1), (-2,0,+2), (-3,+3)]
+        ranges=cartesian_split(5,*arrays)
+        assert_equal(ranges,[(0,2),(2,4),(4,7),(7,9),(9,12)])
+        res=[]
+        for start,stop in ranges:
+            res.extend(cartesian_product(*arrays,start=start,stop=stop))
+        assert_equal(res,itertools.product(*arrays))
         
 class TestCountUnique:
     def test_count_unique(self):
@@ -265,6 +331,28 @@ class TestBest:
     def test_best(self):
         assert_equal(best([3,2,1,2,1]),[1,1])
         assert_equal(best([3,2,1,2,1],reverse=True,n=2),[3,2,2])
+        assert_equal(best(irange(-5,5),key=abs,n=2),[0,-1,1])
+        assert_equal(best([3,2,1],n=0),[])
+        # unhashable keys
+        assert_equal(best([[3],[1],[2],[1]],n=2),[[1],[1],[2]])
+        assert_equal(best([[3],[1],[2],[3]],n=1,reverse=True),[[3],[3]])
+        data=[random.randint(0,20) for _ in range(200)]
+        for n in (1,3,30):
+            assert_equal(best(data,n=n),[x for x in sorted(data) if x in sorted(set(data))[:n]])
+            assert_equal(best(data,n=n,reverse=True),[x for x in sorted(data,reverse=True) if x in sorted(set(data))[-n:]])
+
+class TestKbest:
+    def test_kbest(self):
+        import numpy
+        assert_equal(kbest([3,2,1,2,1],2),[1,1])
+        assert_equal(kbest([3,2,1,2,1],3,reverse=True),[3,2,2])
+        assert_equal(kbest(numpy.array([3,2,1,2,1],dtype='uint8'),3,reverse=True),[3,2,2])
+
+class TestNthElement:
+    def test_nth_element(self):
+        import numpy
+        assert_equal(nth_element([5,3,1,4,2],1),2)
+        assert_equal(nth_element(numpy.array([5,3,1,4,2]),1,reverse=True),4)
 
 class TestRemovef:
     def test_removef(self):
@@ -283,10 +371,15 @@ class TestShuffle:
 class TestIndexMin:
     def test_index_min(self):
         assert_equal(index_min("hallo~welt"),(1,'a'))
+        assert_equal(index_min([3,1,2,1],key=lambda x:-x),(0,3))
+        import numpy
+        assert_equal(index_min(numpy.array([3,1,2,1])),(1,1))
 
 class TestIndexMax:
     def test_index_max(self):
         assert_equal(index_max("hello world"),(6,'w'))
+        import numpy
+        assert_equal(index_max(numpy.array([3,1,2,3])),(0,3))
 
 class TestTakeevery:
     def test_takeevery(self):
@@ -295,8 +388,11 @@ class TestTakeevery:
 
 class TestSortIndexes:
     def test_sort_indexes(self):
-        # assert_equal(expected, sort_indexes(iterable, key, reverse))
-        raise SkipTest
+        assert_equal(sort_indexes([3,1,2]),[1,2,0])
+        assert_equal(sort_indexes([3,1,2],reverse=True),[0,2,1])
+        assert_equal(sort_indexes('cAb',key=str.upper),[1,2,0])
+        import numpy
+        assert_equal(sort_indexes(numpy.array([3,1,2,1])),[1,3,2,0])
 
 class TestSubdict:
     def test_subdict(self):
@@ -315,13 +411,52 @@ class TestAccumulate:
 
 class TestUniqueSorted:
     def test_unique_sorted(self):
-        # assert_equal(expected, unique_sorted(iterable))
-        raise SkipTest 
+        assert_equal(unique_sorted([1,1,2,3,3,3]),[1,2,3])
 
 class TestDiff:
     def test_diff(self):
-        # assert_equal(expected, diff(iterable1, iterable2))
-        raise SkipTest 
+        assert_equal(diff([1,2,3,4,5],[2,3]),[1,4,5])
+        assert_equal(diff(iter([1,2,3,4]),iter([])),[1,2,3,4])
+        assert_equal(diff(irange(1,10),iter([0,2,4,6])),[1,3,5,7,8,9,10])
+
+class TestUnion:
+    def test_union(self):
+        assert_equal(union([1,3,5],[1,2,3],[6]),[1,2,3,5,6])
+
+class TestIntersect:
+    def test_intersect(self):
+        from Goulib.container import SortedCollection
+        assert_equal(intersect([1,1,2,3],[1,3,3]),[1,3])
+        assert_equal(intersect(irange(1,100),SortedCollection([5,50,500]),[0,50]),[50])
+        assert_equal(intersect(range(1000000),range(0,1000000,100000)),range(0,1000000,100000))
+        assert_equal(intersect([1,2],[]),[])
+
+class TestSymdiff:
+    def test_symdiff(self):
+        assert_equal(symdiff([1,2,3],[2,3,4]),[1,4])
+        assert_equal(symdiff([1,2,3],[2,3,4],[3,5]),[1,4,5])
+
+class TestSortedCursor:
+    def test_seek(self):
+        from Goulib.container import SortedCollection
+        for it in ([1,3,5,7,9],iter([1,3,5,7,9]),SortedCollection([1,3,5,7,9])):
+            c=SortedCursor(it)
+            assert_equal(c.seek(4),5)
+            assert_equal(c.seek(5),5)
+            assert_equal(next(c),7)
+            assert_raises(StopIteration,c.seek,10)
+
+    def test_keyed(self):
+        from Goulib.container import SortedCollection
+        data=[(1,'a'),(3,'b'),(3,'c'),(5,'d')]
+        for it in (data,SortedCollection(data,key=operator.itemgetter(0))):
+            c=SortedCursor(it)
+            assert_equal(c.seek((2,)),it[1])
+            assert_equal(next(c),it[2]) # duplicate keys are kept
+            assert_equal(next(c),(5,'d'))
+            assert_raises(StopIteration,next,c)
+        c=SortedCursor(SortedCollection([1,2,2,3]))
+        assert_equal(list(c),[1,2,2,3])
 
 class TestSortedIterable:
     def test_sorted_iterable(self):
@@ -353,5 +488,40 @@ class TestDictsplit:
         # assert_equal(expected, dictsplit(dic, keys))
         raise SkipTest 
 
+class TestPmap:
+    def test_pmap(self):
+        assert_equal(pmap(abs,range(-5,5),chunksize=3),[5,4,3,2,1,0,1,2,3,4])
+        assert_equal(sorted(pmap(abs,range(-5,5),ordered=False,threads=True)),[0,1,1,2,2,3,3,4,4,5])
+        g=pmap(abs,itertools.count(),chunksize=4) # infinite
+        assert_equal(next(g),0)
+        g.close()
+
+class TestPcompact:
+    def test_pcompact(self):
+        from Goulib.math2 import is_prime
+        assert_equal(take(10,pcompact(itertools.count(),is_prime)),[2,3,5,7,11,13,17,19,23,29])
+
+class TestPfilter2:
+    def test_pfilter2(self):
+        from Goulib.math2 import is_prime
+        yes,no=pfilter2(range(10),is_prime,threads=True)
+        assert_equal(yes,[2,3,5,7])
+        assert_equal(no,[0,1,4,6,8,9])
+
+class TestPifind:
+    def test_pifind(self):
+        from Goulib.math2 import is_prime
+        res=pifind(range(10,20),is_prime,ordered=False,chunksize=2)
+        assert_equal(sorted(res),[(1,11),(3,13),(7,17),(9,19)])
+
+class TestPaccumulate:
+    def test_paccumulate(self):
+        assert_equal(paccumulate([-1,2,-3,4],abs),[1,3,6,10])
+
+class TestPbest:
+    def test_pbest(self):
+        assert_equal(pbest([3,-2,1,2,-1],abs),[1,-1])
+        assert_equal(pbest([3,-2,1,2,-1],abs,reverse=True,n=2),[3,-2,2])
+
 if __name__ == "__main__":
-    runmodule()
\ No newline at end of file
+    runmodule()
\ No newline at end of file
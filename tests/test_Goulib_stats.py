@@ -80,6 +80,11 @@ class TestMedian:
     def test_median(self):
         assert_equal(median(h),44627.5)
         assert_equal(median(r),0.5,places=1)
+        assert_equal(median([3,1,2]),2)
+        import numpy
+        assert_equal(median(numpy.array(h)),44627.5)
+        assert_raises(ValueError,median,[3,float('nan'),1])
+        assert_raises(ValueError,median,numpy.array([3,numpy.nan,1,2]))
 
 class TestMode:
     def test_mode(self):
@@ -87,6 +92,38 @@ class TestMode:
         assert_equal(mode([1,1,1,2,2,3]),1) #test when mode is first
         assert_equal(mode([1,2,2,3,3,3]),3) #test when mode is last
         assert_equal(mode([1,2,2,3,3,4]),2) #test equality
+        assert_equal(mode([1,2,2,3,3,4],is_sorted=True),2)
+        l=[3,3,1]
+        assert_equal(mode(l),3)
+        assert_equal(l,[3,3,1]) # no side effect
+
+class TestQuantiles:
+    @classmethod
+    def setup_class(self):
+        self.q=Quantiles(f,k=200)
+
+    def test_size(self):
+        assert_true(self.q.size<1000)
+
+    def test_quantile(self):
+        assert_equal(self.q.median,0.5,places=1)
+        assert_equal(self.q.percentile(90),0.9,places=1)
+        assert_equal(self.q.cdf(0.25),0.25,places=1)
+
+    def test_merge(self):
+        import numpy
+        q=Quantiles(f[:5000]).merge(Quantiles(numpy.array(f[5000:])))
+        assert_equal(q.n,len(f))
+        assert_equal(q.median,0.5,places=1)
+        assert_true(math.isnan(Quantiles().cdf(0)))
+
+class TestHeavyHitters:
+    def test_mode(self):
+        data=[1,2,1,3,1,4,1,5,1,6,1]*100
+        hh=HeavyHitters(data,k=3)
+        assert_equal(hh.mode,1)
+        hh=HeavyHitters(data[:500],k=3).merge(HeavyHitters(data[500:],k=3))
+        assert_equal(hh.most_common(1)[0][0],1)
 
 class TestStats:
     def test_stats(self):
@@ -116,6 +153,47 @@ class TestStats:
         # assert_equal(expected, stats.__repr__())
         raise SkipTest 
 
+    def test_extend(self):
+        import numpy
+        s=Stats(numpy.array(h))
+        assert_equal(s.avg,hmean)
+        assert_equal(s.var,hvar,0)
+        assert_equal((s.lo,s.hi),(4978,99233))
+        class Positive(Stats):
+            def append(self,x):
+                if x>0:
+                    Stats.append(self,x)
+        assert_equal(Positive([-1,1,-2,2]).n,2) # extend calls overridden append
+        n=Normal(h[:2])
+        n.extend(iter(h[2:]))
+        assert_equal(list(n),h)
+        assert_equal(n.avg,hmean)
+
+    def test_merge(self):
+        s=Stats(h[:3]).merge(Stats(h[3:7])).merge(Stats(h[7:]))
+        assert_equal(s.n,len(h))
+        assert_equal(s.avg,hmean)
+        assert_equal(s.var,hvar,0)
+        assert_equal(s.kurtosis,kurtosis(h))
+        assert_equal((s.lo,s.hi),(4978,99233))
+        assert_equal(Stats().merge(Stats(h)).avg,hmean)
+
+    def test_kurtosis(self):
+        assert_equal(Stats(h).kurtosis,kurtosis(h))
+        assert_equal(Stats(f).kurtosis,-1.2,places=3) # uniform distribution
+
+    def test_percentile(self):
+        s=Stats(f,quantiles=200)
+        assert_equal(s.mean,0.5)
+        assert_equal(s.median,0.5,places=1)
+        assert_equal(s.percentile(10),0.1,places=1)
+        s.merge(Stats(f))
+        assert_raises(ValueError,s.quantile,0.5) # sketch dropped as it ignores merged data
+
+    def test_skewness(self):
+        assert_equal(Stats(f).skewness,0)
+        assert_equal(Stats([1,2,3,10]).skewness,1.0182,places=4) # scipy.stats.skew
+
     def test_sum(self):
         # stats = Stats(data)
         # assert_equal(expected, stats.sum())
@@ -126,6 +204,107 @@ class TestStats:
         # assert_equal(expected, stats.sum2())
         raise SkipTest 
 
+class TestWindow:
+    def test_append(self):
+        w=Window(size=3)
+        for x in h:
+            w.append(x)
+        assert_equal(w.n,3)
+        assert_equal(w.avg,mean(h[-3:]))
+        assert_equal(w.var,variance(h[-3:]),places=3)
+        assert_equal((w.lo,w.hi),(38120,67060))
+
+    def test_extend(self):
+        import numpy
+        w=Window(size=4)
+        w.extend(numpy.array(h[:5]))
+        w.extend(numpy.array(h[5:]))
+        assert_equal(w.avg,mean(h[-4:]))
+        assert_equal((w.lo,w.hi),(38120,73429))
+
+    def test_duration(self):
+        from datetime import datetime,timedelta
+        t0=datetime(2016,1,1)
+        w=Window(duration=timedelta(seconds=10))
+        w.extend(range(30),[t0+timedelta(seconds=i) for i in range(30)])
+        assert_equal(w.n,10)
+        assert_equal((w.lo,w.hi),(20,29))
+        assert_equal(w.mean,24.5)
+
+    def test_remove(self):
+        w=Window(h,size=5)
+        w.remove(h[-1])
+        assert_equal(w.n,4)
+        assert_equal(w.avg,mean(h[-5:-1]))
+        assert_equal((w.lo,w.hi),(min(h[-5:-1]),max(h[-5:-1])))
+        w.append(1)
+        assert_equal((w.lo,w.hi),(1,max(h[-5:-1])))
+        assert_raises(ValueError,w.remove,-1)
+
+    def test_merge(self):
+        w=Window(h[:5],size=6).merge(Window(h[5:]))
+        assert_equal(w.n,6)
+        assert_equal(w.avg,mean(h[-6:]))
+        assert_equal((w.lo,w.hi),(min(h[-6:]),max(h[-6:])))
+        from datetime import datetime,timedelta
+        t=[datetime(2016,1,1)+timedelta(seconds=i) for i in range(30)]
+        a=Window(duration=timedelta(seconds=10))
+        a.extend(range(0,30,2),t[0::2])
+        b=Window(duration=timedelta(seconds=10))
+        b.extend(range(1,25,2),t[1:25:2])
+        a.merge(b)
+        assert_equal(list(a._data),[(t[i],i) for i in [19,20,21,22,23,24,26,28]]) # 10s before last time
+        assert_equal((a.lo,a.hi),(19,28))
+        assert_equal(a.mean,mean([19,20,21,22,23,24,26,28]))
+
+class TestEWMA:
+    def test_append(self):
+        e=EWMA([1,2],alpha=0.5)
+        assert_equal(e.mean,1.5)
+        assert_equal(e.var,0.25)
+        assert_equal(EWMA(halflife=1).alpha,0.5)
+
+    def test_extend(self):
+        import numpy
+        e1=EWMA(h,alpha=0.2)
+        e2=EWMA(h[:3],alpha=0.2)
+        e2.extend(numpy.array(h[3:]))
+        assert_equal(e2.mean,e1.mean)
+        assert_equal(e2.var,e1.var,places=3)
+
+class TestUniform:
+    def test_pdf(self):
+        u=Uniform(0,2)
+        assert_equal(u.pdf([-1,1,3]),[0,0.5,0])
+        assert_equal(u.cdf(0.5),0.25)
+        assert_equal(u.ppf(0.25),0.5)
+        assert_equal((u.mean,u.variance),(1,1./3))
+
+class TestExponential:
+    def test_pdf(self):
+        e=Exponential(2)
+        assert_equal(e.pdf([-1,0]),[0,2])
+        assert_equal(e.cdf(e.ppf(0.3)),0.3)
+        assert_equal(e.ppf(0.5),math.log(2)/2)
+
+class TestHistogram:
+    def test_histogram(self):
+        counts,edges=histogram(f,10)
+        assert_equal(sum(counts),len(f))
+        assert_equal(edges[0],0)
+        assert_equal(edges[-1],1)
+        counts,_=histogram([1,2,2,3,10],3,(1,4))
+        assert_equal(counts,[1,2,1])
+        counts,edges=histogram([],4)
+        assert_equal(counts,[0,0,0,0])
+        assert_equal(edges,[0,0.25,0.5,0.75,1])
+
+class TestKde:
+    def test_kde(self):
+        x,y=kde(Normal(mean=0,var=1).sample(100000),bandwidth=0.1)
+        assert_equal(sum(y)*(x[1]-x[0]),1,places=3)
+        assert_equal(max(y),1/math.sqrt(2*math.pi),places=1)
+
 class TestLinearRegression:
     def test_linear_regression(self):
         try:
@@ -141,6 +320,38 @@ class TestLinearRegression:
         assert_equal(bi,(1,1))
         assert_equal(ci,(0,0))
 
+class TestLinearRegressionClass:
+    def test_extend(self):
+        r=LinearRegression([1,2,3],[-1,-3,-5])
+        assert_equal(r.coef,(1,-2))
+        assert_equal(r.rss,0)
+        assert_equal(r.predict(4),-7)
+
+    def test_append(self):
+        r=LinearRegression()
+        for x,y in [(1,-1),(2,-3),(3,-5)]:
+            r.append(x,y)
+        assert_equal(r.n,3)
+        assert_equal(r.coef,(1,-2))
+
+    def test___repr__(self):
+        assert_equal(repr(LinearRegression()),'LinearRegression(n=0, coef=None)')
+        assert_equal(repr(LinearRegression([1],[2])),'LinearRegression(n=1, coef=None)')
+        assert_true(repr(LinearRegression([1,2,3],[-1,-3,-5])).startswith('LinearRegression(n=3, coef=['))
+
+    def test_merge(self):
+        x=[1000.1,1000.2,1000.3,1000.5,1000.8]
+        y=[10,11,11.5,13,14]
+        r=LinearRegression(x[:2],y[:2]).merge(LinearRegression(x[2:],y[2:]))
+        assert_equal(r.coef,LinearRegression(x,y).coef)
+
+    def test_dim(self):
+        x=[(0,0),(1,0),(0,1),(1,1),(2,1)]
+        y=[1+2*a-3*b for a,b in x]
+        r=LinearRegression(x,y,dim=2)
+        assert_equal(r.coef,(1,2,-3))
+        assert_equal(r.predict((1,1)),0)
+
 class TestNormal:
     @classmethod
     def setup_class(self):
@@ -196,12 +407,16 @@ class TestNormal:
     def test___mul__(self):
         twogauss=self.gauss*2
         assert_equal(twogauss.avg,2)
-        assert_equal(twogauss.var,2)
+        assert_equal(twogauss.var,4)
+        n=Normal(h,keep=False)*3
+        assert_equal(n.avg,3*hmean)
+        assert_equal(n.var,9*hvar,-1)
+        assert_equal((-self.gauss).var,1)
         
     def test___div__(self):
         halfgauss=self.gauss/2
         assert_equal(halfgauss.avg,.5)
-        assert_equal(halfgauss.var,.5)
+        assert_equal(halfgauss.var,.25)
 
     def test___call__(self):
         # normal = Normal()
@@ -224,9 +439,27 @@ class TestNormal:
         raise SkipTest 
 
     def test_pdf(self):
-        # normal = Normal()
-        # assert_equal(expected, normal.pdf(x))
-        raise SkipTest 
+        import numpy
+        assert_equal(self.gauss.pdf(1),1/math.sqrt(2*math.pi))
+        assert_equal(self.gauss.pdf(numpy.array([0,1,2])),self.gauss([0,1,2]))
+        assert_equal(self.gauss(numpy.array([0,1,2])),self.gauss([0,1,2]))
+
+    def test_cdf(self):
+        assert_equal(self.gauss.cdf(1),0.5)
+        assert_equal(self.gauss.cdf([-0.96,2.96]),[0.025,0.975],places=3)
+
+    def test_ppf(self):
+        assert_equal(self.gauss.ppf(0.5),1)
+        assert_equal(self.gauss.ppf([0.025,0.975]),[-0.96,2.96],places=2)
+        assert_equal(self.gauss.interval(.95),(-0.96,2.96),places=2)
+
+    def test_keep(self):
+        n=Normal(h,keep=False)
+        assert_equal(len(n),0)
+        assert_equal(n.avg,hmean)
+        n.remove(h[0])
+        assert_equal(n.n,len(h)-1)
+        assert_raises(ValueError,n.pop)
 
     def test_pearson(self):
         # normal = Normal()
@@ -277,4 +510,4 @@ class TestNormalPdf:
         raise SkipTest 
 
 if __name__ == "__main__":
-    runmodule()
\ No newline at end of file
+    runmodule()
\ No newline at end of file
@@ -6,7 +6,7 @@ from nose import SkipTest
 from Goulib.tests import *
 
 from Goulib.table import *
-import datetime,os
+import datetime,os,operator
 import six
 
 class TestTable:
@@ -71,7 +71,16 @@ class TestTable:
         pass #tested in setup and test_html
 
     def test_to_datetime(self):
-        pass #tested in setup
+        t=Table([['2012-01-02'],['02/01/2012 10:30:00'],[None],['x'],[41061]],titles=['d'])
+        assert_false(t.to_datetime('d',fmt=DATE_FORMATS,skiperrors=True))
+        assert_equal(t.col('d'),[datetime.datetime(2012,1,2),datetime.datetime(2012,1,2,10,30),None,'x',datetime.datetime(2012,6,1)])
+        
+    def test_convert(self):
+        t=Table([['1'],['a'],['1'],[]])
+        assert_equal(t.convert(0,int),[False,True,False,False])
+        assert_equal(t,Table([[1],['a'],[1],[]]))
+        assert_equal(convert_column([1,1.0,True],str)[0],['1','1.0','True'])
+        assert_equal(detect_formats(['1/23/2012','4/10/2012'],['%d/%m/%Y','%m/%d/%Y']),['%m/%d/%Y','%d/%m/%Y'])
 
     def test_write_csv(self):
         pass #tested in setup
@@ -94,6 +103,20 @@ class TestTable:
         h=t.html()
         assert_true(h)
         
+    def test_ihtml(self):
+        ref=self.t2.html()
+        assert_equal(''.join(self.t2.ihtml(chunksize=10)),ref)
+        assert_equal(len(list(self.t2.ihtml(chunksize=10))),len(self.t2)//10+4) # table, head, ... ,/table
+        f=six.StringIO()
+        self.t2.write_html(f,colstyle=['color:red'])
+        assert_equal(f.getvalue(),self.t2.html(colstyle=['color:red']))
+        
+    def test_page(self):
+        h=self.t2.page(1,10)
+        assert_equal(h.count('<tr>'),11)
+        assert_true(h.startswith(self.t2.html(stop=0)[:-len('</table>\n')]))
+        assert_equal(Table([[i] for i in range(250)])._repr_html_().count('<tr>'),Table.pagesize)
+        
     def test_append(self):
         ta = Table()
         ta.append({'col1':1,'col2':2})
@@ -133,6 +156,92 @@ class TestTable:
         d=self.t.groupby(u'Région')
         assert_equal(sum([len(d[k]) for k in d]),len(self.t))
         assert_equal(len(d['East']),13)
+        
+    def test_groupby_keys(self):
+        rows=[list(row) for row in self.t]
+        d=self.t.groupby([u'Région','Rep'],removecol=False)
+        assert_equal([list(row) for row in self.t],rows) # not sorted in place
+        assert_equal(list(d.keys())[0],('Central','Andrews'))
+        assert_equal(len(d[('East','Jones')]),8)
+        
+    def test_aggregate(self):
+        a=self.t.aggregate(u'Région',[(None,'count'),(u'Unités',sum,'units'),('Cost','mean'),('Cost',max),('Rep',lambda x:len(set(x)),'reps')])
+        assert_equal(a.titles,[u'Région','count()','units','mean(Cost)','max(Cost)','reps'])
+        assert_equal(a.col(0),['Central','East','West'])
+        assert_equal(a.col(1),[24,13,6])
+        assert_equal(a[1][2],sum(row[4] for row in self.t if row[1]=='East'))
+        assert_equal(a[2][4],275)
+        assert_equal(a.col('reps'),[6,3,2])
+        b=self.t.aggregate(u'Région',[(None,'count'),(u'Unités',sum,'units'),('Cost','mean')],processes=2)
+        assert_equal(b.col('units'),a.col('units'))
+
+    def test_query(self):
+        q=self.t.query().where({u'Région':'East'}).derive('value',lambda row:row[4]*row[5])
+        q=q.select('Rep','value','Cost').where({'Rep':'Jones'}).sort('value',reverse=True).limit(3)
+        assert_equal(q.explain(),['match','derive','select','top']) # fused filters, top-k sort
+        ref=[[row[2],row[4]*row[5],row[5]] for row in self.t if row[1]=='East' and row[2]=='Jones']
+        ref.sort(key=lambda row:row[1],reverse=True)
+        r=q.execute()
+        assert_equal(r.titles,['Rep','value','Cost'])
+        assert_equal(list(r),ref[:3])
+        q=self.t.query().derive('x',lambda row:1/0).select('Rep').limit(2,1)
+        assert_equal(q.explain(),['limit','select']) # unused derived column is dropped, limit first
+        assert_equal(list(q),[[row[2]] for row in self.t[1:3]])
+        a=self.t.query().where(lambda row:row[4]>50).aggregate('Rep',[('Cost','sum')]).limit(2).execute()
+        t=Table(row for row in self.t if row[4]>50)
+        t.titles=self.t.titles
+        assert_equal(a,t.aggregate('Rep',[('Cost','sum')])[:2])
+
+    def test_map_partitions(self):
+        assert_equal(self.t.map_partitions(len,processes=2,partitions=4),[11,11,11,10])
+        assert_equal(self.t.map_partitions(len,processes=2,merge=operator.add),len(self.t))
+        assert_equal(self.t.maprows(len,processes=2),[len(row) for row in self.t])
+        t=Table(self.t,titles=self.t.titles)
+        assert_equal(t.total([len,None,None,None,sum,max,'x'],processes=3),[43,None,None,None,2121,275,'x'])
+        assert_true(t.applyf('Cost',str,processes=3))
+        assert_equal(t.col('Cost'),[str(x) for x in self.t.col('Cost')])
+        assert_false(t.applyf('Rep',float,skiperrors=True,processes=2))
+        assert_equal(t.col('Rep'),self.t.col('Rep'))
+
+    def test_lookup(self):
+        assert_equal(self.t.lookup('Rep','Jones'),[0, 5, 9, 13, 15, 17, 24, 32])
+        assert_equal(self.t.lookup(['Rep','Item'],('Jones','Binder')),[5, 9, 24])
+        assert_equal(self.t.lookup('Rep','Nobody'),[])
+        t=Table(self.t,titles=self.t.titles)
+        t.lookup('Rep','Jones') #builds the index
+        t.append(t[0])
+        assert_equal(t.lookup('Rep','Jones')[-1],len(t)-1) #index was rebuilt
+        t.pop(0)
+        assert_equal(t.lookup('Rep','Jones')[0],4)
+        t=Table([[1],[2]],titles=['x'])
+        assert_equal(t.lookup('x',2),[1])
+        t*=2
+        assert_equal(t.lookup('x',2),[1,3])
+        t.clear()
+        assert_equal(t.lookup('x',2),[])
+        
+    def test_between(self):
+        rows=self.t.between('Cost',4,5)
+        assert_equal(len(rows),12)
+        assert_true(all(self.t[i][5]==4.99 for i in rows))
+        assert_equal(self.t.between(u'Unités',90),[7, 10, 41, 0, 19, 28]) # sorted by value
+        
+    def test_join(self):
+        rates=Table([['East',0.1],['Central',0.2],['North',0.3],[None,1]],titles=[u'Région','rate'])
+        for algorithm in ('hash','merge'):
+            j=self.t.join(rates,u'Région',algorithm=algorithm)
+            assert_equal(j.titles,self.t.titles+['rate'])
+            assert_equal(len(j),24+13)
+            assert_equal(sorted(j.col('rate')),[0.1]*13+[0.2]*24)
+            j=self.t.join(rates,u'Région','left',algorithm=algorithm)
+            assert_equal(len(j),len(self.t))
+            assert_equal(j.col('rate').count(None),6)
+            j=self.t.join(rates,u'Région','outer',algorithm=algorithm)
+            assert_equal(len(j),len(self.t)+2)
+            assert_true([None,'North',None,None,None,None,None,0.3] in j)
+        j1=self.t.join(self.t,['Rep','Item'],algorithm='hash')
+        j2=self.t.join(self.t,['Rep','Item'],algorithm='merge')
+        assert_equal(sorted(map(str,j1)),sorted(map(str,j2)))
 
     def test___eq__(self):
         # table = Table(filename, titles, data, **kwargs)
@@ -169,14 +278,14 @@ class TestTable:
         assert_equal(len(t),l-r)
 
     def test_rowasdict(self):
-        r=self.t.rowasdict(3)
-        assert_equal(r,{u'Cost': 1.99,
-                        u'Item': u'Pencil',
-                        u'OrderDate': u'4/18/2012',
-                        u'Rep': u'Andrews',
+        r=self.t.rowasdict(3) # groupby doesn't sort the table anymore
+        assert_equal(r,{u'Cost': 19.99,
+                        u'Item': u'Pen',
+                        u'OrderDate': u'2/26/2012',
+                        u'Rep': u'Gill',
                         u'Région': u'Central',
-                        u'Total': 149.25,
-                        u'Unités': 75}
+                        u'Total': 539.73,
+                        u'Unités': 27}
                      )
 
     def test_set(self):
@@ -194,6 +303,244 @@ class TestTable:
         # assert_equal(expected, table.index(value, column))
         raise SkipTest
 
+class TestColumnTable:
+
+    @classmethod
+    def setup_class(self):
+        self.path=os.path.dirname(os.path.abspath(__file__))
+        self.t=Table(self.path+'/data/test.xls')
+        self.c=self.t.columnar()
+
+    def test___init__(self):
+        assert_equal(self.c.titles,self.t.titles)
+        assert_equal(self.c.col(u'Unités').dtype.kind,'i')
+        assert_equal(self.c.col('Cost').dtype.kind,'f')
+        assert_equal(self.c.col('Rep').dtype.kind,'O')
+        assert_equal(ColumnTable({'a':[1,2],'b':[None,1.5]},titles=['a','b']).rowasdict(0),{'a':1,'b':None})
+        assert_equal(ColumnTable(([1,2],(3,4))),ColumnTable([(1,2),[3,4]]))
+
+    def test_to_table(self):
+        assert_equal(self.c.to_table(),self.t)
+        assert_equal(self.c[3],self.t[3])
+        assert_equal(len(self.c[2:5]),3)
+
+    def test_get(self):
+        assert_equal(self.c.get(-1,'Total'),139.72)
+        assert_equal(self.c.index('Jones',2),self.t.index('Jones',2))
+
+    def test_total(self):
+        t=Table(self.t)
+        t.titles=self.t.titles
+        ref=t.total([None,None,None,None,sum,max,len])
+        assert_equal(self.c.total([None,None,None,None,sum,max,len]),ref)
+
+    def test_append(self):
+        c=ColumnTable()
+        c.append({'col1':1,'col2':2})
+        assert_true(len(c)==1 and c.ncols()==2)
+        c.extend([[3,4],[5,'x']])
+        assert_equal(c.col('col1').dtype.kind,'i')
+        assert_equal(c.col('col2').tolist(),[2,4,'x'])
+        c.set(4,0,None)
+        assert_equal(c.col(0).dtype.kind,'f')
+        assert_equal(c.col(0).tolist()[:3],[1,3,5])
+
+    def test_applyf(self):
+        c=ColumnTable(self.c)
+        c.to_date('OrderDate',fmt=['%m/%d/%Y','Excel'])
+        assert_equal(c[0][0],datetime.date(2012, 6, 1))
+        assert_equal(c[1][0],datetime.date(2012, 1,23))
+        assert_equal(c.col('OrderDate').dtype.kind,'M') # vectorized datetime64 column
+        t=self.c.to_table()
+        t.to_date('OrderDate',fmt=['%m/%d/%Y','Excel'])
+        assert_equal(c.to_table(),t)
+        assert_equal(c.convert('Rep',lambda x:1/0 if x=='Jones' else x).sum(),len(c.lookup('Rep','Jones')))
+        c.applyf('Cost',lambda x:x*2,vectorized=True)
+        assert_equal(c.get(0,'Cost'),2*1.99)
+
+    def test_sort(self):
+        c=ColumnTable(self.c)
+        c.sort('Cost')
+        assert_equal(c.col('Cost')[0],1.29)
+        assert_equal(c.col('Cost')[-1],275)
+        c=ColumnTable(self.c)
+        c.sort('Rep',reverse=True)
+        t=Table(self.t)
+        list.sort(t,key=lambda x:x[2],reverse=True)
+        assert_equal(list(c.icol('Total')),[row[6] for row in t])
+
+    def test_groupby(self):
+        d=self.c.groupby(u'Région')
+        assert_equal(sum([len(d[k]) for k in d]),len(self.c))
+        assert_equal(len(d['East']),13)
+        assert_equal(d['East'].ncols(),6)
+        d=self.c.groupby([u'Région','Rep'])
+        assert_equal(list(d.keys()),list(self.t.groupby([u'Région','Rep']).keys()))
+
+    def test_join(self):
+        rates=Table([['East',0.1],['Central',0.2],['North',0.3]],titles=[u'Région','rate'])
+        for how in ('inner','left','outer'):
+            for algorithm in ('hash','merge'):
+                j=self.c.join(rates,u'Région',how,algorithm=algorithm)
+                j2=self.t.join(rates,u'Région',how)
+                assert_equal(len(j),len(j2))
+                assert_true(all(row in j2 for row in j))
+        assert_equal(self.c.between('Cost',4,5),self.t.between('Cost',4,5))
+        c=ColumnTable(self.c)
+        assert_equal(c.lookup('Rep','Jones'),self.t.lookup('Rep','Jones'))
+        c.remove_lines_where(c.col('Rep')=='Jones')
+        assert_equal(c.lookup('Rep','Jones'),[])
+
+    def test_html(self):
+        assert_equal(self.c.html(),self.c.to_table().html())
+        assert_equal(self.c.html(chunksize=7,colstyle='color:red'),self.c.to_table().html(colstyle='color:red'))
+        assert_equal(self.c.page(2,10),self.c.to_table().page(2,10))
+
+    def test_write_bin(self):
+        c=ColumnTable(self.c)
+        c.to_date('OrderDate',fmt=['%m/%d/%Y','Excel'])
+        c.addcol('Mixed',[1,'a',None])
+        for compress in (0,9):
+            file=self.path+'/results/table.%d.ctb'%compress
+            c.write_bin(file,compress)
+            d=ColumnTable(file)
+            assert_equal(d,c)
+            assert_equal(d.col('OrderDate').dtype.kind,'M') # dates are stored as datetime64
+            assert_equal(d.get(0,'OrderDate'),datetime.date(2012, 6, 1))
+            d.set(0,'Cost',100) # copy on write
+            assert_equal(ColumnTable(file).get(0,'Cost'),1.99)
+            assert_equal(d.col('Rep').dtype.kind,'U') # text is stored as fixed width unicode
+            for v in (None,5,'a much longer name'):
+                d.set(0,'Rep',v) # retypes the column
+                assert_equal(d.get(0,'Rep'),v)
+        assert_equal(Table(file),c.to_table())
+        assert_equal(ColumnTable().read_bin(file,mmap=False),c)
+
+    def test_write_bin_pickle(self):
+        c=ColumnTable([[1,datetime.date(2016,1,1)],[None,'a'],[2.5,datetime.timedelta(1)]],titles=['a','b'])
+        file=self.path+'/results/table.json.ctb'
+        c.write_bin(file)
+        assert_equal(ColumnTable(file),c) # mixed columns are stored as JSON
+        c.addcol('c',[(1,2),None,None])
+        file=self.path+'/results/table.pickle.ctb'
+        c.write_bin(file)
+        assert_raises(ValueError,ColumnTable,file) # pickled data can run arbitrary code
+        assert_raises(ValueError,Table,file)
+        assert_equal(ColumnTable(file,allow_pickle=True),c)
+        assert_equal(Table(file,allow_pickle=True),c.to_table())
+
+    def test_aggregate(self):
+        aggregates=[(None,len),(u'Unités','sum'),('Cost','mean'),('Cost',min),('Item',lambda x:sorted(x)[0])]
+        a=self.c.aggregate([u'Région','Rep'],aggregates)
+        assert_equal(a.to_table(),self.t.aggregate([u'Région','Rep'],aggregates))
+        assert_equal(a.col(u'sum(Unités)').dtype.kind,'i')
+
+    def test_query(self):
+        q=lambda t:t.query().where({u'Région':'East','Cost':lambda x:x>2}).select('Rep','Cost').sort('Cost').limit(5)
+        assert_equal(list(q(self.c)),list(q(self.t)))
+        r=self.c.query().where({'Rep':'Jones'}).aggregate('Item',[('Cost','sum')]).execute()
+        assert_true(isinstance(r,ColumnTable))
+        assert_equal(r.to_table(),self.t.query().where({'Rep':'Jones'}).aggregate('Item',[('Cost','sum')]).execute())
+
+    def test_map_partitions(self):
+        assert_equal(self.c.map_partitions(len,processes=3),[15,15,13])
+        assert_equal(self.c.maprows(len,processes=2),[len(row) for row in self.t])
+        c=ColumnTable(self.c)
+        assert_equal(c.total([len,None,None,None,sum,max],processes=2),c.total([len,None,None,None,sum,max]))
+        c.applyf('Cost',str,processes=3)
+        assert_equal(list(c.icol('Cost')),[str(x) for x in self.c.icol('Cost')])
+
+    def test_remove_lines_where(self):
+        c=ColumnTable(self.c)
+        r=c.remove_lines_where(c.col('Rep')=='Jones')
+        assert_equal(r,8)
+        assert_equal(len(c),len(self.c)-r)
+
+class TestIreadCsv:
+
+    @classmethod
+    def setup_class(self):
+        self.path=os.path.dirname(os.path.abspath(__file__))
+        self.t=Table(self.path+'/data/test.xls')
+        self.file=self.path+'/results/table.chunks.csv'
+        write_csv_chunks(self.file,[self.t[:20],self.t[20:]],self.t.titles)
+
+    def test_iread_csv(self):
+        chunks=list(iread_csv(self.file,chunksize=10))
+        assert_equal([len(c) for c in chunks],[10,10,10,10,3])
+        t=Table(titles=chunks[0].titles)
+        for c in chunks:
+            t.extend(c)
+        assert_equal(t,Table(self.file))
+        assert_equal(str(t),str(self.t))
+
+    def test_types(self):
+        file=self.path+'/results/table.types.csv'
+        rows=[['N/A',1.5,'x']]*1500+[[750.0,1.5,7],[12,1.5,7]] # numbers after a text only sample
+        write_csv_chunks(file,[rows],['a','b','c'])
+        for chunksize in (100,65536):
+            t=Table(titles=['a','b','c'])
+            for c in iread_csv(file,chunksize=chunksize):
+                t.extend(c)
+            assert_equal(t[-2:],[[750,1.5,7],[12,1.5,7]])
+            assert_equal(t[0],['N/A',1.5,'x'])
+
+    def test_columns(self):
+        c=next(iread_csv(self.file,columns=['Rep',5]))
+        assert_equal(c.titles,['Rep','Cost'])
+        assert_equal(c[0],['Jones',1.99])
+
+    def test_where(self):
+        t=Table(self.file,where={'Rep':lambda x:x=='Jones'},columns=['Total'])
+        assert_equal(len(t),8)
+        assert_equal(t[0],[189.05])
+        t=Table(self.file,where=lambda row:row[2]=='Jones')
+        assert_equal(len(t),8)
+
+    def test_columnar(self):
+        c=ColumnTable(self.file)
+        assert_equal(c.col(u'Unités').dtype.kind,'i')
+        assert_equal(c.to_table(),Table(self.file))
+        c=next(iread_csv(self.file,columnar=True,types={'Total':lambda x:float(x.replace(',',''))}))
+        assert_equal(c.col('Total').dtype.kind,'f')
+
+    def test_write_csv_chunks(self):
+        c=self.t.columnar()
+        c.write_csv(self.path+'/results/table.columnar.csv')
+        assert_equal(Table(self.path+'/results/table.columnar.csv'),Table(self.file))
+
+class TestIreadHtml:
+
+    @classmethod
+    def setup_class(self):
+        self.path=os.path.dirname(os.path.abspath(__file__))
+        self.t=Table(self.path+'/data/test.xls')
+
+    def test_iread_html(self):
+        file=self.path+'/results/table.chunks.htm'
+        self.t.write_html(file)
+        chunks=list(iread_html(file,chunksize=20))
+        assert_equal([len(c) for c in chunks],[20,20,3])
+        assert_equal(chunks[-1].titles,self.t.titles)
+        assert_equal(Table(file),self.t)
+        assert_equal(ColumnTable(file).to_table(),self.t)
+
+    def test_iread_html_footer(self):
+        file=self.path+'/results/table.footer.htm'
+        with open(file,'w') as f:
+            f.write('<html><body><table><thead><tr><th>a</th><th>b</th></tr></thead>'
+                '<tbody><tr><td>1</td><td>2</td></tr><tr><td>3</td><td>4</td></tr></tbody>'
+                '<tfoot><tr><td>4</td><td>6</td></tr></tfoot></table></body></html>')
+        t=next(iread_html(file))
+        assert_equal(t.titles,['a','b'])
+        assert_equal(list(t),[[1,2],[3,4]]) # footer is not data
+
+    def test_iread_xls(self):
+        chunks=list(iread_xls(self.path+'/data/test.xls',chunksize=20,columnar=True))
+        assert_equal([len(c) for c in chunks],[20,20,3])
+        assert_equal(chunks[0].titles,self.t.titles)
+        assert_equal(chunks[1][0],self.t[20])
+
 class TestAttr:
     def test_attr(self):
         # assert_equal(expected, attr(args))